@@ -0,0 +1,389 @@
+"""
+Общая обвязка бенчмарков: окружение без внешних сервисов, подставные
+модели, синтетический каталог, локальный сервер выгрузки 1С и статистика.
+
+Модули src читают настройки при импорте, поэтому configure_environment()
+вызывается до первого импорта src.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_STEMS = [
+    "Аспирин",
+    "Парацетамол",
+    "Ибупрофен",
+    "Нурофен",
+    "Но-шпа",
+    "Цитрамон",
+    "Анальгин",
+    "Амоксициллин",
+    "Азитромицин",
+    "Лоратадин",
+    "Цетиризин",
+    "Омепразол",
+    "Мезим",
+    "Смекта",
+    "Энтерофурил",
+    "Арбидол",
+    "Ингавирин",
+    "Називин",
+    "Отривин",
+    "Лазолван",
+    "Амброксол",
+    "Граммидин",
+    "Стрепсилс",
+    "Терафлю",
+    "Колдрекс",
+    "Валидол",
+    "Корвалол",
+    "Глицин",
+    "Магне B6",
+    "Компливит",
+    "Супрадин",
+    "Аквадетрим",
+    "Линекс",
+    "Бифиформ",
+    "Мирамистин",
+    "Хлоргексидин",
+    "Пантенол",
+    "Бепантен",
+    "Диклофенак",
+    "Вольтарен",
+]
+_FORMS = [
+    "таблетки",
+    "капсулы",
+    "сироп",
+    "спрей",
+    "раствор",
+    "суспензия",
+    "мазь",
+    "гель",
+    "капли",
+    "порошок",
+]
+_DOSES = [5, 10, 20, 25, 50, 100, 125, 200, 250, 400, 500, 1000]
+_PACKS = [10, 12, 14, 20, 24, 28, 30, 50, 60, 100]
+_STREETS = [
+    "пр. Абая",
+    "ул. Толе би",
+    "пр. Достык",
+    "ул. Жибек жолы",
+    "пр. Сейфуллина",
+    "ул. Розыбакиева",
+    "пр. Райымбека",
+    "ул. Сатпаева",
+    "ул. Тимирязева",
+    "пр. Аль-Фараби",
+]
+
+QUESTION_TEMPLATES = [
+    # Отвечает агент: поиск товара и цены через инструменты
+    "Есть ли у вас {name}?",
+    "Подскажите цену на {name}",
+    # Быстрый путь без модели
+    "Где купить {name}?",
+    "{name}",
+]
+
+_QUESTION_RE = re.compile(
+    r"^(?:есть ли у вас|подскажите цену на|где купить)?\s*(?P<name>.+?)\??$",
+    re.IGNORECASE,
+)
+
+
+def configure_environment(workdir: str, feed_url: Optional[str] = None) -> None:
+    """
+    Ключи-заглушки для проверок в config.py, локальный индекс векторов
+    и кэши во временном каталоге. Postgres берется из DB_* (.env).
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("PINECONE_API_KEY", "benchmark")
+    os.environ.setdefault("API_TOKEN", "benchmark")
+    os.environ["VECTOR_BACKEND"] = "local"
+    os.environ["VECTOR_LOCAL_PATH"] = os.path.join(workdir, "vector_index")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite3")
+    if feed_url is not None:
+        os.environ["FEED_URL"] = feed_url
+    # logger пишет в logs/app.log относительно рабочего каталога
+    os.makedirs("logs", exist_ok=True)
+    sys.path.insert(0, os.getcwd())
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Детерминированная замена ChatOpenAI. Повторяет путь настоящего агента
+    по товарному вопросу: поиск товара, цены, ответ; задержка имитирует
+    время ответа модели. С summarize=True отвечает сводкой без инструментов.
+    """
+
+    latency: float = 0.0
+    summarize: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        if self.summarize:
+            return AIMessage(content="Клиент спрашивал о наличии и ценах товаров.")
+        last_human = max(
+            i for i, message in enumerate(messages) if isinstance(message, HumanMessage)
+        )
+        question = str(messages[last_human].content).strip()
+        match = _QUESTION_RE.match(question)
+        name = match.group("name") if match else question
+        tool_results = [
+            message
+            for message in messages[last_human:]
+            if isinstance(message, ToolMessage)
+        ]
+        step = len(tool_results)
+        call_id = hashlib.md5(f"{question}:{step}".encode()).hexdigest()[:12]
+        if step == 0:
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "find_product_in_vector_store",
+                        "args": {"product_name": name},
+                        "id": f"call_{call_id}",
+                    }
+                ],
+            )
+        if step == 1:
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "get_prices_for_products",
+                        "args": {"product_names": [name]},
+                        "id": f"call_{call_id}",
+                    }
+                ],
+            )
+        return AIMessage(
+            content=f"По запросу «{name}»: {tool_results[-1].content[:300]}"
+        )
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+def install_fakes(llm_latency: float) -> None:
+    """Подменяет модель чата, модель сводки и эмбеддинги уже импортированного src."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    from src.common.embeddings import CachedEmbeddings
+    from src.common.llm_model import get_llm
+    from src.common.tools.ReAct_agent import get_agent, get_agent_llm
+    from src.common.vector_store import get_vector_store
+
+    # Подменяется сама модель: кэш и замер времени остаются как в работе
+    vector_store = get_vector_store()
+    fake_embedding = DeterministicFakeEmbedding(size=vector_store.config.dimension)
+    timed = vector_store.embedding
+    if isinstance(timed, CachedEmbeddings):
+        timed = timed.embeddings
+    timed.embeddings = fake_embedding  # type: ignore[attr-defined]
+
+    get_agent_llm.set(ScriptedChatModel(latency=llm_latency))
+    get_llm.set(ScriptedChatModel(latency=llm_latency, summarize=True))
+    # Отладочный вывод графа на каждом шаге исказил бы замеры
+    get_agent().debug = False
+
+
+def product_names(count: int, seed: int = 0) -> List[str]:
+    """Уникальные названия в духе выгрузки 1С."""
+    rng = random.Random(seed)
+    names: List[str] = []
+    seen = set()
+    series = 0
+    while len(names) < count:
+        name = (
+            f"{rng.choice(_STEMS)} {rng.choice(_FORMS)} "
+            f"{rng.choice(_DOSES)}мг №{rng.choice(_PACKS)}"
+        )
+        if name in seen:
+            series += 1
+            name = f"{name} серия {series}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def pharmacy_addresses(count: int) -> List[str]:
+    return [
+        f"г. Алматы, {_STREETS[i % len(_STREETS)]} {i // len(_STREETS) + 1}"
+        for i in range(count)
+    ]
+
+
+def synthetic_feed(
+    products: int, pharmacies: int, offers_per_product: int, seed: int = 0
+) -> List[Dict[str, str]]:
+    """
+    Строки выгрузки {"name", "address", "price"} (строки, как отдает 1С):
+    каждый товар в offers_per_product случайных аптеках.
+    """
+    rng = random.Random(seed)
+    addresses = pharmacy_addresses(pharmacies)
+    offers = min(offers_per_product, pharmacies)
+    rows = []
+    for name in product_names(products, seed):
+        for address in rng.sample(addresses, offers):
+            rows.append(
+                {
+                    "name": name,
+                    "address": address,
+                    "price": str(rng.randint(150, 25000)),
+                }
+            )
+    return rows
+
+
+def change_prices(
+    rows: List[Dict[str, str]], ratio: float, rng: random.Random
+) -> List[Dict[str, str]]:
+    """Копия выгрузки, в которой у доли ratio строк изменена цена."""
+    changed = [dict(row) for row in rows]
+    for i in rng.sample(range(len(changed)), int(len(changed) * ratio)):
+        changed[i]["price"] = str(int(changed[i]["price"]) + rng.randint(1, 500))
+    return changed
+
+
+def feed_document(rows: Sequence[Dict[str, str]]) -> bytes:
+    return json.dumps({"Products": list(rows)}, ensure_ascii=False).encode("utf-8")
+
+
+class FeedServer:
+    """
+    Локальная замена выгрузки 1С: отдает документ из next_document()
+    с ETag и отвечает 304 на If-None-Match с тем же ETag.
+    """
+
+    def __init__(self, next_document: Callable[[], bytes]) -> None:
+        self.next_document = next_document
+        self.requests = 0
+        self._body = b""
+        self._etag = ""
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body, etag = server.serve()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/feed.json"
+
+    def serve(self) -> Tuple[bytes, str]:
+        with self._lock:
+            self.requests += 1
+            body = self.next_document()
+            if body != self._body:
+                self._body = body
+                self._etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            return self._body, self._etag
+
+    def __enter__(self) -> "FeedServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу; sorted_values отсортированы."""
+    if not sorted_values:
+        return 0.0
+    # Ранг ceil(p/100 * n): round() округляет .5 к четному и сдвигает ранг
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса (Linux: ru_maxrss в КиБ, macOS: в байтах)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def latency_report(
+    latencies: List[float], errors: int, duration: float
+) -> Dict[str, Any]:
+    """Пропускная способность и задержки (мс) по успешным запросам."""
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_table(title: str, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = [
+        max(len(str(column)), *(len(str(row[column])) for row in rows))
+        for column in columns
+    ]
+    print(f"\n{title}")
+    print("  ".join(str(c).rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)))
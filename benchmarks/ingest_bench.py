@@ -0,0 +1,313 @@
+"""
+Микробенчмарк загрузки выгрузки 1С (update_db) на синтетических данных.
+
+Для каждого размера выгрузки и каждого пути загрузки (уже разобранный JSON,
+поток тела запроса, условный GET с локального сервера) таблицы создаются
+заново, выполняется первая загрузка, затем повторные с заданными долями
+измененных цен. По каждому прогону пишутся время, строк в секунду,
+пиковая память и число запросов к базе, в том числе по фазам загрузки.
+
+Таблицы базы удаляются, поэтому нужен отдельный Postgres (DB_*) и флаг
+--reset-db.
+
+Пример:
+    python -m benchmarks.ingest_bench --reset-db --sizes 10000,100000,1000000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.common import (
+    FeedServer,
+    change_prices,
+    configure_environment,
+    feed_document,
+    install_fakes,
+    peak_rss_mb,
+    print_table,
+    synthetic_feed,
+)
+
+PATHS = ("json", "body", "url")
+PHASES = ("parse", "fingerprints", "prepare", "copy", "merge", "catalog")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", default="10000,100000", help="строк выгрузки через запятую"
+    )
+    parser.add_argument(
+        "--ratios",
+        default="0,0.01,0.1,1",
+        help="доли измененных цен для повторных загрузок",
+    )
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--pharmacies", type=int, default=50)
+    parser.add_argument("--offers", type=int, default=5, help="аптек на товар")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="пик памяти Python по фазам (tracemalloc, замедляет прогон)",
+    )
+    parser.add_argument(
+        "--reset-db",
+        action="store_true",
+        help="удалять и создавать таблицы заново (ДАННЫЕ БАЗЫ БУДУТ ПОТЕРЯНЫ)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="записать результаты в файл")
+    args = parser.parse_args()
+    if not args.reset_db:
+        parser.error("бенчмарк пересоздает таблицы: подтвердите флагом --reset-db")
+    return args
+
+
+class Probe:
+    """
+    Время, число вызовов и пик памяти по фазам загрузки, число SQL-запросов
+    и COPY. Фазы снимаются обертками над функциями модулей src.
+    """
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.reset()
+
+    def reset(self) -> None:
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.calls = {phase: 0 for phase in PHASES}
+        self.memory = {phase: 0 for phase in PHASES}
+        self.queries = 0
+        self.copies = 0
+        self.peak = 0
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+    def _memory_mark(self) -> None:
+        if self.trace_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self._memory_mark()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+            self.calls[name] += 1
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.memory[name] = max(self.memory[name], peak)
+                self._memory_mark()
+
+    def on_query(self, *args: Any) -> None:
+        self.queries += 1
+
+    def wrap_async(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with self.phase(name):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    def wrap_sync(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def wrap_stream(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        """Разбор потокового JSON: время каждого шага генератора."""
+
+        async def wrapper(*args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+            items = function(*args, **kwargs).__aiter__()
+            while True:
+                with self.phase("parse"):
+                    try:
+                        item = await items.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield item
+
+        return wrapper
+
+    def result(self, total: float) -> Dict[str, Any]:
+        self._memory_mark()
+        phases = {
+            phase: {
+                "seconds": round(self.seconds[phase], 4),
+                "calls": self.calls[phase],
+                **(
+                    {"peak_mb": round(self.memory[phase] / 2**20, 1)}
+                    if self.trace_memory
+                    else {}
+                ),
+            }
+            for phase in PHASES
+        }
+        measured = sum(self.seconds.values())
+        phases["other"] = {"seconds": round(max(total - measured, 0.0), 4)}
+        return {
+            "phases": phases,
+            "queries": self.queries,
+            "copies": self.copies,
+            **(
+                {"traced_peak_mb": round(self.peak / 2**20, 1)}
+                if self.trace_memory
+                else {}
+            ),
+        }
+
+
+def install_probe(probe: Probe) -> None:
+    """Подставляет обертки в CRUD и каталог уже импортированного src."""
+    from sqlalchemy import event
+
+    from src.db import CRUD
+    from src.db.catalog import catalog
+    from src.db.database import get_engine
+
+    copy_to_staging = CRUD.copy_to_staging
+
+    async def counted_copy(*args: Any, **kwargs: Any) -> None:
+        probe.copies += 1
+        await copy_to_staging(*args, **kwargs)
+
+    CRUD.load_fingerprints = probe.wrap_async("fingerprints", CRUD.load_fingerprints)
+    CRUD.copy_to_staging = probe.wrap_async("copy", counted_copy)
+    CRUD.merge_staging = probe.wrap_async("merge", CRUD.merge_staging)
+    CRUD.bump_catalog_version = probe.wrap_async("catalog", CRUD.bump_catalog_version)
+    CRUD.iter_json_array = probe.wrap_stream(CRUD.iter_json_array)
+    # Функции модуля с двумя подчеркиваниями вызываются по глобальному имени
+    setattr(
+        CRUD,
+        "__prepare_batch",
+        probe.wrap_sync("prepare", getattr(CRUD, "__prepare_batch")),
+    )
+    catalog.reload = probe.wrap_async("catalog", catalog.reload)  # type: ignore
+    event.listen(get_engine().sync_engine, "before_cursor_execute", probe.on_query)
+
+
+async def _chunks(document: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(document), size):
+        end = start + size
+        yield document[start:end]
+
+
+async def run_update(
+    path: str, document: bytes, feed: FeedServer, probe: Probe
+) -> Dict[str, Any]:
+    """Одна загрузка выбранным путем; замер от начала разбора до commit."""
+    from src.db import CRUD
+    from src.db.database import get_session
+
+    probe.reset()
+    started = time.perf_counter()
+    async with get_session() as db:
+        if path == "json":
+            with probe.phase("parse"):
+                json_data = json.loads(document)
+            stats = await CRUD.update_db(db, json_data=json_data)
+        elif path == "body":
+            stats = await CRUD.update_db(
+                db, body=_chunks(document, CRUD.feed_settings.chunk_size)
+            )
+        else:
+            feed.next_document = lambda: document
+            stats = await CRUD.update_db(db, json_url=feed.url)
+    total = time.perf_counter() - started
+    return {
+        "seconds": round(total, 4),
+        "stats": stats.model_dump(),
+        **probe.result(total),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args: argparse.Namespace, feed: FeedServer) -> List[Dict[str, Any]]:
+    from src.db import CRUD
+
+    install_fakes(llm_latency=0.0)
+    probe = Probe(args.trace_memory)
+    install_probe(probe)
+    if args.trace_memory:
+        tracemalloc.start()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    ratios = [float(ratio) for ratio in args.ratios.split(",")]
+    paths = [path for path in args.paths.split(",") if path]
+    results = []
+    for size in sizes:
+        products = max(size // args.offers, 1)
+        base = synthetic_feed(products, args.pharmacies, args.offers, args.seed)
+        for path in paths:
+            await CRUD.drop_db()
+            await CRUD.create_db()
+            rng = random.Random(args.seed)
+            rows = base
+            scenarios: List[Tuple[str, Optional[float]]] = [("initial", None)]
+            scenarios += [("reload", ratio) for ratio in ratios]
+            for scenario, ratio in scenarios:
+                if ratio is not None:
+                    rows = change_prices(rows, ratio, rng)
+                document = feed_document(rows)
+                result = await run_update(path, document, feed, probe)
+                result.update(
+                    size=len(rows),
+                    path=path,
+                    scenario=scenario,
+                    change_ratio=ratio,
+                    rows_per_s=round(len(rows) / result["seconds"]),
+                )
+                results.append(result)
+                print(
+                    f"{len(rows)} rows, {path}, {scenario} {ratio or ''}: "
+                    f"{result['seconds']}s",
+                    flush=True,
+                )
+    return results
+
+
+def summary_row(result: Dict[str, Any]) -> Dict[str, Any]:
+    row = {
+        "size": result["size"],
+        "path": result["path"],
+        "scenario": result["scenario"],
+        "ratio": "-" if result["change_ratio"] is None else result["change_ratio"],
+        "seconds": result["seconds"],
+        "rows/s": result["rows_per_s"],
+        "queries": result["queries"],
+        "copies": result["copies"],
+    }
+    row.update({phase: values["seconds"] for phase, values in result["phases"].items()})
+    if "traced_peak_mb" in result:
+        row["traced_mb"] = result["traced_peak_mb"]
+    row["rss_mb"] = result["peak_rss_mb"]
+    return row
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="salamat-bench-") as workdir:
+        with FeedServer(lambda: b"") as feed:
+            configure_environment(workdir, feed_url=feed.url)
+            results = asyncio.run(run(args, feed))
+
+    print_table("update_db", [summary_row(result) for result in results])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
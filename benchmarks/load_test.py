@@ -0,0 +1,213 @@
+"""
+Нагрузочный тест API без внешних сервисов.
+
+Поднимает приложение FastAPI в процессе (httpx + ASGITransport) с подставной
+моделью чата, детерминированными эмбеддингами, локальным индексом векторов
+и локальным сервером выгрузки 1С; каталог синтетический, Postgres локальный
+(DB_* из окружения или .env). Гоняет /api/v1/ask_llm и /api/v1/update_DB
+с заданной конкурентностью и печатает пропускную способность,
+p50/p95/p99 задержки и пиковый RSS.
+
+Пример:
+    python -m benchmarks.load_test --reset-db --products 2000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import (
+    QUESTION_TEMPLATES,
+    FeedServer,
+    change_prices,
+    configure_environment,
+    feed_document,
+    install_fakes,
+    latency_report,
+    print_table,
+    synthetic_feed,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--pharmacies", type=int, default=20)
+    parser.add_argument("--offers", type=int, default=5, help="аптек на товар")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="вопросов к агенту")
+    parser.add_argument("--turns", type=int, default=2, help="вопросов на диалог")
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.05, help="задержка модели, с"
+    )
+    parser.add_argument("--update-requests", type=int, default=3)
+    parser.add_argument(
+        "--change-ratio", type=float, default=0.05, help="доля цен, меняемых 1С"
+    )
+    parser.add_argument(
+        "--reset-db",
+        action="store_true",
+        help="удалить и создать таблицы заново (ДАННЫЕ БАЗЫ БУДУТ ПОТЕРЯНЫ)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="записать результаты в файл")
+    return parser.parse_args()
+
+
+def build_conversations(
+    names: List[str], requests: int, turns: int, rng: random.Random
+) -> List[List[str]]:
+    """Диалоги по turns вопросов; шаблоны чередуют агента и быстрый путь."""
+    conversations = []
+    for start in range(0, requests, turns):
+        count = min(turns, requests - start)
+        conversations.append(
+            [
+                rng.choice(QUESTION_TEMPLATES).format(name=rng.choice(names))
+                for _ in range(count)
+            ]
+        )
+    return conversations
+
+
+async def ask_phase(
+    client: Any, conversations: List[List[str]], concurrency: int
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    queue: "asyncio.Queue[List[str]]" = asyncio.Queue()
+    for conversation in conversations:
+        queue.put_nowait(conversation)
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            conversation = queue.get_nowait()
+            thread_id = f"bench-{uuid.uuid4()}"
+            for question in conversation:
+                started = time.perf_counter()
+                response = await client.request(
+                    "GET",
+                    "/api/v1/ask_llm",
+                    json={"user_input": question, "thread_id": thread_id},
+                )
+                elapsed = time.perf_counter() - started
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_report(latencies, errors, time.perf_counter() - started)
+
+
+async def update_phase(client: Any, requests: int) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Загрузки по одной (advisory lock все равно выстраивает их в очередь):
+    время от POST до конечного статуса задачи.
+    """
+    latencies: List[float] = []
+    statuses: List[str] = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        response = await client.post("/api/v1/update_DB")
+        if response.status_code != 202:
+            errors += 1
+            continue
+        job_id = response.json()["job"]["id"]
+        while True:
+            job = (await client.get(f"/api/v1/update_DB/{job_id}")).json()["job"]
+            if job["status"] in ("done", "not_modified", "failed"):
+                break
+            await asyncio.sleep(0.05)
+        statuses.append(job["status"])
+        if job["status"] == "failed":
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - request_started)
+    return latency_report(latencies, errors, time.perf_counter() - started), statuses
+
+
+async def run(args: argparse.Namespace, feed: FeedServer) -> Dict[str, Any]:
+    import httpx
+
+    from src.db import CRUD
+    from src.db.database import get_session
+    from src.main import app
+
+    install_fakes(args.llm_latency)
+
+    if args.reset_db:
+        await CRUD.drop_db()
+        await CRUD.create_db()
+
+    rows = synthetic_feed(args.products, args.pharmacies, args.offers, args.seed)
+    started = time.perf_counter()
+    async with get_session() as db:
+        stats = await CRUD.update_db(db, json_data={"Products": rows})
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    await CRUD.update_vector_store()
+    index_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    names = sorted({row["name"] for row in rows})
+    conversations = build_conversations(names, args.requests, args.turns, rng)
+
+    # Сервер выгрузки меняет цены при каждом запросе 1С
+    feed.next_document = lambda: feed_document(
+        change_prices(rows, args.change_ratio, rng)
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        ask = await ask_phase(client, conversations, args.concurrency)
+        update, statuses = await update_phase(client, args.update_requests)
+
+    return {
+        "config": vars(args),
+        "setup": {
+            "feed_rows": len(rows),
+            "load_s": round(load_seconds, 3),
+            "index_s": round(index_seconds, 3),
+            "inserted": stats.inserted,
+        },
+        "ask_llm": ask,
+        "update_DB": update,
+        "update_statuses": statuses,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="salamat-bench-") as workdir:
+        with FeedServer(lambda: feed_document([])) as feed:
+            configure_environment(workdir, feed_url=feed.url)
+            result = asyncio.run(run(args, feed))
+
+    print(json.dumps(result["setup"], ensure_ascii=False))
+    print("update_DB statuses:", ", ".join(result["update_statuses"]))
+    print_table(
+        "Latency",
+        [
+            {"endpoint": endpoint, **result[endpoint]}
+            for endpoint in ("ask_llm", "update_DB")
+        ],
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Время запуска приложения: импорт src.main и прогрев в lifespan до /ready.
+
+Каждый замер — отдельный процесс с холодным импортом; lifespan запускается
+без сервера, ключи-заглушки, локальный индекс векторов, без запросов к OpenAI
+(WARMUP_HTTP=false). Postgres берется из DB_* (.env). Печатает медиану
+и максимум по шагам.
+
+Пример:
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import configure_environment, peak_rss_mb, print_table
+
+_RESULT_PREFIX = "startup-result: "
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="записать результаты в файл")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+async def child_run() -> Dict[str, Any]:
+    from src.main import app
+    from src.common.warmup import warmup_state
+
+    async with app.router.lifespan_context(app):
+        while not warmup_state.ready and warmup_state.error is None:
+            await asyncio.sleep(0.005)
+    return {**warmup_state.as_dict(), "peak_rss_mb": peak_rss_mb()}
+
+
+def child() -> None:
+    with tempfile.TemporaryDirectory(prefix="salamat-bench-") as workdir:
+        configure_environment(workdir)
+        os.environ["WARMUP_HTTP"] = "false"
+        result = asyncio.run(child_run())
+    print(_RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def measure() -> Dict[str, Any]:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    process_seconds = time.perf_counter() - started
+    # В stdout еще и лог приложения
+    line = next(
+        line
+        for line in completed.stdout.splitlines()
+        if line.startswith(_RESULT_PREFIX)
+    )
+    start = len(_RESULT_PREFIX)
+    result = json.loads(line[start:])
+    if result["error"]:
+        raise RuntimeError(f"Warm-up failed: {result['error']}")
+    result["process_seconds"] = round(process_seconds, 3)
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    series: Dict[str, List[float]] = {
+        "import": [run["import_seconds"] for run in runs],
+        "ready": [run["ready_seconds"] for run in runs],
+        "process": [run["process_seconds"] for run in runs],
+    }
+    for run in runs:
+        for step, info in run["steps"].items():
+            series.setdefault(f"step:{step}", []).append(info["seconds"])
+    return [
+        {
+            "phase": phase,
+            "median_s": round(statistics.median(values), 3),
+            "max_s": round(max(values), 3),
+        }
+        for phase, values in series.items()
+    ]
+
+
+def main() -> None:
+    args = parse_args()
+    if args.child:
+        child()
+        return
+    runs = [measure() for _ in range(args.runs)]
+    rows = summarize(runs)
+    print_table("Startup", rows)
+    print("peak RSS, MB:", max(run["peak_rss_mb"] for run in runs))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"runs": runs, "summary": rows}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""initial schema
+
+Таблицы, которые раньше создавались только через create_db().
+На существующей базе ничего не меняет (if_not_exists).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:40:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pharmacies",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("address"),
+        sa.UniqueConstraint("phone"),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "pharmacy_products",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("pharmacy_id", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["pharmacy_id"], ["pharmacies.id"]),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("product_id", "pharmacy_id", name="uix_product_pharmacy"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("pharmacy_products")
+    op.drop_table("products")
+    op.drop_table("pharmacies")
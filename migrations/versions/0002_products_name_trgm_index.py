@@ -0,0 +1,43 @@
+"""pg_trgm GIN index on products.name
+
+Индекс обслуживает ILIKE '%...%', оператор % и similarity() в поиске товаров.
+Строится CONCURRENTLY, чтобы не блокировать запись в products.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:45:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_name_trgm",
+            "products",
+            ["name"],
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_products_name_trgm",
+            table_name="products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,34 @@
+"""unlogged feed_staging table for COPY-based ingestion
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:10:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "feed_staging",
+        sa.Column("seq", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("seq"),
+        prefixes=["UNLOGGED"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("feed_staging")
@@ -0,0 +1,47 @@
+"""feed_state validators and per-row fingerprints for delta ingestion
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "feed_state",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("etag", sa.String(), nullable=True),
+        sa.Column("last_modified", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("url"),
+        if_not_exists=True,
+    )
+    # Старые строки получат отпечаток при первой загрузке после миграции
+    op.add_column(
+        "pharmacy_products",
+        sa.Column("fingerprint", sa.BigInteger(), nullable=True),
+    )
+    # feed_staging пуста вне загрузки, поэтому NOT NULL можно добавить сразу
+    op.execute("TRUNCATE feed_staging")
+    op.add_column(
+        "feed_staging",
+        sa.Column("fingerprint", sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("feed_staging", "fingerprint")
+    op.drop_column("pharmacy_products", "fingerprint")
+    op.drop_table("feed_state")
@@ -0,0 +1,28 @@
+"""building_namespace for resumable vector index rebuilds
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "vector_index_state",
+        sa.Column("building_namespace", sa.String(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("vector_index_state", "building_namespace")
@@ -0,0 +1,71 @@
+"""agent_checkpoints and agent_checkpoint_writes for the Postgres checkpointer
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 16:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "agent_checkpoints",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("thread_id", sa.String(), nullable=False),
+        sa.Column("checkpoint_ns", sa.String(), nullable=False),
+        sa.Column("checkpoint_id", sa.String(), nullable=False),
+        sa.Column("parent_checkpoint_id", sa.String(), nullable=True),
+        sa.Column("checkpoint_type", sa.String(), nullable=False),
+        sa.Column("checkpoint", sa.LargeBinary(), nullable=False),
+        sa.Column("metadata_type", sa.String(), nullable=False),
+        sa.Column("checkpoint_metadata", sa.LargeBinary(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("thread_id", "checkpoint_ns"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_agent_checkpoints_updated_at",
+        "agent_checkpoints",
+        ["updated_at"],
+        if_not_exists=True,
+    )
+    op.create_table(
+        "agent_checkpoint_writes",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("thread_id", sa.String(), nullable=False),
+        sa.Column("checkpoint_ns", sa.String(), nullable=False),
+        sa.Column("checkpoint_id", sa.String(), nullable=False),
+        sa.Column("task_id", sa.String(), nullable=False),
+        sa.Column("task_path", sa.String(), nullable=False),
+        sa.Column("idx", sa.Integer(), nullable=False),
+        sa.Column("channel", sa.String(), nullable=False),
+        sa.Column("value_type", sa.String(), nullable=False),
+        sa.Column("value", sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"
+        ),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("agent_checkpoint_writes")
+    op.drop_index("ix_agent_checkpoints_updated_at", table_name="agent_checkpoints")
+    op.drop_table("agent_checkpoints")
@@ -0,0 +1,29 @@
+"""catalog_version_seq for catalog-versioned caches
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 17:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        sa.schema.CreateSequence(sa.Sequence("catalog_version_seq"), if_not_exists=True)
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        sa.schema.DropSequence(sa.Sequence("catalog_version_seq"), if_exists=True)
+    )
@@ -0,0 +1,28 @@
+"""index_version for cross-worker search cache invalidation
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 19:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "vector_index_state",
+        sa.Column("index_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("vector_index_state", "index_version")
@@ -0,0 +1,28 @@
+"""heartbeat_at for detecting ingest jobs orphaned by a stopped worker
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 20:00:00
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ingest_jobs",
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ingest_jobs", "heartbeat_at")
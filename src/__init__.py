@@ -0,0 +1,4 @@
+import time
+
+# Начало импорта приложения: от него считаются время импорта и готовности
+IMPORT_STARTED = time.perf_counter()
@@ -1,21 +1,27 @@
-from typing import Annotated, Any, Dict
+import asyncio
+import json
+from typing import IO, Annotated, Any, AsyncIterator, Dict, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
-# from sqlalchemy import text, func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+# from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from starlette.requests import Request
 
-from src.common.tools.ReAct_agent import agent
-from src.db.CRUD import (
-    # create_db,
-    # drop_db,
-    update_db,
-    # update_vector_store,
-)
-from src.db.database import get_db
+from src.common.context import SUMMARY_TAG
+from src.common.telemetry import traced_config
+from src.common.tools.answer_cache import answer_cache
+from src.common.tools.fast_path import fast_answer
+from src.common.tools.ReAct_agent import get_agent, thread_lock
+from src.common.vector_store import get_vector_store
+from src.db.database import get_db, pool_stats
+from src.db.jobs import enqueue_ingest, enqueue_rebuild, get_ingest_job, spool_file
 
+# from src.db.CRUD import create_db, drop_db, update_vector_store
 # from src.db.Models import Pharmacy, Product
 from src.common.logger import logger
 
@@ -23,10 +29,10 @@ router: APIRouter = APIRouter()
 logger.info("Starting app .....")
 
 
-@router.get("/ask_llm", tags=["Agent"])
-async def ask_agent(
+async def _agent_request(
     request: Request,
-) -> Any:
+) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    """Вопрос клиента, входные данные и config для агента из тела запроса."""
     try:
         body = await request.json()
         user_input = body.get("user_input", None)
@@ -48,10 +54,26 @@ async def ask_agent(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {e}",
         )
+    return user_input, inputs, config
+
+
+@router.get("/ask_llm", tags=["Agent"])
+async def ask_agent(
+    request: Request,
+) -> Any:
+    user_input, inputs, config = await _agent_request(request)
 
     try:
-        answer = agent.invoke(inputs, config=config)
+        async with thread_lock(config):
+            fast = await fast_answer(user_input, config)
+            if fast is not None:
+                return {"answer": fast}
+            cached, cache_key = await answer_cache.lookup(user_input, config)
+            if cached is not None:
+                return {"answer": cached}
+            answer = await get_agent().ainvoke(inputs, config=traced_config(config))
         ai_answer = answer["messages"][-1].content
+        answer_cache.store(cache_key, ai_answer)
     except AttributeError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -65,18 +87,103 @@ async def ask_agent(
     return {"answer": ai_answer}
 
 
-# @router.get("/status_DB", tags=["database"])
-# async def get_postgres_db_status(
-#     get_db_session: Annotated[Session, Depends(get_db)], request: Request
-# ) -> Dict[str, Any]:
-#     try:
-#         version = get_db_session.scalar(text("SELECT version();"))
-#     except Exception as e:
-#         raise HTTPException(
-#             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-#             detail=f"Error connecting to DB {e}",
-#         )
-#     return {"status": status.HTTP_200_OK, "DB_version": version}
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return (
+        f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    )
+
+
+async def _agent_events(
+    user_input: str, inputs: Dict[str, Any], config: Dict[str, Any]
+) -> AsyncIterator[str]:
+    """
+    События выполнения графа в формате SSE:
+    token — кусок ответа модели, tool_start/tool_end — вызовы инструментов,
+    answer — итоговый ответ (как в /ask_llm), error — ошибка.
+    """
+    try:
+        async with thread_lock(config):
+            fast = await fast_answer(user_input, config)
+            if fast is not None:
+                yield _sse("answer", {"answer": fast})
+                return
+            cached, cache_key = await answer_cache.lookup(user_input, config)
+            if cached is not None:
+                yield _sse("answer", {"answer": cached})
+                return
+            async for event in get_agent().astream_events(
+                inputs, config=traced_config(config), version="v2"
+            ):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    # Токены сводки истории клиенту не показываем
+                    if SUMMARY_TAG in event.get("tags", []):
+                        continue
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield _sse("token", {"content": content})
+                elif kind == "on_tool_start":
+                    yield _sse(
+                        "tool_start",
+                        {"name": event["name"], "input": event["data"].get("input")},
+                    )
+                elif kind == "on_tool_end":
+                    output = event["data"].get("output")
+                    yield _sse(
+                        "tool_end",
+                        {
+                            "name": event["name"],
+                            "output": str(getattr(output, "content", output)),
+                        },
+                    )
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # Завершение всего графа
+                    answer = event["data"]["output"]["messages"][-1].content
+                    answer_cache.store(cache_key, answer)
+                    yield _sse("answer", {"answer": answer})
+    except Exception as e:
+        logger.error("Agent stream failed: %s", e)
+        yield _sse("error", {"detail": str(e)})
+
+
+@router.get("/ask_llm/stream", tags=["Agent"])
+async def ask_agent_stream(request: Request) -> StreamingResponse:
+    user_input, inputs, config = await _agent_request(request)
+    return StreamingResponse(
+        _agent_events(user_input, inputs, config),
+        media_type="text/event-stream",
+        # Без буферизации на прокси, чтобы токены уходили сразу
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/status_DB", tags=["database"])
+async def get_postgres_db_status(
+    get_db_session: Annotated[AsyncSession, Depends(get_db)], request: Request
+) -> Dict[str, Any]:
+    try:
+        version = await get_db_session.scalar(text("SELECT version();"))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error connecting to DB {e}",
+        )
+    return {
+        "status": status.HTTP_200_OK,
+        "DB_version": version,
+        "pool": pool_stats.as_dict(),
+    }
+
+
+@router.get("/status_cache", tags=["cache"])
+async def get_cache_status() -> Dict[str, Any]:
+    vector_store = get_vector_store()
+    return {
+        "status": status.HTTP_200_OK,
+        "embeddings": vector_store.cache_stats(),
+        "search_results": vector_store.results_cache.stats(),
+        "answers": answer_cache.stats(),
+    }
 
 
 # @router.get("/get_amount_products", tags=["database"])
@@ -108,27 +215,76 @@ async def ask_agent(
 #         return {"status_code": status.HTTP_200_OK, "transaction": f"{message}"}
 
 
-@router.post("/update_DB", tags=["database"])
-async def update_db_from_1c(
-    request: Request,
-    db: Annotated[Session, Depends(get_db)],
-) -> Dict[str, Any]:
+async def _spool_body(request: Request) -> Optional[IO[bytes]]:
+    """
+    Сохраняет тело запроса в буфер (память, затем диск), чтобы фоновая
+    задача могла прочитать его после ответа.
+    Пустое тело -> None: тогда выгрузка скачивается по URL из настроек.
+    """
+    spool = spool_file()
+    size = 0
+    async for chunk in request.stream():
+        if size or chunk.strip():
+            # После spool_max_size буфер пишет на диск: не в event loop
+            await asyncio.to_thread(spool.write, chunk)
+            size += len(chunk)
+    if not size:
+        spool.close()
+        return None
+    return spool
+
+
+@router.post("/update_DB", tags=["database"], status_code=status.HTTP_202_ACCEPTED)
+async def update_db_from_1c(request: Request) -> Dict[str, Any]:
     try:
-        json_data = await request.json()
-        amount_updated = update_db(db, json_data=json_data if json_data else None)
+        spool = await _spool_body(request)
+        job = await enqueue_ingest(spool)
     except Exception as e:
-        if isinstance(e, ValueError):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Invalid JSON body"
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Internal server error",
-            )
+        logger.error("Failed to enqueue ingest job: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error",
+        )
+    return {
+        "status_code": status.HTTP_202_ACCEPTED,
+        "message": f"Ingest job {job.id} queued",
+        "job_id": job.id,
+        "job": job.model_dump(),
+    }
+
+
+@router.get("/update_DB/{job_id}", tags=["database"])
+async def get_update_db_status(job_id: int) -> Dict[str, Any]:
+    job = await get_ingest_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingest job {job_id} not found",
+        )
+    return {"status_code": status.HTTP_200_OK, "job": job.model_dump()}
+
+
+@router.post(
+    "/rebuild_vector", tags=["vector store"], status_code=status.HTTP_202_ACCEPTED
+)
+async def rebuild_vector() -> Dict[str, Any]:
+    """
+    Полная пересборка индекса векторов в новом пространстве имен без простоя
+    поиска. Статус задачи — GET /update_DB/{job_id}.
+    """
+    try:
+        job = await enqueue_rebuild()
+    except Exception as e:
+        logger.error("Failed to enqueue vector store rebuild: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error",
+        )
     return {
         "status_code": status.HTTP_202_ACCEPTED,
-        "message": f"Total updated: {amount_updated}",
+        "message": f"Vector store rebuild job {job.id} {job.status}",
+        "job_id": job.id,
+        "job": job.model_dump(),
     }
 
 
@@ -1,17 +1,21 @@
 from src.common.Schemas.pharmacy_schemas import (
     Client,
+    IngestJobSchema,
     ItemOrder,
     Order,
     PharmacyProductSchema,
     PharmacySchema,
     ProductSchema,
+    UpdateStats,
 )
 
 __all__ = [
     "Client",
+    "IngestJobSchema",
     "ItemOrder",
     "Order",
     "PharmacySchema",
     "PharmacyProductSchema",
     "ProductSchema",
+    "UpdateStats",
 ]
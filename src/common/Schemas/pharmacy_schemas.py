@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class Client(BaseModel):
@@ -45,6 +46,41 @@ class PharmacyProductSchema(BaseModel):
         }
 
 
+class UpdateStats(BaseModel):
+    """Итог загрузки выгрузки из 1С"""
+
+    inserted: int = Field(default=0, description="Новые связки товар-аптека")
+    updated: int = Field(default=0, description="Связки с изменившейся ценой")
+    unchanged: int = Field(default=0, description="Связки без изменений")
+    rejected: int = Field(default=0, description="Строки, не прошедшие проверку")
+    not_modified: bool = Field(
+        default=False, description="Выгрузка не менялась с прошлой загрузки"
+    )
+
+
+class IngestJobSchema(BaseModel):
+    """Статус фоновой задачи: загрузки выгрузки из 1С или пересборки индекса"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int = Field(description="Номер задачи")
+    status: str = Field(description="queued, running, done, not_modified или failed")
+    source: str = Field(
+        description="Источник: url или body для выгрузки, rebuild для пересборки"
+    )
+    processed: int = Field(
+        default=0, description="Обработано строк выгрузки или записано векторов"
+    )
+    stats: Optional[UpdateStats] = Field(default=None, description="Итог загрузки")
+    error: Optional[str] = Field(default=None, description="Текст ошибки")
+    created_at: datetime = Field(description="Время постановки в очередь")
+    started_at: Optional[datetime] = Field(default=None, description="Начало")
+    finished_at: Optional[datetime] = Field(default=None, description="Окончание")
+    heartbeat_at: Optional[datetime] = Field(
+        default=None, description="Последняя отметка воркера о том, что задача идет"
+    )
+
+
 class ItemOrder(BaseModel):
     """Модель товара в заказе"""
 
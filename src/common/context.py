@@ -0,0 +1,238 @@
+import json
+import time
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from src.common.llm_model import get_llm
+from src.common.logger import logger
+from src.common.telemetry import observe_llm
+from src.settings.config import MAX_HISTORY_LENGTH, ContextSettings, LLMSettings
+
+settings = ContextSettings()
+chat_model = LLMSettings().chat_model
+
+# Тег вызова модели для сводки, чтобы отличать его токены в потоке событий
+SUMMARY_TAG = "history_summary"
+
+# Служебные токены OpenAI на каждое сообщение (роль, разметка)
+_MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "Ты ведешь краткую сводку диалога клиента с фармацевтом call-центра аптеки. "
+    "Обнови сводку с учетом новых сообщений. Сохрани все, что нужно для "
+    "продолжения: имя и телефон клиента, адреса аптеки и доставки, выбранные "
+    "товары с количеством и ценами, способ оплаты, статус заказа и открытые "
+    "вопросы. Результаты поиска и служебные детали опусти. Пиши на языке "
+    "клиента, не длиннее 150 слов."
+)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Any:
+    """Токенизатор модели или None, если tiktoken недоступен."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("Tokenizer for %s unavailable, estimating tokens: %s", model, e)
+        return None
+
+
+def load_tokenizer() -> None:
+    """
+    Загружает токенизатор заранее: при первой загрузке tiktoken может
+    скачивать словарь, и это не должно происходить в event loop.
+    """
+    _encoding(chat_model)
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding(chat_model)
+    if encoding is None:
+        # Грубая оценка для кириллицы: около трех символов на токен
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    text = (
+        content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    )
+    if isinstance(message, AIMessage) and message.tool_calls:
+        calls = [(call["name"], call["args"]) for call in message.tool_calls]
+        text += json.dumps(calls, ensure_ascii=False)
+    return text
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return count_tokens(_message_text(message)) + _MESSAGE_OVERHEAD
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Реплики: сообщение клиента и все, что после него до следующего."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def compress_stale_tool_outputs(
+    messages: Sequence[BaseMessage], max_chars: int
+) -> List[BaseMessage]:
+    """
+    Укорачивает ответы инструментов из прошлых реплик: модели нужен
+    итог поиска, а не весь список совпадений. Текущая реплика не трогается.
+    """
+    last_human = max(
+        (i for i, message in enumerate(messages) if isinstance(message, HumanMessage)),
+        default=len(messages),
+    )
+    compressed: List[BaseMessage] = []
+    for i, message in enumerate(messages):
+        content = message.content
+        stale = i < last_human and isinstance(message, ToolMessage)
+        if stale and isinstance(content, str) and len(content) > max_chars:
+            message = message.model_copy(
+                update={"content": content[:max_chars] + " …[сокращено]"}
+            )
+        compressed.append(message)
+    return compressed
+
+
+def compressed_history(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """История для модели без сворачивания в сводку."""
+    return compress_stale_tool_outputs(messages, settings.stale_tool_chars)
+
+
+class ContextPlan(NamedTuple):
+    # Сообщения для модели после сжатия
+    prompt: List[BaseMessage]
+    # Старые сообщения, которые уходят в сводку и удаляются из состояния
+    folded: List[BaseMessage]
+
+
+def plan_context(messages: Sequence[BaseMessage], summary: str) -> ContextPlan:
+    """
+    Решает, какие реплики свернуть в сводку. Пока история со сводкой
+    укладывается в token_budget и MAX_HISTORY_LENGTH, ничего не сворачивается.
+    Иначе старые реплики сворачиваются до target_ratio бюджета и target_ratio
+    MAX_HISTORY_LENGTH сообщений, чтобы сводка не пересчитывалась на каждом
+    шаге. Последние keep_recent_turns реплик остаются целиком, если без этого
+    укладываемся в MAX_HISTORY_LENGTH; текущая реплика не сворачивается никогда.
+    """
+    compressed = compressed_history(messages)
+    turns = split_turns(compressed)
+    sizes = [sum(message_tokens(message) for message in turn) for turn in turns]
+    total = count_tokens(summary) + sum(sizes)
+    # + 1: ответ модели тоже попадет в историю
+    count = len(compressed) + 1
+    if total <= settings.token_budget and count <= MAX_HISTORY_LENGTH:
+        return ContextPlan(compressed, [])
+
+    target = settings.token_budget * settings.target_ratio
+    count_target = MAX_HISTORY_LENGTH * settings.target_ratio
+    by_target = max(len(turns) - settings.keep_recent_turns, 0)
+    by_count = max(len(turns) - 1, 0)
+    folded_turns = 0
+    while folded_turns < by_count:
+        over_target = folded_turns < by_target and (
+            total > target or count > count_target
+        )
+        if not over_target and count <= MAX_HISTORY_LENGTH:
+            break
+        total -= sizes[folded_turns]
+        count -= len(turns[folded_turns])
+        folded_turns += 1
+    split = sum(len(turn) for turn in turns[:folded_turns])
+    return ContextPlan(compressed[split:], list(messages[:split]))
+
+
+def cap_history(messages: Sequence[BaseMessage]) -> ContextPlan:
+    """
+    Только жесткий предел MAX_HISTORY_LENGTH: старые реплики удаляются
+    без сводки. Запасной вариант, когда сводку получить не удалось.
+    """
+    compressed = compressed_history(messages)
+    turns = split_turns(compressed)
+    count = len(compressed) + 1
+    folded_turns = 0
+    while folded_turns < len(turns) - 1 and count > MAX_HISTORY_LENGTH:
+        count -= len(turns[folded_turns])
+        folded_turns += 1
+    split = sum(len(turn) for turn in turns[:folded_turns])
+    return ContextPlan(compressed[split:], list(messages[:split]))
+
+
+async def fold_history(
+    messages: Sequence[BaseMessage], summary: str
+) -> Tuple[ContextPlan, str]:
+    """
+    plan_context со сводкой свернутых реплик. Если сводку получить не удалось,
+    старые реплики удаляются до предела истории (cap_history), остальное
+    сворачивается при следующей записи в поток.
+    :return: План и новая сводка; plan.folded нужно удалить из состояния
+    """
+    plan = plan_context(messages, summary)
+    if not plan.folded:
+        return plan, summary
+    try:
+        summary = await summarize(summary, plan.folded)
+    except Exception as e:
+        plan = cap_history(messages)
+        logger.warning(
+            "Failed to summarize conversation, dropped %s messages: %s",
+            len(plan.folded),
+            e,
+        )
+    return plan, summary
+
+
+def _transcript(messages: Sequence[BaseMessage]) -> str:
+    lines = []
+    for message in compressed_history(messages):
+        if isinstance(message, HumanMessage):
+            role = "Клиент"
+        elif isinstance(message, ToolMessage):
+            role = f"Инструмент {message.name or ''}".strip()
+        else:
+            role = "Ассистент"
+        lines.append(f"{role}: {_message_text(message)}")
+    return "\n".join(lines)
+
+
+async def summarize(summary: str, messages: Sequence[BaseMessage]) -> str:
+    """Сводка с учетом свернутых сообщений."""
+    previous = f"Текущая сводка:\n{summary}\n\n" if summary else ""
+    started = time.perf_counter()
+    response = await get_llm().ainvoke(
+        [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(
+                content=f"{previous}Новые сообщения:\n{_transcript(messages)}"
+            ),
+        ],
+        config={"tags": [SUMMARY_TAG]},
+    )
+    observe_llm("summary", time.perf_counter() - started, response)
+    return str(response.content).strip()
+
+
+def summary_message(summary: str) -> Optional[SystemMessage]:
+    if not summary:
+        return None
+    return SystemMessage(content=f"Краткое содержание начала диалога:\n{summary}")
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import sqlite3
+import sys
+import threading
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+)
+
+from langchain_core.embeddings import Embeddings
+
+from src.common.cache import LRUCache
+from src.common.telemetry import EMBEDDING_SECONDS, observe
+
+Vector = List[float]
+
+if TYPE_CHECKING:
+    # Вектор в кэше: float32, 4 байта на число вместо ~32 у списка float
+    PackedVector = array[float]
+else:
+    PackedVector = array
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQLITE_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFKC, без учета регистра, пробелы схлопнуты."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class EmbeddingStore:
+    """
+    Дисковый уровень кэша эмбеддингов (SQLite): переживает перезапуск
+    и общий для воркеров на одной машине. Векторы хранятся как float32.
+    """
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=5.0
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+
+    def get_many(self, keys: List[str]) -> Dict[str, PackedVector]:
+        found: Dict[str, PackedVector] = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH_SIZE):
+                end = start + _SQLITE_BATCH_SIZE
+                batch = keys[start:end]
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector
+        return found
+
+    def put_many(self, items: Dict[str, PackedVector]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                    ((key, vector.tobytes()) for key, vector in items.items()),
+                )
+            except BaseException:
+                # Иначе соединение остается в открытой транзакции
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+
+class TimedEmbeddings(Embeddings):
+    """Модель эмбеддингов с замером времени каждого запроса к ней."""
+
+    def __init__(self, embeddings: Embeddings) -> None:
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[Vector]:
+        with observe(EMBEDDING_SECONDS, operation="documents"):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> Vector:
+        with observe(EMBEDDING_SECONDS, operation="query"):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[Vector]:
+        with observe(EMBEDDING_SECONDS, operation="documents"):
+            return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> Vector:
+        with observe(EMBEDDING_SECONDS, operation="query"):
+            return await self.embeddings.aembed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Обертка над моделью эмбеддингов с двухуровневым кэшем:
+    LRU в памяти процесса, за ним EmbeddingStore на диске.
+    В памяти векторы хранятся как float32; размер LRU задается в байтах.
+
+    Ключ — sha256 от (модель, размерность, нормализованный текст).
+    В модель уходит нормализованный текст, поэтому совпадение ключей
+    означает совпадение векторов. Повторы в одном запросе считаются один раз.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        dimension: int,
+        memory_bytes: int,
+        path: Optional[str] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.namespace = f"{model}:{dimension}"
+        # Вектор, ключ (hex sha256) и запись LRU с кортежем
+        vector_bytes = sys.getsizeof(array("f", bytes(4 * dimension)))
+        self.entry_bytes = vector_bytes + sys.getsizeof("0" * 64) + 64
+        self.memory: LRUCache[str, PackedVector] = LRUCache(
+            memory_bytes // self.entry_bytes
+        )
+        self.disk = EmbeddingStore(path) if path else None
+        self.disk_hits = 0
+        self.computed = 0
+
+    def key(self, normalized: str) -> str:
+        return hashlib.sha256(
+            f"{self.namespace}\x1f{normalized}".encode("utf-8")
+        ).hexdigest()
+
+    def _from_memory(self, keys: Iterable[str]) -> Dict[str, Vector]:
+        found = {}
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector.tolist()
+        return found
+
+    def _from_disk(self, keys: List[str]) -> Dict[str, Vector]:
+        if self.disk is None or not keys:
+            return {}
+        packed = self.disk.get_many(keys)
+        self.disk_hits += len(packed)
+        found = {}
+        for key, vector in packed.items():
+            self.memory.set(key, vector)
+            found[key] = vector.tolist()
+        return found
+
+    def _remember(self, computed: Dict[str, Vector]) -> None:
+        self.computed += len(computed)
+        packed = {key: array("f", vector) for key, vector in computed.items()}
+        for key, vector in packed.items():
+            self.memory.set(key, vector)
+        if self.disk is not None and packed:
+            self.disk.put_many(packed)
+
+    def _plan(self, texts: List[str]) -> Dict[str, str]:
+        """Уникальные ключи запроса -> нормализованный текст."""
+        return {self.key(text): text for text in map(normalize_text, texts)}
+
+    def embed_documents(self, texts: List[str]) -> List[Vector]:
+        plan = self._plan(texts)
+        found = self._from_memory(plan)
+        found.update(self._from_disk([key for key in plan if key not in found]))
+        missing = [key for key in plan if key not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([plan[key] for key in missing])
+            computed = dict(zip(missing, vectors))
+            self._remember(computed)
+            found.update(computed)
+        return [found[self.key(normalize_text(text))] for text in texts]
+
+    async def aembed_documents(self, texts: List[str]) -> List[Vector]:
+        return await self._aembed(texts, self.embeddings.aembed_documents)
+
+    def embed_query(self, text: str) -> Vector:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> Vector:
+        return (await self._aembed([text], self.embeddings.aembed_documents))[0]
+
+    async def _aembed(
+        self, texts: List[str], compute: Callable[[List[str]], Awaitable[List[Vector]]]
+    ) -> List[Vector]:
+        plan = self._plan(texts)
+        found = self._from_memory(plan)
+        rest = [key for key in plan if key not in found]
+        if rest and self.disk is not None:
+            found.update(await asyncio.to_thread(self._from_disk, rest))
+        missing = [key for key in plan if key not in found]
+        if missing:
+            vectors = await compute([plan[key] for key in missing])
+            computed = dict(zip(missing, vectors))
+            await asyncio.to_thread(self._remember, computed)
+            found.update(computed)
+        return [found[self.key(normalize_text(text))] for text in texts]
+
+    def stats(self) -> Dict[str, Any]:
+        """Попадания по уровням и общая доля запросов без вызова модели."""
+        lookups = self.memory.hits + self.memory.misses
+        hits = self.memory.hits + self.disk_hits
+        return {
+            "memory": self.memory.stats(),
+            "memory_mb": round(len(self.memory) * self.entry_bytes / 2**20, 1),
+            "memory_max_mb": round(self.memory.max_size * self.entry_bytes / 2**20, 1),
+            "disk_hits": self.disk_hits,
+            "computed": self.computed,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,159 @@
+import codecs
+import json
+from json.decoder import WHITESPACE  # type: ignore[attr-defined]
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional
+
+_decoder = json.JSONDecoder()
+_NUMBER_DELIMITERS = frozenset(",]} \t\r\n")
+
+
+class JSONArrayStreamParser:
+    """
+    Инкрементальный разбор документа вида {"...": ..., "<key>": [item, ...]}.
+
+    Байты подаются кусками через feed(), готовые элементы массива
+    возвращаются сразу, поэтому в памяти держится только недочитанный хвост,
+    а не весь документ. Остальные ключи верхнего уровня пропускаются.
+    """
+
+    def __init__(self, key: str, max_item_chars: int = 1_000_000) -> None:
+        self.key = key
+        self.max_item_chars = max_item_chars
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._current_key: Optional[str] = None
+        self._found = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Добавляет кусок данных и возвращает элементы, разобранные целиком."""
+        self._buffer = self._tail() + self._text_decoder.decode(chunk)
+        self._pos = 0
+        items = self._parse(final=False)
+        if len(self._buffer) - self._pos > self.max_item_chars:
+            raise ValueError(
+                f"JSON element exceeds {self.max_item_chars} characters "
+                f"at state '{self._state}'"
+            )
+        return items
+
+    def close(self) -> List[Any]:
+        """Дочитывает остаток и проверяет, что документ завершен."""
+        self._buffer = self._tail() + self._text_decoder.decode(b"", final=True)
+        self._pos = 0
+        items = self._parse(final=True)
+        if self._state != "done" or self._tail().strip():
+            raise ValueError("Unexpected end of JSON document")
+        if not self._found:
+            raise ValueError(f'JSON document has no "{self.key}" array')
+        return items
+
+    def _tail(self) -> str:
+        pos = self._pos
+        return self._buffer[pos:]
+
+    def _skip_whitespace(self) -> Optional[str]:
+        self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+        if self._pos >= len(self._buffer):
+            return None
+        return self._buffer[self._pos]
+
+    def _decode_value(self, final: bool) -> Any:
+        """
+        Разбирает одно значение с текущей позиции.
+        Возвращает Ellipsis, если данных пока недостаточно.
+        """
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError(f"Invalid JSON at position {self._pos}")
+            return ...
+        # Число может быть не дочитано (12 из 123, 1 из 1.5): принимаем его,
+        # только когда за ним уже пришел разделитель
+        if not final:
+            if end >= len(self._buffer):
+                return ...
+            if isinstance(value, (int, float)):
+                if self._buffer[end] not in _NUMBER_DELIMITERS:
+                    return ...
+        self._pos = end
+        return value
+
+    def _expect(self, char: Optional[str], expected: str) -> None:
+        if char != expected:
+            raise ValueError(f"Expected '{expected}' at position {self._pos}")
+        self._pos += 1
+
+    def _parse(self, final: bool) -> List[Any]:
+        items: List[Any] = []
+        while True:
+            char = self._skip_whitespace()
+            if char is None or self._state == "done":
+                return items
+            if self._state == "start":
+                self._expect(char, "{")
+                self._state = "key"
+            elif self._state == "key":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                key = self._decode_value(final)
+                if key is ...:
+                    return items
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected object key at position {self._pos}")
+                self._current_key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                self._expect(char, ":")
+                if self._current_key == self.key:
+                    self._found = True
+                    self._state = "array"
+                else:
+                    self._state = "value"
+            elif self._state == "value":
+                if self._decode_value(final) is ...:
+                    return items
+                self._state = "after_value"
+            elif self._state == "after_value":
+                if char == ",":
+                    self._pos += 1
+                    self._state = "key"
+                else:
+                    self._expect(char, "}")
+                    self._state = "done"
+            elif self._state == "array":
+                self._expect(char, "[")
+                self._state = "item_or_end"
+            elif self._state in ("item_or_end", "item"):
+                if char == "]" and self._state == "item_or_end":
+                    self._pos += 1
+                    self._state = "after_value"
+                    continue
+                item = self._decode_value(final)
+                if item is ...:
+                    return items
+                items.append(item)
+                self._state = "after_item"
+            elif self._state == "after_item":
+                if char == ",":
+                    self._pos += 1
+                    self._state = "item"
+                else:
+                    self._expect(char, "]")
+                    self._state = "after_value"
+
+
+async def iter_json_array(
+    chunks: AsyncIterable[bytes], key: str, max_item_chars: int = 1_000_000
+) -> AsyncIterator[Any]:
+    """Поток элементов массива по ключу key из потока байтов JSON-документа."""
+    parser = JSONArrayStreamParser(key, max_item_chars=max_item_chars)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
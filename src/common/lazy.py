@@ -0,0 +1,41 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Общий объект, который создается при первом вызове, а не при импорте
+    модуля: импорт не требует ключей и сетевых клиентов, а lifespan
+    создает объекты заранее при прогреве. factory вызывается один раз,
+    в том числе при одновременных вызовах из разных потоков.
+    """
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    def __call__(self) -> T:
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def set(self, value: T) -> None:
+        """Подменяет объект, например моделью-заглушкой в бенчмарках."""
+        with self._lock:
+            self._value = value
+
+    def reset(self) -> None:
+        """Следующий вызов создаст объект заново."""
+        with self._lock:
+            self._value = None
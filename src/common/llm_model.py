@@ -1,16 +1,19 @@
-from langchain_core.language_models import LanguageModelLike
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 
+from src.common.lazy import Lazy
 from src.settings.config import LLMSettings
 
 
-def init_openai_llm() -> LanguageModelLike:
+def init_openai_llm() -> BaseChatModel:
     """
     Initialize the LLM model with specified parameters.
 
     Returns:
         ChatOpenAI: Initialized chat model instance
     """
+    # Импорт здесь: langchain_openai и openai — основная часть времени импорта
+    from langchain_openai import ChatOpenAI
+
     try:
         settings = LLMSettings()
         return ChatOpenAI(
@@ -23,5 +26,5 @@ def init_openai_llm() -> LanguageModelLike:
         raise e
 
 
-# Initialize the default LLM instance and system prompt
-LLM = init_openai_llm()
+# Default LLM instance, created on first use or during startup warm-up
+get_llm: Lazy[BaseChatModel] = Lazy(init_openai_llm)
@@ -1,6 +1,12 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from src.settings.config import LoggingSettings
+
+logging_settings = LoggingSettings()
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +34,46 @@ stream_handler.setFormatter(formater)
 file_handler.setFormatter(formater)
 time_rotating_file_handler.setFormatter(formater)
 
-logger.handlers = [
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладет записи в очередь, не дожидаясь диска и stdout. Когда очередь
+    заполнена, запись отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """При остановке ждет места в полной очереди, а не падает с queue.Full."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(logging_settings.queue_size)
+queue_handler = DroppingQueueHandler(log_queue)
+
+# Запись в stdout и файл идет в фоновом потоке, а не в event loop
+listener = DrainingQueueListener(
+    log_queue,
     stream_handler,
     # file_handler,
     time_rotating_file_handler,
-]
+    respect_handler_level=True,
+)
+listener.start()
+# При выходе дописывает оставшиеся в очереди записи
+atexit.register(listener.stop)
+
+logger.handlers = [queue_handler]
 
-logger.setLevel(logging.INFO)
+logger.setLevel(logging_settings.level)
@@ -1,73 +1,151 @@
 import logging
 import time
-from typing import Callable, Awaitable
+from typing import Optional
 
-from fastapi import Request, Response, FastAPI
+from fastapi import FastAPI
+from starlette.datastructures import Headers
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from src.common.logger import logger
+from src.common.logger import logger, logging_settings
+from src.common.telemetry import HTTP_SECONDS, new_request_id, request_id
 
 
-async def debug_middleware(
-    request: Request, call_next: Callable[[Request], Awaitable[Response]]
-) -> Response:
-    request_body = await request.body()
-    request.state.raw_body = request_body
+class _BodyTee:
+    """Первые limit байт проходящего тела для лога; само тело не копируется."""
 
-    # Считаем чистое время ответа
-    start_time = time.perf_counter()
-    response = await call_next(request)
-    response_process_time = round(time.perf_counter() - start_time, 3)
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.head = bytearray()
+        self.size = 0
 
-    # Считываем тело ответа и собираем заново
-    resp_body = b""
-    async for chunk in response.body_iterator:  # type: ignore
-        resp_body += chunk
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        rest = self.limit - len(self.head)
+        if rest > 0:
+            self.head += chunk[:rest]
 
-    response_body = resp_body.decode("utf-8", errors="ignore")
+    def __str__(self) -> str:
+        text = self.head.decode("utf-8", errors="ignore")
+        if self.size > len(self.head):
+            return f"{text}... ({self.size} bytes)"
+        return text
 
-    response = Response(
-        content=resp_body,
-        status_code=response.status_code,
-        headers=dict(response.headers),
-        media_type=response.media_type,
-    )
-    # Логируем запрос и ответ
-
-    body = request_body.decode("utf-8", errors="ignore")
-    logger.debug(
-        "--> Request from %s %s to %s - request body: %s",
-        request.client,
-        request.method,
-        request.url,
-        body,
-    )
-    logger.debug(
-        "<-- Response took %s seconds - response body: %s",
-        response_process_time,
-        response_body,
-    )
 
-    return response
+class RequestLoggingMiddleware:
+    """
+    Строка в лог на каждый запрос. С уровнем DEBUG еще тела запроса и ответа,
+    обрезанные до LoggingSettings.body_limit: куски тела снимаются по пути
+    к приложению и клиенту, ответ не собирается целиком и не пересоздается,
+    поэтому потоковые ответы уходят клиенту как есть.
+    """
 
+    def __init__(self, app: ASGIApp, body_limit: Optional[int] = None) -> None:
+        self.app = app
+        self.body_limit = (
+            logging_settings.body_limit if body_limit is None else body_limit
+        )
 
-async def log_new_request_middleware(
-    request: Request, call_next: Callable[[Request], Awaitable[Response]]
-) -> Response:
-    if logger.isEnabledFor(logging.DEBUG):
-        return await debug_middleware(request, call_next)
-    logger.info(
-        "Request from %s %s to %s",
-        request.client,
-        request.method,
-        request.url,
-    )
-    return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        path = scope.get("path", "")
+        if not logger.isEnabledFor(logging.DEBUG):
+            logger.info(
+                "Request %s from %s %s to %s",
+                request_id.get(),
+                client,
+                scope["method"],
+                path,
+            )
+            await self.app(scope, receive, send)
+            return
+
+        request_body = _BodyTee(self.body_limit)
+        response_body = _BodyTee(self.body_limit)
+        status_code = 0
+
+        async def receive_tee() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.feed(message.get("body", b""))
+            return message
+
+        async def send_tee(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_body.feed(message.get("body", b""))
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive_tee, send_tee)
+        finally:
+            logger.debug(
+                "--> Request %s from %s %s to %s - request body: %s",
+                request_id.get(),
+                client,
+                scope["method"],
+                path,
+                request_body,
+            )
+            logger.debug(
+                "<-- Response %s took %s seconds - response body: %s",
+                status_code,
+                round(time.perf_counter() - start_time, 3),
+                response_body,
+            )
+
+
+class MetricsMiddleware:
+    """
+    id запроса (из X-Request-ID или новый) для логов и спанов агента,
+    заголовок X-Request-ID в ответе и время ответа по шаблону пути.
+    Для потока событий время считается до конца потока.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current = new_request_id(Headers(scope=scope).get("x-request-id"))
+        token = request_id.set(current)
+        status_code = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", current.encode("latin-1", errors="replace")),
+                ]
+            await send(message)
+
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start_time)
+            request_id.reset(token)
 
 
 def register_middlewares(app: FastAPI) -> None:
-    app.middleware("http")(log_new_request_middleware)
-    # app.middleware("http")(debug_middleware)
+    # Последний добавленный middleware — внешний: id запроса задается до лога
+    app.add_middleware(RequestLoggingMiddleware)
+    app.add_middleware(MetricsMiddleware)
 
     app.add_middleware(
         CORSMiddleware,
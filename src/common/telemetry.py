@@ -0,0 +1,350 @@
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.common.logger import log_queue, logger, queue_handler
+from src.settings.config import TelemetrySettings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # трассировка пишется в лог
+    otel_trace = None  # type: ignore[assignment]
+
+telemetry_settings = TelemetrySettings()
+
+# id запроса клиента: задается в middleware, попадает в спаны и метаданные графа
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+HTTP_SECONDS = Histogram(
+    "http_request_seconds",
+    "Время ответа API",
+    ["method", "route", "status"],
+    buckets=_SLOW_BUCKETS,
+)
+NODE_SECONDS = Histogram(
+    "agent_node_seconds",
+    "Время узла графа агента",
+    ["node", "status"],
+    buckets=_SLOW_BUCKETS,
+)
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds",
+    "Время инструмента агента",
+    ["tool", "status"],
+    buckets=_FAST_BUCKETS + _SLOW_BUCKETS[6:],
+)
+LLM_SECONDS = Histogram(
+    "llm_request_seconds",
+    "Время ответа модели",
+    ["kind"],
+    buckets=_SLOW_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Токены запросов к модели",
+    ["kind", "type"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Время SQL-запроса",
+    ["statement"],
+    buckets=_FAST_BUCKETS,
+)
+EMBEDDING_SECONDS = Histogram(
+    "embedding_request_seconds",
+    "Время запроса к модели эмбеддингов (без попаданий в кэш)",
+    ["operation"],
+    buckets=_FAST_BUCKETS + _SLOW_BUCKETS[6:],
+)
+VECTOR_SECONDS = Histogram(
+    "vector_backend_seconds",
+    "Время запроса к индексу векторов",
+    ["backend", "operation"],
+    buckets=_FAST_BUCKETS + _SLOW_BUCKETS[6:],
+)
+
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Запуск процесса: import — импорт приложения, ready — до конца прогрева",
+    ["phase"],
+)
+WARMUP_STEP_SECONDS = Gauge(
+    "app_warmup_step_seconds",
+    "Время шага прогрева при запуске",
+    ["step"],
+)
+
+
+class _LogQueueCollector(Collector):
+    """Очередь логов: отброшенные при переполнении записи и текущая длина."""
+
+    def collect(self) -> Iterable[Any]:
+        yield CounterMetricFamily(
+            "log_records_dropped",
+            "Записи лога, отброшенные из-за переполненной очереди",
+            value=queue_handler.dropped,
+        )
+        yield GaugeMetricFamily(
+            "log_queue_size",
+            "Записей лога в очереди на запись",
+            value=log_queue.qsize(),
+        )
+
+
+REGISTRY.register(_LogQueueCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Метрики в текстовом формате Prometheus и их content-type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def new_request_id(header: Optional[str] = None) -> str:
+    """id запроса из заголовка клиента или новый."""
+    return header[:128] if header else uuid.uuid4().hex
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Время блока в histogram с метками labels."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def observe_llm(kind: str, seconds: float, message: BaseMessage) -> None:
+    """
+    Время ответа модели и токены из usage_metadata ответа.
+    :param kind: agent — ответ агента, summary — сводка истории
+    """
+    LLM_SECONDS.labels(kind=kind).observe(seconds)
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.labels(kind=kind, type="prompt").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(kind=kind, type="completion").inc(
+            usage.get("output_tokens", 0)
+        )
+
+
+def _statement_kind(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "EMPTY"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Время каждого SQL-запроса движка по типу запроса (SELECT, INSERT, ...)."""
+
+    def before(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(statement=_statement_kind(statement)).observe(
+            time.perf_counter() - started
+        )
+
+    def on_error(context: Any) -> None:
+        stack = (
+            context.connection.info.get("query_started") if context.connection else None
+        )
+        if stack:
+            stack.pop()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", on_error)
+
+
+def _otel_tracer() -> Any:
+    """Трейсер OpenTelemetry, если установлен SDK с настроенным провайдером."""
+    if otel_trace is None:
+        return None
+    provider = otel_trace.get_tracer_provider()
+    if isinstance(
+        provider, (otel_trace.ProxyTracerProvider, otel_trace.NoOpTracerProvider)
+    ):
+        return None
+    return provider.get_tracer(__name__)
+
+
+class Span:
+    """
+    Спан трассировки. В OpenTelemetry, если он настроен, иначе строка
+    в лог при завершении: длительность, id запроса и атрибуты.
+    """
+
+    def __init__(
+        self, name: str, attributes: Dict[str, Any], parent: Optional["Span"] = None
+    ) -> None:
+        self.name = name
+        self.attributes = {
+            key: value for key, value in attributes.items() if value is not None
+        }
+        self.started = time.perf_counter()
+        self._otel: Any = None
+        tracer = _otel_tracer()
+        if tracer is not None:
+            context = (
+                otel_trace.set_span_in_context(parent._otel)
+                if parent is not None and parent._otel is not None
+                else None
+            )
+            self._otel = tracer.start_span(
+                name, context=context, attributes=self.attributes
+            )
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self._otel is not None:
+            if error is not None:
+                self._otel.record_exception(error)
+                self._otel.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+            self._otel.end()
+            return
+        logger.info(
+            "span %s %.3fs%s %s",
+            self.name,
+            time.perf_counter() - self.started,
+            f" error={type(error).__name__}" if error is not None else "",
+            " ".join(f"{key}={value}" for key, value in self.attributes.items()),
+        )
+
+
+class AgentTelemetry(BaseCallbackHandler):
+    """
+    Обработчик событий одного прохода по графу: время узлов (agent, tools)
+    и каждого инструмента, а при включенной трассировке — спаны с id запроса.
+    Узел графа — цепочка, чье имя совпадает с metadata["langgraph_node"].
+    """
+
+    # Вызывается в event loop графа, без пула потоков
+    run_inline = True
+
+    def __init__(self, request: Optional[str] = None) -> None:
+        self.request_id = request
+        self.tracing = telemetry_settings.tracing
+        # run_id -> (node/tool/None, имя, начало, спан)
+        self._runs: Dict[UUID, Tuple[Optional[str], str, float, Optional[Span]]] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _parent_span(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        while parent_run_id is not None:
+            run = self._runs.get(parent_run_id)
+            if run is not None and run[3] is not None:
+                return run[3]
+            parent_run_id = self._parents.get(parent_run_id)
+        return None
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        kind: Optional[str],
+        name: str,
+    ) -> None:
+        """kind: node или tool — в гистограмму, None — только спан всего прохода."""
+        self._parents[run_id] = parent_run_id
+        span = None
+        if self.tracing:
+            span = Span(
+                f"agent.{kind or 'run'}",
+                {"request_id": self.request_id, "name": name},
+                self._parent_span(parent_run_id),
+            )
+        if kind is not None or span is not None:
+            self._runs[run_id] = (kind, name, time.perf_counter(), span)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        self._parents.pop(run_id, None)
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        kind, name, started, span = run
+        if kind is not None:
+            histogram = NODE_SECONDS if kind == "node" else TOOL_SECONDS
+            histogram.labels(name, "error" if error is not None else "ok").observe(
+                time.perf_counter() - started
+            )
+        if span is not None:
+            span.end(error)
+
+    def on_chain_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name")
+        if parent_run_id is None:
+            self._start(run_id, None, None, name or "graph")
+        elif name and name == (metadata or {}).get("langgraph_node"):
+            self._start(run_id, parent_run_id, "node", name)
+        else:
+            self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: Optional[Dict[str, Any]],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, parent_run_id, "tool", name)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error)
+
+
+def traced_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    config прохода по графу с обработчиком метрик и id текущего запроса
+    в метаданных (их видят все узлы и инструменты).
+    """
+    current = request_id.get()
+    return {
+        **config,
+        "callbacks": [*config.get("callbacks", []), AgentTelemetry(current)],
+        "metadata": {**config.get("metadata", {}), "request_id": current},
+    }
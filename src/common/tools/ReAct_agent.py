@@ -1,28 +1,57 @@
+import asyncio
 import re
-from typing import Annotated, Any, List, Optional, Sequence, TypedDict
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TypedDict,
+)
+from weakref import WeakValueDictionary
 
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    RemoveMessage,
+    SystemMessage,
+)
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.runnables import Runnable
 from langchain_core.tools import BaseTool, tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph import END, StateGraph, add_messages
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import ToolNode
 
-from src.common.llm_model import LLM
+from src.common.context import fold_history, summary_message
+from src.common.lazy import Lazy
+from src.common.llm_model import get_llm
 from src.common.Schemas.pharmacy_schemas import ItemOrder, Order
-from src.common.vector_store import vector_store
+from src.common.telemetry import observe_llm, telemetry_settings
+from src.common.vector_store import get_vector_store
 from src.db.CRUD import (
     get_all_pharmacies_by_product_name,
     get_product_price,
     get_products_by_name,
+    quote_products,
 )
-from src.settings.config import AGENT_PROMPT
+from src.db.checkpointer import PostgresLatestSaver
+from src.settings.config import AgentMemorySettings, get_agent_prompt
 
 load_dotenv()
 
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # Сводка реплик, удаленных из messages
+    summary: str
 
 
 @tool  # type: ignore
@@ -54,28 +83,40 @@ def check_phone_number(phone_number: str) -> Optional[str]:
 
 
 @tool  # type: ignore
-def find_product_in_vector_store(product_name: str) -> Any:
+async def find_product_in_vector_store(product_name: str) -> Any:
     """Find similar products in vector store."""
-    db_search_result = get_products_by_name(product_name.lower())
+    db_search_result = await get_products_by_name(product_name.lower())
     if not db_search_result:
-        return vector_store.search(product_name)
+        return await get_vector_store().asearch(product_name)
     return db_search_result
 
 
 @tool  # type: ignore
-def find_all_pharmacies_by_product(product_name: str) -> str | List[str]:
+async def find_all_pharmacies_by_product(product_name: str) -> str | List[str]:
     """Find all pharmacies by product name. Return str or List[str]"""
-    pharmacies = get_all_pharmacies_by_product_name(product_name)
-    return [pharmacy.address for pharmacy in pharmacies]
+    return await get_all_pharmacies_by_product_name(product_name)
 
 
 @tool  # type: ignore
-def get_current_price_for_product(product_name: str, address: str) -> Any:
+async def get_current_price_for_product(product_name: str, address: str) -> Any:
     """Get current price for product by name and pharmacy address."""
-    product_price = get_product_price(product_name, address)
+    product_price = await get_product_price(product_name, address)
     return product_price
 
 
+@tool  # type: ignore
+async def get_prices_for_products(
+    product_names: List[str], address: Optional[str] = None
+) -> Any:
+    """
+    Get prices and availability for several products in one call.
+    If address is given, only that pharmacy is checked.
+    Returns, for every requested name, the matched product and
+    a list of pharmacies with prices (cheapest first).
+    """
+    return await quote_products(product_names, address)
+
+
 @tool(parse_docstring=True, args_schema=Order)  # type: ignore
 def create_order(
     pharmacy_address: str,
@@ -118,18 +159,33 @@ tools: List[BaseTool] = [
     find_product_in_vector_store,
     find_all_pharmacies_by_product,
     get_current_price_for_product,
+    get_prices_for_products,
     check_phone_number,
     create_order,
 ]
 tool_node = ToolNode(tools)
 
-llm = LLM.bind_tools(tools)
 
+def _bind_tools() -> Runnable[LanguageModelInput, BaseMessage]:
+    return get_llm().bind_tools(tools)
+
+
+# Модель с инструментами агента; создается вместе с моделью при первом вызове
+get_agent_llm: Lazy[Runnable[LanguageModelInput, BaseMessage]] = Lazy(_bind_tools)
 
-def model_call(state: AgentState) -> AgentState:
-    system_prompt = SystemMessage(content=AGENT_PROMPT)
-    response = llm.invoke([system_prompt] + list(state["messages"]))
-    return {"messages": [response]}
+
+async def model_call(state: AgentState) -> AgentState:
+    plan, summary = await fold_history(state["messages"], state.get("summary", ""))
+    removed = [RemoveMessage(id=message.id) for message in plan.folded]
+
+    context: List[BaseMessage] = [SystemMessage(content=get_agent_prompt())]
+    summary_prompt = summary_message(summary)
+    if summary_prompt is not None:
+        context.append(summary_prompt)
+    started = time.perf_counter()
+    response = await get_agent_llm().ainvoke(context + plan.prompt)
+    observe_llm("agent", time.perf_counter() - started, response)
+    return {"messages": removed + [response], "summary": summary}
 
 
 def should_continue(state: AgentState) -> str:
@@ -158,4 +214,40 @@ graph.add_conditional_edges(
 
 graph.add_edge("tools", "agent")
 
-agent = graph.compile(checkpointer=InMemorySaver(), debug=True)
+
+def _create_checkpointer() -> BaseCheckpointSaver:
+    """Хранилище истории диалогов по AgentMemorySettings.checkpointer."""
+    settings = AgentMemorySettings()
+    if settings.checkpointer == "memory":
+        return InMemorySaver()
+    return PostgresLatestSaver(
+        thread_ttl=settings.thread_ttl, prune_interval=settings.prune_interval
+    )
+
+
+def _compile_agent() -> CompiledStateGraph:
+    return graph.compile(
+        checkpointer=_create_checkpointer(), debug=telemetry_settings.graph_debug
+    )
+
+
+# Граф компилируется при первом обращении или при прогреве в lifespan
+get_agent: Lazy[CompiledStateGraph] = Lazy(_compile_agent)
+
+# Замок потока живет, пока его держит или ждет хотя бы один запрос
+_thread_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
+
+@asynccontextmanager
+async def thread_lock(config: Dict[str, Any]) -> AsyncIterator[None]:
+    """
+    Запросы одного потока по очереди: чтение состояния и запись в него
+    (быстрый ответ, кэш ответов, проход агента) не перемешиваются, и ни один
+    запрос не затирает сообщения другого. Действует в пределах процесса.
+    """
+    thread_id = str(config["configurable"]["thread_id"])
+    lock = _thread_locks.get(thread_id)
+    if lock is None:
+        lock = _thread_locks[thread_id] = asyncio.Lock()
+    async with lock:
+        yield
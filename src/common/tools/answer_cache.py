@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.common.cache import LRUCache
+from src.common.embeddings import normalize_text
+from src.common.logger import logger
+from src.common.tools.ReAct_agent import get_agent
+from src.db.catalog import catalog, catalog_settings, get_catalog_version
+from src.settings.config import AnswerCacheSettings
+
+settings = AnswerCacheSettings()
+
+# (версия каталога, нормализованный вопрос)
+AnswerKey = Tuple[int, str]
+
+
+class AnswerCache:
+    """
+    Ответы агента на вопросы, заданные первыми в диалоге: такой ответ
+    зависит только от вопроса и каталога. Ключ включает версию каталога,
+    поэтому после загрузки, изменившей товары или цены, старые ответы
+    больше не находятся и вытесняются LRU.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.answers: LRUCache[AnswerKey, str] = LRUCache(max_size)
+
+    async def lookup(
+        self, question: str, config: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[AnswerKey]]:
+        """
+        :return: (ответ из кэша или None, ключ для сохранения ответа агента
+            или None, если вопрос зависит от контекста диалога)
+        """
+        if not settings.enabled:
+            return None, None
+        state = await get_agent().aget_state(config)
+        if state.values.get("messages"):
+            return None, None
+        version = await get_catalog_version()
+        if catalog_settings.snapshot_enabled:
+            # Ответ по снимку старше базы в кэш под новой версией не попадет
+            await catalog.ensure_version(version)
+        key = (version, normalize_text(question).rstrip("?!. "))
+        answer = self.answers.get(key)
+        if answer is not None:
+            # В истории потока вопрос и ответ, как после обычного прогона
+            await get_agent().aupdate_state(
+                config,
+                {
+                    "messages": [
+                        HumanMessage(content=question),
+                        AIMessage(content=answer),
+                    ]
+                },
+                as_node="agent",
+            )
+            logger.info("Answer cache hit for catalog version %s", version)
+        return answer, key
+
+    def store(self, key: Optional[AnswerKey], answer: Any) -> None:
+        if key is not None and isinstance(answer, str) and answer:
+            self.answers.set(key, answer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": settings.enabled, **self.answers.stats()}
+
+
+answer_cache = AnswerCache(settings.max_size)
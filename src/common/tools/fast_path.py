@@ -0,0 +1,233 @@
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    ToolMessage,
+)
+
+from src.common.cache import LRUCache
+from src.common.context import fold_history, split_turns
+from src.common.logger import logger
+from src.common.tools.ReAct_agent import get_agent
+from src.db.catalog import catalog, catalog_settings
+from src.db.CRUD import (
+    get_all_pharmacies_by_product_name,
+    get_all_pharmacy_addresses,
+    get_product_price,
+    get_products_by_name,
+    quote_products,
+)
+from src.settings.config import FastPathSettings
+
+settings = FastPathSettings()
+
+_PRICE_AT = re.compile(
+    r"^(?:сколько стоит|какая цена на|какая цена|цена на|цена|стоимость)\s+"
+    r"(?P<product>.+?)\s+(?:в|на)\s+(?:аптеке\s+)?(?:(?:по|на)\s+)?(?:адресу\s+)?"
+    r"(?P<address>.+?)$"
+)
+_WHERE = re.compile(
+    r"^(?:где (?:можно )?(?:купить|есть|найти)|в каких аптеках(?: есть)?)\s+"
+    r"(?P<product>.+?)$"
+)
+# Вопросы и просьбы, которые не являются названием товара
+_NOT_A_NAME = re.compile(
+    r"\b(?:как|что|почему|когда|где|сколько|можно|хочу|нужно|нужен|нужна|"
+    r"заказ|доставк|оплат|здравствуйте|привет|спасибо)",
+)
+
+Answer = Callable[[Dict[str, str]], Awaitable[Optional[str]]]
+
+# Отметка быстрых ответов в истории (response_metadata модели не отправляется)
+FAST_PATH_SOURCE = "fast_path"
+
+# (нормализованный адрес, адрес) по версии снимка каталога (0 — без снимка)
+_addresses: LRUCache[int, List[Tuple[str, str]]] = LRUCache(
+    1, ttl=settings.addresses_ttl
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w]+", " ", text.casefold()).split())
+
+
+async def _resolve_product(query: str) -> Optional[str]:
+    """
+    Товар, если запрос указывает на него однозначно: название совпадает
+    точно или найден единственный товар, который начинается с запроса.
+    """
+    found = await get_products_by_name(query)
+    if not found:
+        return None
+    normalized = _normalize(query)
+    if _normalize(found[0]) == normalized:
+        return found[0]
+    if len(found) == 1 and _normalize(found[0]).startswith(normalized):
+        return found[0]
+    return None
+
+
+async def _pharmacy_addresses() -> List[Tuple[str, str]]:
+    """
+    Нормализованные адреса аптек. Пересчитываются при смене снимка каталога,
+    без снимка — не чаще раза в addresses_ttl секунд.
+    """
+    version = (await catalog.get()).version if catalog_settings.snapshot_enabled else 0
+    addresses = _addresses.get(version)
+    if addresses is None:
+        addresses = [
+            (_normalize(address), address)
+            for address in await get_all_pharmacy_addresses()
+        ]
+        _addresses.set(version, addresses)
+    return addresses
+
+
+async def _resolve_address(query: str) -> Optional[str]:
+    """Адрес аптеки, если запрос совпадает с одним адресом."""
+    normalized = _normalize(query)
+    if not normalized:
+        return None
+    matches = [
+        address
+        for folded, address in await _pharmacy_addresses()
+        if normalized in folded
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _list_addresses(lines: List[str]) -> str:
+    shown = lines[: settings.max_offers]
+    text = "\n".join(f"- {line}" for line in shown)
+    if len(lines) > len(shown):
+        text += f"\n…и еще {len(lines) - len(shown)}"
+    return text
+
+
+async def _price_at(match: Dict[str, str]) -> Optional[str]:
+    product = await _resolve_product(match["product"])
+    address = await _resolve_address(match["address"])
+    if product is None or address is None:
+        return None
+    price = await get_product_price(product, address)
+    if price is None:
+        return None
+    return f"{product} в аптеке по адресу {address} стоит {price} тенге."
+
+
+async def _where(match: Dict[str, str]) -> Optional[str]:
+    product = await _resolve_product(match["product"])
+    if product is None:
+        return None
+    pharmacies = await get_all_pharmacies_by_product_name(product)
+    if not pharmacies:
+        return None
+    return f"{product} есть в аптеках:\n{_list_addresses(sorted(pharmacies))}"
+
+
+async def _product(match: Dict[str, str]) -> Optional[str]:
+    product = await _resolve_product(match["product"])
+    if product is None:
+        return None
+    quotes = await quote_products([product])
+    offers = quotes[0]["offers"] if quotes else []
+    if not offers:
+        return None
+    lines = [f"{offer['address']} — {offer['price']} тенге" for offer in offers]
+    return f"{product} есть в наличии:\n{_list_addresses(lines)}"
+
+
+def _match(text: str) -> Optional[Tuple[Answer, Dict[str, str]]]:
+    query = " ".join(text.strip().rstrip("?!.").split())
+    lowered = query.casefold()
+    for pattern, answer in ((_PRICE_AT, _price_at), (_WHERE, _where)):
+        found = pattern.match(lowered)
+        if found:
+            return answer, found.groupdict()
+    is_short = 0 < len(query.split()) <= settings.max_name_words
+    if is_short and not _NOT_A_NAME.search(lowered):
+        return _product, {"product": lowered}
+    return None
+
+
+def _awaits_reply(messages: List[BaseMessage]) -> bool:
+    """Ассистент задал вопрос: ответ клиента нужно отдать модели."""
+    if not messages or not isinstance(messages[-1], AIMessage):
+        return False
+    content = messages[-1].content
+    return isinstance(content, str) and content.rstrip().endswith("?")
+
+
+def _is_idle(values: Dict[str, Any]) -> bool:
+    """
+    Диалог ничего не ждет от клиента: поток новый, прошлую реплику закрыл
+    быстрый ответ или в ней оформлен заказ. Иначе агент может собирать
+    данные заказа (имя, адрес, товар), и ответ клиента нужно отдать ему.
+    """
+    messages = values.get("messages", [])
+    if not messages:
+        return not values.get("summary")
+    last = messages[-1]
+    if not isinstance(last, AIMessage) or last.tool_calls:
+        return False
+    if last.response_metadata.get("source") == FAST_PATH_SOURCE:
+        return True
+    return any(
+        isinstance(message, ToolMessage) and message.name == "create_order"
+        for message in split_turns(messages)[-1]
+    )
+
+
+async def fast_answer(user_input: str, config: Dict[str, Any]) -> Optional[str]:
+    """
+    Отвечает на простой запрос без модели: название товара, «где купить X»,
+    «сколько стоит X в аптеке Y». Вопрос и ответ дописываются в историю
+    потока, поэтому следующие реплики модель видит в контексте; старые
+    реплики при этом сворачиваются в сводку так же, как в model_call.
+    Вызывается под thread_lock потока.
+    :return: Ответ или None, если запрос нужно отдать агенту
+    """
+    if not settings.enabled:
+        return None
+    matched = _match(user_input)
+    if matched is None:
+        return None
+    answer, groups = matched
+    values = (await get_agent().aget_state(config)).values
+    if answer is _product:
+        # Одно название — это может быть ответ на просьбу агента
+        if not _is_idle(values):
+            return None
+    elif _awaits_reply(values.get("messages", [])):
+        return None
+    try:
+        text = await answer(groups)
+    except Exception as e:
+        logger.warning("Fast path failed, falling back to agent: %s", e)
+        return None
+    if text is None:
+        return None
+    # Запись идет мимо model_call, поэтому история сворачивается здесь же:
+    # ответ заменяет ответ модели, как если бы вопрос прошел через агента
+    question = HumanMessage(content=user_input)
+    plan, summary = await fold_history(
+        list(values.get("messages", [])) + [question], values.get("summary", "")
+    )
+    messages: List[BaseMessage] = [
+        RemoveMessage(id=message.id) for message in plan.folded
+    ]
+    messages.append(question)
+    messages.append(
+        AIMessage(content=text, response_metadata={"source": FAST_PATH_SOURCE})
+    )
+    await get_agent().aupdate_state(
+        config,
+        {"messages": messages, "summary": summary},
+        as_node="agent",
+    )
+    logger.info("Fast path answered %s", answer.__name__)
+    return text
@@ -0,0 +1,511 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.common.logger import logger
+
+# Pinecone удаляет по id не больше 1000 записей за запрос
+_DELETE_BATCH_SIZE = 1000
+# Рекомендованный Pinecone размер пачки upsert для векторов 1536 float
+_UPSERT_BATCH_SIZE = 100
+
+
+class VectorBackend(ABC):
+    """
+    Хранилище векторов названий товаров: синхронизация и поиск top-k.
+    Все операции идут в явно указанном пространстве имен, чтобы новый индекс
+    можно было собрать рядом с рабочим и переключиться на него целиком.
+    """
+
+    embedding: Embeddings
+
+    @abstractmethod
+    def list_ids(self, namespace: str) -> Set[str]:
+        """Все id векторов в пространстве имен."""
+
+    def count(self, namespace: str) -> int:
+        """Количество векторов в пространстве имен."""
+        return len(self.list_ids(namespace))
+
+    def upsert(self, namespace: str, ids: Sequence[str], texts: Sequence[str]) -> None:
+        """Считает эмбеддинги texts и записывает их под ids."""
+        if ids:
+            vectors = self.embedding.embed_documents(list(texts))
+            self.upsert_vectors(namespace, ids, texts, vectors)
+
+    @abstractmethod
+    def upsert_vectors(
+        self,
+        namespace: str,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        """Записывает готовые эмбеддинги texts под ids."""
+
+    @abstractmethod
+    def delete(self, namespace: str, ids: Sequence[str]) -> None:
+        """Удаляет векторы по id."""
+
+    @abstractmethod
+    def drop(self, namespace: str) -> None:
+        """Удаляет пространство имен целиком."""
+
+    @abstractmethod
+    def search(self, namespace: str, query: str) -> List[Document]:
+        """Ближайшие к запросу товары, лучшие первыми."""
+
+    def begin_bulk(self, namespace: str) -> None:
+        """
+        Начало серии записей в пространство имен. Хранилище может копить
+        их и записать разом в end_bulk; по умолчанию пишет сразу.
+        """
+
+    def end_bulk(self, namespace: str) -> None:
+        """Конец серии записей: все накопленное записывается, в том числе после ошибки."""
+
+    async def asearch(self, namespace: str, query: str) -> List[Document]:
+        return await asyncio.to_thread(self.search, namespace, query)
+
+
+class PineconeBackend(VectorBackend):
+    """Индекс в Pinecone через PineconeVectorStore."""
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        api_key: Optional[str],
+        index_name: str,
+        index_host: str,
+        search_k: int,
+    ) -> None:
+        # Импорт здесь: с локальным индексом клиент Pinecone не нужен
+        from langchain_pinecone import PineconeVectorStore
+        from pinecone import Pinecone
+
+        self.embedding = embedding
+        self.search_k = search_k
+        self.pc = Pinecone(api_key=api_key)
+        self.index = self.pc.Index(name=index_name, host=index_host)
+        self.vector_store = PineconeVectorStore(index=self.index, embedding=embedding)
+
+    def list_ids(self, namespace: str) -> Set[str]:
+        ids: Set[str] = set()
+        for page in self.index.list(namespace=namespace):
+            ids.update(page)
+        return ids
+
+    def count(self, namespace: str) -> int:
+        # Статистика индекса обновляется с задержкой, как и list()
+        namespaces = self.index.describe_index_stats().namespaces or {}
+        summary = namespaces.get(namespace)
+        return summary.vector_count if summary else 0
+
+    def upsert_vectors(
+        self,
+        namespace: str,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        # Текст в метаданных под ключом, который читает PineconeVectorStore
+        records = [
+            {"id": vector_id, "values": list(vector), "metadata": {"text": text}}
+            for vector_id, text, vector in zip(ids, texts, vectors)
+        ]
+        for start in range(0, len(records), _UPSERT_BATCH_SIZE):
+            end = start + _UPSERT_BATCH_SIZE
+            self.index.upsert(vectors=records[start:end], namespace=namespace)
+
+    def delete(self, namespace: str, ids: Sequence[str]) -> None:
+        for start in range(0, len(ids), _DELETE_BATCH_SIZE):
+            end = start + _DELETE_BATCH_SIZE
+            self.index.delete(ids=list(ids[start:end]), namespace=namespace)
+
+    def drop(self, namespace: str) -> None:
+        self.index.delete(delete_all=True, namespace=namespace)
+
+    def search(self, namespace: str, query: str) -> List[Document]:
+        return self.vector_store.similarity_search(
+            query, k=self.search_k, namespace=namespace
+        )
+
+    async def asearch(self, namespace: str, query: str) -> List[Document]:
+        return await self.vector_store.asimilarity_search(
+            query, k=self.search_k, namespace=namespace
+        )
+
+
+class _LocalIndex(NamedTuple):
+    ids: List[str]
+    texts: List[str]
+    matrix: np.ndarray  # (n, dim): float32 или int8
+    scales: Optional[np.ndarray]  # (n,) float32 для int8
+
+
+class _PendingWrite:
+    """
+    Записи серии begin_bulk/end_bulk поверх снимка base: удаленные из него
+    id и добавленные векторы. Снимок перезаписывается один раз в end_bulk.
+    """
+
+    def __init__(self, base: _LocalIndex, lock_fd: int) -> None:
+        self.base = base
+        # Файловый замок пространства имен, держится до end_bulk
+        self.lock_fd = lock_fd
+        self.base_ids = set(base.ids)
+        self.removed: Set[str] = set()
+        # id -> (текст, нормированный вектор); порядок — порядок добавления
+        self.added: Dict[str, Tuple[str, np.ndarray]] = {}
+        self.depth = 1
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.removed or self.added)
+
+    def upsert(
+        self, ids: Sequence[str], texts: Sequence[str], vectors: np.ndarray
+    ) -> None:
+        for vector_id, text, vector in zip(ids, texts, vectors):
+            if vector_id in self.base_ids:
+                self.removed.add(vector_id)
+            self.added[vector_id] = (text, vector)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        for vector_id in ids:
+            self.added.pop(vector_id, None)
+            if vector_id in self.base_ids:
+                self.removed.add(vector_id)
+
+
+class LocalBackend(VectorBackend):
+    """
+    Индекс в процессе: нормированные векторы в матрице NumPy, отображенной
+    с диска (np.load mmap_mode="r"), поиск — скалярное произведение по блокам
+    строк и top-k через argpartition. С quantize векторы хранятся в int8
+    с масштабом на строку: в 4 раза меньше памяти ценой небольшой погрешности.
+
+    Каждое пространство имен — отдельный каталог, в нем версии снимка
+    в подкаталогах и файл CURRENT с именем текущей версии. Запись создает
+    новую версию и подменяет CURRENT одним os.replace, поэтому читатель видит
+    либо старый снимок, либо новый целиком; предыдущая версия остается
+    для читателей, успевших прочитать старый CURRENT. Изменения из других
+    процессов подхватываются по смене файла CURRENT. Записи между begin_bulk
+    и end_bulk копятся в памяти и пишутся одной версией.
+
+    Писатели разных процессов (воркеры, фоновая загрузка) идут по очереди
+    через flock на файле LOCK в каталоге пространства имен: замок берется
+    на одну запись или на всю серию begin_bulk/end_bulk, и снимок, поверх
+    которого пишется новая версия, читается уже под замком.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: str,
+        dimension: int,
+        search_k: int,
+        quantize: bool = False,
+        block_size: int = 65536,
+    ) -> None:
+        self.embedding = embedding
+        self.path = Path(path)
+        self.dimension = dimension
+        self.search_k = search_k
+        self.quantize = quantize
+        self.block_size = block_size
+        self._write_lock = threading.Lock()
+        self._indexes: Dict[str, Tuple[Tuple[int, int], _LocalIndex]] = {}
+        self._pending: Dict[str, _PendingWrite] = {}
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, namespace: str) -> Path:
+        return self.path / re.sub(r"[^\w@.-]", "_", namespace)
+
+    @property
+    def _matrix_name(self) -> str:
+        return "vectors.i8.npy" if self.quantize else "vectors.f32.npy"
+
+    def _current(self, namespace: str) -> Optional[str]:
+        """Имя текущей версии снимка или None, если индекса еще нет."""
+        try:
+            return (self._dir(namespace) / "CURRENT").read_text("utf-8").strip()
+        except FileNotFoundError:
+            return None
+
+    def _index(self, namespace: str) -> _LocalIndex:
+        """Снимок пространства имен; перечитывается, если сменился CURRENT."""
+        try:
+            stat = (self._dir(namespace) / "CURRENT").stat()
+            key = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            key = (0, 0)
+        cached = self._indexes.get(namespace)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        index = self._load(namespace) if key != (0, 0) else self._empty()
+        self._indexes[namespace] = (key, index)
+        return index
+
+    def _load(self, namespace: str) -> _LocalIndex:
+        version = self._current(namespace)
+        if version is None:
+            return self._empty()
+        directory = self._dir(namespace) / version
+        try:
+            with open(directory / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(directory / self._matrix_name, mmap_mode="r")
+            scales = (
+                np.load(directory / "scales.npy", mmap_mode="r")
+                if self.quantize
+                else None
+            )
+        except FileNotFoundError:
+            # Версию удалили две записи подряд, пока мы читали CURRENT
+            logger.warning("Local vector index version %s is gone", directory)
+            return self._empty()
+        if matrix.shape != (len(meta["ids"]), self.dimension) or (
+            scales is not None and len(scales) != len(matrix)
+        ):
+            # Файлы от прерванной записи или другой размерности: индекс
+            # заполнится заново при следующей синхронизации
+            logger.warning("Local vector index at %s is inconsistent", directory)
+            return self._empty()
+        return _LocalIndex(meta["ids"], meta["texts"], matrix, scales)
+
+    def _lock(self, namespace: str) -> int:
+        """Берет замок записи пространства имен; ждет, пока его держит другой процесс."""
+        path = self._dir(namespace) / "LOCK"
+        while True:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                # Пока ждали, drop мог удалить каталог вместе с файлом замка
+                if os.fstat(fd).st_ino == path.stat().st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+            self._unlock(fd)
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    @contextmanager
+    def _locked(self, namespace: str) -> Iterator[int]:
+        fd = self._lock(namespace)
+        try:
+            yield fd
+        finally:
+            self._unlock(fd)
+
+    def _empty(self) -> _LocalIndex:
+        dtype = np.int8 if self.quantize else np.float32
+        return _LocalIndex([], [], np.zeros((0, self.dimension), dtype=dtype), None)
+
+    def _dequantize(self, index: _LocalIndex) -> np.ndarray:
+        matrix = np.asarray(index.matrix, dtype=np.float32)
+        if index.scales is not None:
+            matrix = matrix * index.scales[:, None]
+        return matrix
+
+    def _save(
+        self, namespace: str, ids: List[str], texts: List[str], vectors: np.ndarray
+    ) -> None:
+        """Пишет снимок новой версией и переключает на нее CURRENT."""
+        root = self._dir(namespace)
+        root.mkdir(parents=True, exist_ok=True)
+        current = self._current(namespace)
+        number = int(current[1:]) + 1 if current else 1
+        version = f"v{number:06d}"
+        directory = root / version
+        shutil.rmtree(directory, ignore_errors=True)  # остаток прерванной записи
+        directory.mkdir()
+        matrix = vectors
+        if self.quantize:
+            scales = np.abs(vectors).max(axis=1).astype(np.float32) / 127.0
+            scales[scales == 0] = 1.0
+            matrix = np.round(vectors / scales[:, None]).astype(np.int8)
+            np.save(directory / "scales.npy", scales)
+        np.save(directory / self._matrix_name, matrix)
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "texts": texts}, f, ensure_ascii=False)
+        (root / "CURRENT.tmp").write_text(version, "utf-8")
+        os.replace(root / "CURRENT.tmp", root / "CURRENT")
+        # Текущая и предыдущая версии остаются, более старые удаляются
+        for old in root.iterdir():
+            if old.is_dir() and old.name not in (version, current):
+                shutil.rmtree(old, ignore_errors=True)
+
+    def _write(self, namespace: str, pending: _PendingWrite) -> None:
+        base = pending.base
+        keep = [
+            i
+            for i, vector_id in enumerate(base.ids)
+            if vector_id not in pending.removed
+        ]
+        added = list(pending.added.items())
+        parts = [self._dequantize(base)[keep]]
+        if added:
+            parts.append(np.stack([vector for _, (_, vector) in added]))
+        self._save(
+            namespace,
+            [base.ids[i] for i in keep] + [vector_id for vector_id, _ in added],
+            [base.texts[i] for i in keep] + [text for _, (text, _) in added],
+            np.concatenate(parts),
+        )
+
+    def begin_bulk(self, namespace: str) -> None:
+        with self._write_lock:
+            pending = self._pending.get(namespace)
+            if pending is not None:
+                pending.depth += 1
+                return
+            fd = self._lock(namespace)
+            try:
+                self._pending[namespace] = _PendingWrite(self._index(namespace), fd)
+            except BaseException:
+                self._unlock(fd)
+                raise
+
+    def end_bulk(self, namespace: str) -> None:
+        with self._write_lock:
+            pending = self._pending[namespace]
+            pending.depth -= 1
+            if pending.depth:
+                return
+            del self._pending[namespace]
+            try:
+                if pending.changed:
+                    self._write(namespace, pending)
+            finally:
+                self._unlock(pending.lock_fd)
+
+    @staticmethod
+    def _normalized(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def list_ids(self, namespace: str) -> Set[str]:
+        return set(self._index(namespace).ids)
+
+    def upsert_vectors(
+        self,
+        namespace: str,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        if not ids:
+            return
+        normalized = self._normalized(vectors)
+        with self._write_lock:
+            pending = self._pending.get(namespace)
+            if pending is not None:
+                pending.upsert(ids, texts, normalized)
+                return
+            with self._locked(namespace) as fd:
+                single = _PendingWrite(self._index(namespace), fd)
+                single.upsert(ids, texts, normalized)
+                self._write(namespace, single)
+
+    def delete(self, namespace: str, ids: Sequence[str]) -> None:
+        with self._write_lock:
+            pending = self._pending.get(namespace)
+            if pending is not None:
+                pending.delete(ids)
+                return
+            with self._locked(namespace) as fd:
+                single = _PendingWrite(self._index(namespace), fd)
+                single.delete(ids)
+                if single.changed:
+                    self._write(namespace, single)
+
+    def drop(self, namespace: str) -> None:
+        with self._write_lock:
+            self._indexes.pop(namespace, None)
+            pending = self._pending.pop(namespace, None)
+            if pending is not None:
+                self._unlock(pending.lock_fd)
+            with self._locked(namespace):
+                shutil.rmtree(self._dir(namespace), ignore_errors=True)
+
+    def search_vectors(
+        self, namespace: str, queries: np.ndarray, k: int
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k по косинусной близости сразу для нескольких запросов.
+        :param queries: (m, dim) нормированные векторы запросов
+        :return: Для каждого запроса список (позиция, близость), лучшие первыми
+        """
+        return self._top_k(self._index(namespace), queries, k)
+
+    def _top_k(
+        self, index: _LocalIndex, queries: np.ndarray, k: int
+    ) -> List[List[Tuple[int, float]]]:
+        size = len(index.ids)
+        k = min(k, size)
+        if not k:
+            return [[] for _ in range(len(queries))]
+        scores = np.empty((len(queries), size), dtype=np.float32)
+        queries_t = queries.T.astype(np.float32)
+        for start in range(0, size, self.block_size):
+            end = min(start + self.block_size, size)
+            block = np.asarray(index.matrix[start:end], dtype=np.float32) @ queries_t
+            if index.scales is not None:
+                block *= index.scales[start:end, None]
+            scores[:, start:end] = block.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            order = candidates[np.argsort(-row[candidates], kind="stable")]
+            results.append([(int(pos), float(row[pos])) for pos in order])
+        return results
+
+    def _documents(
+        self, index: _LocalIndex, query_vector: Sequence[float]
+    ) -> List[Document]:
+        found = self._top_k(index, self._normalized([query_vector]), self.search_k)
+        return [
+            Document(
+                id=index.ids[pos],
+                page_content=index.texts[pos],
+                metadata={"score": score},
+            )
+            for pos, score in found[0]
+        ]
+
+    def search(self, namespace: str, query: str) -> List[Document]:
+        index = self._index(namespace)
+        return self._documents(index, self.embedding.embed_query(query))
+
+    def _search_vector(
+        self, namespace: str, query_vector: Sequence[float]
+    ) -> List[Document]:
+        return self._documents(self._index(namespace), query_vector)
+
+    async def asearch(self, namespace: str, query: str) -> List[Document]:
+        # Эмбеддинг запроса — асинхронно (обычно из кэша); чтение снимка
+        # с диска и умножение матриц — в потоке, не в event loop
+        query_vector = await self.embedding.aembed_query(query)
+        return await asyncio.to_thread(self._search_vector, namespace, query_vector)
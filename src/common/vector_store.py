@@ -1,71 +1,463 @@
-from typing import List, Optional
+import asyncio
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pinecone import Pinecone
-from src.settings.config import PineconeSettings
+
+from src.common.cache import LRUCache
+from src.common.embeddings import CachedEmbeddings, TimedEmbeddings, normalize_text
+from src.common.lazy import Lazy
+from src.common.logger import logger
+from src.common.telemetry import VECTOR_SECONDS, observe
+from src.common.vector_backends import LocalBackend, PineconeBackend, VectorBackend
+from src.db.vector_state import (
+    bump_index_version,
+    get_building_namespace,
+    get_index_state,
+    set_active_namespace,
+    set_building_namespace,
+)
+from src.settings.config import (
+    EmbeddingCacheSettings,
+    PineconeSettings,
+    VectorBackendSettings,
+)
 
 settings = PineconeSettings()
+cache_settings = EmbeddingCacheSettings()
+backend_settings = VectorBackendSettings()
+
+# Пауза между проверками количества векторов при пересборке, секунды
+_COUNT_POLL_INTERVAL = 2.0
+
+# Пространство имен uuid5 для id векторов товаров
+_VECTOR_ID_NAMESPACE = uuid.UUID("6f1c3a52-4b1e-5c8e-9a37-2d5f0e8b7c41")
+
+T = TypeVar("T")
+# Прогресс индексации: (проиндексировано, всего)
+IndexProgress = Callable[[int, int], Awaitable[None]]
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # openai: status_code, pinecone: status
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Превышение лимита запросов или временная ошибка сервиса."""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return "rate limit" in str(exc).lower()
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Пауза из заголовка Retry-After, если сервис ее прислал."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _create_backend(config: PineconeSettings, embedding: Embeddings) -> VectorBackend:
+    """Хранилище векторов по VectorBackendSettings.backend."""
+    if backend_settings.backend == "local":
+        return LocalBackend(
+            embedding,
+            path=backend_settings.local_path,
+            dimension=config.dimension,
+            search_k=config.search_k,
+            quantize=backend_settings.local_quantize,
+            block_size=backend_settings.local_block_size,
+        )
+    return PineconeBackend(
+        embedding,
+        api_key=config.pinecone_api_key,
+        index_name=config.index_name,
+        index_host=config.index_host,
+        search_k=config.search_k,
+    )
 
 
 class VectorStore:
     def __init__(self) -> None:
+        # Импорт здесь: langchain_openai долго импортируется
+        from langchain_openai import OpenAIEmbeddings
+
         self.config = settings
 
-        self.pc = Pinecone(api_key=self.config.pinecone_api_key)
-        self.index = self.pc.Index(
-            name=self.config.index_name, host=self.config.index_host
+        embedding = TimedEmbeddings(
+            OpenAIEmbeddings(
+                model=self.config.embedding_model,
+                dimensions=self.config.dimension,
+                openai_api_key=self.config.openai_api_key,
+            )
         )
-
-        self.embedding = OpenAIEmbeddings(
-            model=self.config.embedding_model,
-            dimensions=self.config.dimension,
-            openai_api_key=self.config.openai_api_key,
+        # Кэш обслуживает и индексацию, и эмбеддинги поисковых запросов
+        self.embedding: Embeddings = (
+            CachedEmbeddings(
+                embedding,
+                model=self.config.embedding_model,
+                dimension=self.config.dimension,
+                memory_bytes=cache_settings.memory_mb * 2**20,
+                path=cache_settings.path or None,
+            )
+            if cache_settings.enabled
+            else embedding
         )
 
-        self.vector_store = PineconeVectorStore(
-            index=self.index, embedding=self.embedding, namespace=self.config.namespace
-        )
+        self.backend = _create_backend(self.config, self.embedding)
 
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.config.chunk_size, chunk_overlap=self.config.chunk_overlap
         )
 
-        self.retriever = self.vector_store.as_retriever(
-            search_kwargs={"namespace": self.config.namespace}
+        # Результаты поиска по нормализованному запросу; сбрасываются при синхронизации
+        self.results_cache: LRUCache[Tuple[str, str], str] = LRUCache(
+            max_size=self.config.search_cache_size, ttl=self.config.search_cache_ttl
         )
+        # Рабочее пространство имен: до первой пересборки — из настроек,
+        # дальше — указатель в vector_index_state
+        self.active_namespace = self.config.namespace
+        self._namespace_checked_at = float("-inf")
+        # Последняя увиденная версия индекса; синхронизация в другом воркере
+        # не меняет пространство имен, поэтому кэш сбрасывается по версии
+        self._index_version: Optional[int] = None
 
-    def search(self, query: str) -> str:
-        """Поиск по векторной базе через retriever.
-        Возвращает текстовые результаты."""
-        results = self.retriever.invoke(query)
+    def _switch_namespace(self, namespace: str) -> None:
+        if namespace != self.active_namespace:
+            logger.info(
+                "Vector store namespace switched: %s -> %s",
+                self.active_namespace,
+                namespace,
+            )
+            self.active_namespace = namespace
+            self.results_cache.clear()
+
+    def _set_index_version(self, version: int) -> None:
+        if self._index_version is not None and version != self._index_version:
+            logger.info(
+                "Vector index version changed: %s -> %s, search cache cleared",
+                self._index_version,
+                version,
+            )
+            self.results_cache.clear()
+        self._index_version = version
+
+    async def refresh_namespace(self, force: bool = False) -> str:
+        """
+        Перечитывает указатель на рабочее пространство имен и версию индекса
+        не чаще, чем раз в namespace_refresh_interval секунд. Если индекс
+        изменился в другом воркере, кэш результатов поиска сбрасывается.
+        :return: Текущее рабочее пространство имен
+        """
+        now = time.monotonic()
+        interval = self.config.namespace_refresh_interval
+        if force or now - self._namespace_checked_at >= interval:
+            self._namespace_checked_at = now
+            try:
+                state = await get_index_state(self.config.namespace)
+            except Exception as e:
+                logger.warning("Failed to read active vector namespace: %s", e)
+            else:
+                if state is not None:
+                    namespace, version = state
+                    self._switch_namespace(namespace)
+                    self._set_index_version(version)
+        return self.active_namespace
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Статистика кэша эмбеддингов или None, если кэш выключен."""
+        if isinstance(self.embedding, CachedEmbeddings):
+            return self.embedding.stats()
+        return None
+
+    def _observe(self, operation: str) -> ContextManager[None]:
+        """Время запроса к индексу (для поиска — вместе с эмбеддингом запроса)."""
+        return observe(
+            VECTOR_SECONDS, backend=backend_settings.backend, operation=operation
+        )
+
+    @asynccontextmanager
+    async def _bulk(self, namespace: str) -> AsyncIterator[None]:
+        """Серия записей в namespace: локальный индекс пишет ее на диск один раз."""
+        await asyncio.to_thread(self.backend.begin_bulk, namespace)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.backend.end_bulk, namespace)
+
+    @staticmethod
+    def _results_key(namespace: str, query: str) -> Tuple[str, str]:
+        return namespace, normalize_text(query)
+
+    @staticmethod
+    def _format_results(results: Any) -> str:
         # results может быть списком документов или строк
         if isinstance(results, list):
             # Если это список документов, склеим их содержимое
             return "\n".join(str(doc) for doc in results)
         return str(results)
 
-    def __delete(self) -> str:
-        try:
-            self.index.delete(delete_all=True, namespace=self.config.namespace)
-        except Exception as e:
-            return f"Index deletion failed with error: {e}"
-        return f"Index {self.config.index_name} deleted successfully."
+    def search(self, query: str) -> str:
+        """Поиск по векторной базе.
+        Возвращает текстовые результаты. Повторный запрос в пределах TTL
+        отдается из кэша без эмбеддинга и обращения к индексу."""
+        namespace = self.active_namespace
+        key = self._results_key(namespace, query)
+        cached = self.results_cache.get(key)
+        if cached is not None:
+            return cached
+        with self._observe("search"):
+            result = self._format_results(self.backend.search(namespace, query))
+        self.results_cache.set(key, result)
+        return result
+
+    async def asearch(self, query: str) -> str:
+        """Асинхронный поиск по векторной базе.
+        Не блокирует event loop на время запроса эмбеддинга и индекса."""
+        namespace = await self.refresh_namespace()
+        key = self._results_key(namespace, query)
+        cached = self.results_cache.get(key)
+        if cached is not None:
+            return cached
+        with self._observe("search"):
+            documents = await self.backend.asearch(namespace, query)
+        result = self._format_results(documents)
+        self.results_cache.set(key, result)
+        return result
+
+    @staticmethod
+    def vector_id(product_name: str) -> str:
+        """Детерминированный id вектора: один и тот же товар — один и тот же id."""
+        return str(uuid.uuid5(_VECTOR_ID_NAMESPACE, product_name))
 
-    def rebuild_vector_store(self, products_names: Optional[List[str]]) -> str:
-        self.__delete()
+    async def sync_vector_store(
+        self,
+        products_names: Optional[List[str]],
+        progress: Optional[IndexProgress] = None,
+    ) -> str:
+        """
+        Приводит индекс к списку товаров: эмбеддинги считаются только для новых
+        названий, из индекса удаляются только исчезнувшие. Сначала добавление,
+        потом удаление, поэтому индекс все время доступен для поиска.
+        Векторы со старыми случайными id удаляются при первой синхронизации.
+        После изменений растет версия индекса, и остальные воркеры сбрасывают
+        кэш поиска при следующей проверке указателя.
+        """
+        namespace = self.active_namespace
+        wanted = {self.vector_id(name): name for name in products_names or []}
+        changed = False
         try:
-            self.vector_store.add_texts(
-                texts=products_names,
-                namespace=self.config.namespace,
-            )
+            # Список id читается внутри серии: локальный индекс уже под замком
+            async with self._bulk(namespace):
+                present = await asyncio.to_thread(self.backend.list_ids, namespace)
+                to_add = [vector_id for vector_id in wanted if vector_id not in present]
+                to_delete = [
+                    vector_id for vector_id in present if vector_id not in wanted
+                ]
+                changed = bool(to_add or to_delete)
+                if to_add:
+                    await self._index_texts(
+                        namespace,
+                        {vector_id: wanted[vector_id] for vector_id in to_add},
+                        progress,
+                    )
+                if to_delete:
+                    with self._observe("delete"):
+                        await asyncio.to_thread(
+                            self.backend.delete, namespace, to_delete
+                        )
         except Exception as e:
             if "Index does not exist" in str(e):
                 return f"Error: Index {self.config.index_name} does not exist."
             else:
                 return f"Error: {e}"
-        return "Index rebuilt successfully."
+        finally:
+            # Индекс мог измениться даже при ошибке посередине
+            self.results_cache.clear()
+            if changed:
+                await self._publish_index_version()
+        return (
+            f"Index synced: {len(to_add)} added, {len(to_delete)} deleted, "
+            f"{len(wanted) - len(to_add)} unchanged."
+        )
+
+    async def _publish_index_version(self) -> None:
+        try:
+            version = await bump_index_version(self.config.namespace)
+        except Exception as e:
+            logger.warning("Failed to bump vector index version: %s", e)
+        else:
+            # Свой кэш уже сброшен, повторно по этой версии не сбрасываем
+            self._index_version = version
+
+    async def _with_backoff(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Повторяет вызов при превышении лимита и временных ошибках:
+        экспоненциальная пауза со случайным разбросом, чтобы параллельные
+        пачки не возвращались к API одновременно.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except Exception as e:
+                if attempt >= self.config.index_max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after(e) or min(
+                    self.config.index_retry_max_delay,
+                    self.config.index_retry_base_delay * 2**attempt,
+                ) * random.uniform(0.5, 1.0)
+                attempt += 1
+                logger.warning(
+                    "Indexing call failed (%s), retry %d in %.1fs", e, attempt, delay
+                )
+                await asyncio.sleep(delay)
+
+    async def _index_texts(
+        self,
+        namespace: str,
+        items: Dict[str, str],
+        progress: Optional[IndexProgress] = None,
+    ) -> None:
+        """
+        Считает эмбеддинги и пишет их в индекс пачками по index_batch_size,
+        не больше index_concurrency пачек одновременно. Уже записанные пачки
+        остаются в индексе при ошибке, id детерминированы, поэтому повторный
+        запуск пропускает их и продолжает с незаписанных.
+        :param items: id вектора -> название товара
+        :param progress: (опционально) вызывается после каждой пачки
+        """
+        ids = sorted(items)
+        total = len(ids)
+        size = self.config.index_batch_size
+        semaphore = asyncio.Semaphore(self.config.index_concurrency)
+        done = 0
+
+        async def index_batch(batch: List[str]) -> None:
+            nonlocal done
+            texts = [items[vector_id] for vector_id in batch]
+            async with semaphore:
+                vectors = await self._with_backoff(
+                    lambda: self.embedding.aembed_documents(texts)
+                )
+                with self._observe("upsert"):
+                    await self._with_backoff(
+                        lambda: asyncio.to_thread(
+                            self.backend.upsert_vectors,
+                            namespace,
+                            batch,
+                            texts,
+                            vectors,
+                        )
+                    )
+            done += len(batch)
+            logger.info("Indexed %d/%d vectors into %s", done, total, namespace)
+            if progress is not None:
+                await progress(done, total)
+
+        tasks = []
+        for start in range(0, total, size):
+            end = start + size
+            tasks.append(asyncio.ensure_future(index_batch(ids[start:end])))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Первая ошибка останавливает остальные пачки
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _wait_for_count(self, namespace: str, expected: int) -> None:
+        """Ждет, пока в пространстве имен окажутся все векторы."""
+        deadline = time.monotonic() + self.config.rebuild_validate_timeout
+        while True:
+            count = await asyncio.to_thread(self.backend.count, namespace)
+            if count == expected:
+                return
+            if time.monotonic() >= deadline:
+                raise ValueError(
+                    f"Namespace {namespace} has {count} vectors, expected {expected}"
+                )
+            await asyncio.sleep(_COUNT_POLL_INTERVAL)
+
+    async def rebuild_vector_store(
+        self,
+        products_names: Optional[List[str]],
+        progress: Optional[IndexProgress] = None,
+    ) -> str:
+        """
+        Полная пересборка без простоя: индекс строится в новом пространстве
+        имен, проверяется по количеству векторов и только потом становится
+        рабочим через указатель в базе. Поиск все это время идет по старому
+        индексу. Старое пространство удаляется после того, как остальные
+        воркеры успели перечитать указатель.
+
+        Прерванная пересборка не выбрасывается: следующий запуск продолжает
+        то же пространство имен и досчитывает только недостающие векторы.
+        """
+        wanted = {self.vector_id(name): name for name in products_names or []}
+        if not wanted:
+            return "No products to index."
+        base = self.config.namespace
+        previous = await self.refresh_namespace(force=True)
+        namespace = await get_building_namespace(base)
+        if namespace is None or namespace == previous:
+            namespace = f"{base}@{datetime.now(timezone.utc):%Y%m%d%H%M%S%f}"
+            await set_building_namespace(base, namespace)
+        else:
+            logger.info("Resuming vector store rebuild into %s", namespace)
+        try:
+            async with self._bulk(namespace):
+                present = await asyncio.to_thread(self.backend.list_ids, namespace)
+                await self._index_texts(
+                    namespace,
+                    {
+                        vector_id: name
+                        for vector_id, name in wanted.items()
+                        if vector_id not in present
+                    },
+                    progress,
+                )
+                stale = [vector_id for vector_id in present if vector_id not in wanted]
+                if stale:
+                    await asyncio.to_thread(self.backend.delete, namespace, stale)
+            await self._wait_for_count(namespace, len(wanted))
+        except Exception as e:
+            logger.error("Vector store rebuild into %s failed: %s", namespace, e)
+            return f"Error: {e}"
+
+        await set_active_namespace(self.config.namespace, namespace)
+        self._switch_namespace(namespace)
+        await asyncio.sleep(self.config.namespace_refresh_interval)
+        # Рабочее пространство имен не удаляется, даже если имя совпало
+        if previous != namespace:
+            try:
+                await asyncio.to_thread(self.backend.drop, previous)
+            except Exception as e:
+                logger.error("Failed to drop old namespace %s: %s", previous, e)
+        return f"Index rebuilt into {namespace}: {len(wanted)} vectors."
 
 
-vector_store = VectorStore()
+# Создается при первом обращении или при прогреве в lifespan
+get_vector_store: Lazy[VectorStore] = Lazy(VectorStore)
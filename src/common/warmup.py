@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from src.common.context import load_tokenizer
+from src.common.llm_model import get_llm
+from src.common.logger import logger
+from src.common.telemetry import STARTUP_SECONDS, WARMUP_STEP_SECONDS
+from src.common.tools.ReAct_agent import get_agent, get_agent_llm
+from src.common.vector_store import get_vector_store
+from src.db.catalog import catalog
+from src.db.database import get_engine
+from src.db.jobs import fail_stale_jobs
+from src.settings.config import StartupSettings, require_credentials
+from src.settings.db_settings import get_db_settings
+
+startup_settings = StartupSettings()
+
+
+class WarmupState:
+    """Ход прогрева для /ready: шаги со временем и ошибками."""
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.error: Optional[str] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+            "steps": self.steps,
+        }
+
+
+warmup_state = WarmupState()
+
+
+async def _step(
+    name: str, call: Callable[[], Awaitable[Any]], required: bool = True
+) -> None:
+    """
+    Выполняет шаг прогрева и записывает его время.
+    Ошибка обязательного шага прерывает прогрев, необязательного — только в лог.
+    """
+    started = time.perf_counter()
+    try:
+        if required:
+            await call()
+        else:
+            await asyncio.wait_for(call(), startup_settings.warmup_timeout)
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        warmup_state.steps[name] = {
+            "seconds": round(seconds, 3),
+            "error": f"{type(e).__name__}: {e}",
+        }
+        if required:
+            raise
+        logger.warning("Warm-up step %s failed in %.3fs: %s", name, seconds, e)
+        return
+    seconds = time.perf_counter() - started
+    warmup_state.steps[name] = {"seconds": round(seconds, 3)}
+    WARMUP_STEP_SECONDS.labels(step=name).set(seconds)
+    logger.info("Warm-up step %s done in %.3fs", name, seconds)
+
+
+async def _check_credentials() -> None:
+    require_credentials()
+
+
+async def _build_clients() -> None:
+    # Конструкторы синхронные и импортируют langchain_openai: не в event loop
+    for factory in (get_llm, get_agent_llm, get_vector_store, get_agent):
+        await asyncio.to_thread(factory)
+
+
+async def _load_tokenizer() -> None:
+    await asyncio.to_thread(load_tokenizer)
+
+
+async def _warm_db_pool() -> None:
+    """Открывает заранее соединения пула, чтобы первые запросы их не ждали."""
+    engine = get_engine()
+    count = min(startup_settings.warmup_db_connections, get_db_settings().DB_POOL_SIZE)
+
+    async def ping() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(count)))
+
+
+async def _fail_stale_jobs() -> None:
+    await fail_stale_jobs()
+
+
+async def _warm_vector_index() -> None:
+    vector_store = get_vector_store()
+    namespace = await vector_store.refresh_namespace(force=True)
+    # Pinecone: соединение к индексу, локальный индекс: матрица с диска в память
+    await asyncio.to_thread(vector_store.backend.count, namespace)
+
+
+async def _warm_openai() -> None:
+    """Соединение к OpenAI открывается заранее дешевым запросом списка моделей."""
+    client = getattr(get_llm(), "root_async_client", None)
+    if client is not None:
+        await client.models.list()
+
+
+async def warm_up(started: float) -> None:
+    """
+    Прогрев при запуске: ключи, клиенты, пул БД, снимок каталога и индекс.
+    Пока он не закончен, /ready отвечает 503, запросы при этом обслуживаются
+    и создают недостающее сами.
+    :param started: perf_counter начала импорта приложения
+    """
+    try:
+        await _step("credentials", _check_credentials)
+        await _step("clients", _build_clients)
+        await _step("tokenizer", _load_tokenizer, required=False)
+        await _step("db_pool", _warm_db_pool)
+        await _step("catalog", catalog.get)
+        # Задачи, брошенные остановленным воркером, иначе навсегда остались бы running
+        await _step("stale_jobs", _fail_stale_jobs, required=False)
+        await _step("vector_index", _warm_vector_index, required=False)
+        if startup_settings.warmup_http:
+            await _step("openai", _warm_openai, required=False)
+    except Exception as e:
+        warmup_state.error = f"{type(e).__name__}: {e}"
+        logger.exception("Warm-up failed: %s", e)
+        return
+    warmup_state.ready_seconds = round(time.perf_counter() - started, 3)
+    warmup_state.ready = True
+    STARTUP_SECONDS.labels(phase="ready").set(warmup_state.ready_seconds)
+    logger.info("Application ready in %.3fs", warmup_state.ready_seconds)
@@ -1,20 +1,54 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Annotated, Any, Dict, List, Optional
-
-import requests  # type: ignore
-from fastapi import Depends
+from array import array
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import httpx
 from pydantic import TypeAdapter
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import ARRAY, Select, String, bindparam, func, or_, select, text, true
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.common.Schemas.pharmacy_schemas import PharmacyProductSchema
+from src.common.json_stream import iter_json_array
+from src.common.Schemas.pharmacy_schemas import PharmacyProductSchema, UpdateStats
 from src.common.logger import logger
-from src.common.vector_store import vector_store
-from src.db.database import engine, get_db
+from src.common.vector_store import IndexProgress, get_vector_store
+from src.db.catalog import bump_catalog_version, catalog
+from src.db.database import get_engine, get_session
+from src.db.ingestion import (
+    StagedRow,
+    copy_to_staging,
+    fingerprint,
+    get_feed_state,
+    is_known,
+    load_fingerprints,
+    lock_ingestion,
+    merge_staging,
+    reset_staging,
+    save_feed_state,
+)
 from src.db.Models import Base, Pharmacy, PharmacyProduct, Product
+from src.settings.config import CatalogSettings, FeedSettings
+
+catalog_settings = CatalogSettings()
+feed_settings = FeedSettings()
+
+_products_adapter = TypeAdapter(List[PharmacyProductSchema])
 
+ProgressCallback = Callable[[int], Awaitable[None]]
 
-def create_db() -> str:
+
+async def create_db() -> str:
     """
     Создает базу данных и таблицы, если они не существуют.
     Если база уже существует, ничего не делает.
@@ -22,7 +56,9 @@ def create_db() -> str:
     :return: Сообщение о результате операции
     """
     try:
-        Base.metadata.create_all(bind=engine)
+        async with get_engine().begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.run_sync(Base.metadata.create_all)
     except Exception as exp:
         if "already exists" in str(exp):
             logger.info("Database already exists")
@@ -34,14 +70,15 @@ def create_db() -> str:
         return "Database created successfully"
 
 
-def drop_db() -> str:
+async def drop_db() -> str:
     """
     Удаляет все таблицы из базы данных.
 
     :return: Сообщение о результате операции
     """
     try:
-        Base.metadata.drop_all(bind=engine)
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
     except Exception as exp:
         if "does not exist" in str(exp):
             logger.info("Database does not exist")
@@ -53,198 +90,443 @@ def drop_db() -> str:
         return "Database dropped successfully"
 
 
-def __get_json_from_url(
-    address: str,
-    params: Optional[Dict[Any, Any]] = None,
-    headers: Optional[Dict[Any, Any]] = None,
-) -> Any:
+@asynccontextmanager
+async def __open_feed(
+    address: str, headers: Optional[Dict[str, str]] = None
+) -> AsyncIterator[httpx.Response]:
     """
-    Отправляет GET-запрос по указанному URL и возвращает ответ в формате JSON.
+    Отправляет GET-запрос по указанному URL и отдает ответ, не читая тело:
+    его можно разбирать по кускам, не дожидаясь конца загрузки.
 
     :param address: URL для запроса
-    :param params: (опционально) параметры запроса
     :param headers: (опционально) заголовки запроса
-    :return: Ответ в формате dict (JSON)
-    :raises: requests.RequestException, ValueError
+    :return: Ответ с непрочитанным телом (2xx или 304 Not Modified)
+    :raises: httpx.HTTPError
     """
-    response = requests.get(address, params=params, headers=headers)
-    response.raise_for_status()  # выбросит исключение, если код ответа не 2xx
-    return response.json()
+    async with httpx.AsyncClient(timeout=feed_settings.timeout) as client:
+        async with client.stream("GET", address, headers=headers) as response:
+            if response.status_code != httpx.codes.NOT_MODIFIED:
+                response.raise_for_status()  # исключение, если код ответа не 2xx
+            yield response
+
+
+async def __iter_products_from_json(json_data: Dict[Any, Any]) -> AsyncIterator[Any]:
+    """Строки выгрузки из уже разобранного JSON-словаря."""
+    if "Products" not in json_data:
+        raise ValueError('JSON document has no "Products" array')
+    for item in json_data["Products"]:
+        yield item
+
+
+async def __batched(items: AsyncIterator[Any], size: int) -> AsyncIterator[List[Any]]:
+    """Группирует поток строк выгрузки в пачки по size штук."""
+    batch: List[Any] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 def __get_pharmacy_products_from_json(
-    json_data: Optional[Dict[Any, Any]],
+    items: List[Any],
 ) -> List[PharmacyProductSchema]:
     """
-    Получает список PharmacyProductSchema из JSON-данных.
-    :param json_data: Словарь с ключом "Products", содержащим список продуктов
+    Получает список PharmacyProductSchema из пачки строк выгрузки.
+    :param items: Элементы массива "Products"
     :return: Список PharmacyProductSchema
     """
-    if not json_data:
-        raise ValueError(
-            "JSON data is required. Please provide a valid JSON dictionary."
-        )
-    pharmacy_products = TypeAdapter(List[PharmacyProductSchema]).validate_python(
-        json_data["Products"]
-    )
-    return pharmacy_products
+    return _products_adapter.validate_python(items)
 
 
-def update_db(
-    db: Annotated[Session, Depends(get_db)],
-    json_url: str = "https://salamat.cloud1c.pro/FileGPT/SalamatProducts.json",
-    json_data: Optional[Dict[Any, Any]] = None,
-) -> int:
-    """
-    Обновляет базу данных с bulk-операциями для ускорения массовой загрузки.
-
-    :param json_url: URL с JSON-данными
-    :param json_data: (опционально) JSON-данные
-    :param db: SQLAlchemy session
-    :return: Количество добавленных записей
-    """
-    if not json_data:
-        json_data = __get_json_from_url(json_url)
-    pydantic_list_of_products = __get_pharmacy_products_from_json(json_data)
-    counter = 0
-
-    # Загружаем все существующие продукты и аптеки в память через scalars
-    products = db.scalars(select(Product)).all()
-    pharmacies = db.scalars(select(Pharmacy)).all()
-    existing_products = {p.name: p.id for p in products}
-    existing_pharmacies = {p.address: p.id for p in pharmacies}
-
-    # Собираем новые продукты и аптеки, исключая дубликаты внутри пачки
-    new_product_names = set()
-    new_pharmacy_addresses = set()
-    new_products = []
-    new_pharmacies = []
-    for item in pydantic_list_of_products:
-        p_name = item.product.name
-        ph_addr = item.pharmacy.address
-        if p_name not in existing_products and p_name not in new_product_names:
-            new_products.append(Product(name=p_name))
-            new_product_names.add(p_name)
-        if ph_addr not in existing_pharmacies and ph_addr not in new_pharmacy_addresses:
-            new_pharmacies.append(Pharmacy(address=ph_addr))
-            new_pharmacy_addresses.add(ph_addr)
-
-    # Bulk insert новых продуктов и аптек
-    if new_products:
-        db.bulk_save_objects(new_products)
-    if new_pharmacies:
-        db.bulk_save_objects(new_pharmacies)
-    db.commit()
-
-    # Обновим словари id через scalars
-    products = db.scalars(select(Product)).all()
-    pharmacies = db.scalars(select(Pharmacy)).all()
-    existing_products = {p.name: p.id for p in products}
-    existing_pharmacies = {p.address: p.id for p in pharmacies}
-
-    # Bulk insert связей PharmacyProduct через scalars
-    pharmacy_products = db.scalars(select(PharmacyProduct)).all()
-    existing_links = set((pp.product_id, pp.pharmacy_id) for pp in pharmacy_products)
-    pharm_prod_prices = []
-    for item in pydantic_list_of_products:
+def __raw_fingerprint(item: Any) -> Optional[int]:
+    """
+    Отпечаток строки выгрузки до проверки схемой.
+    None, если строка не в плоском формате {"name", "address", "price"}.
+    """
+    if not isinstance(item, dict):
+        return None
+    name, address, price = item.get("name"), item.get("address"), item.get("price")
+    if isinstance(name, str) and isinstance(address, str) and isinstance(price, str):
+        return fingerprint(name, address, price)
+    return None
+
+
+def __to_staged_rows(
+    pharmacy_products: List[PharmacyProductSchema],
+) -> Tuple[List[StagedRow], int]:
+    """
+    Переводит строки выгрузки в кортежи для COPY.
+    :return: Строки (название, адрес, цена, отпечаток) и количество
+        отброшенных строк
+    """
+    rows: List[StagedRow] = []
+    rejected = 0
+    for item in pharmacy_products:
         try:
             price_product = int(item.price)
         except Exception as exp:
             logger.error("Price error: %s | Product: %s", exp, item)
+            rejected += 1
             continue
-        product_id = existing_products[item.product.name]
-        pharmacy_id = existing_pharmacies[item.pharmacy.address]
-        if (product_id, pharmacy_id) not in existing_links:
-            pharm_prod_prices.append(
-                PharmacyProduct(
-                    product_id=product_id, pharmacy_id=pharmacy_id, price=price_product
-                )
+        rows.append(
+            (
+                item.product.name,
+                item.pharmacy.address,
+                price_product,
+                fingerprint(item.product.name, item.pharmacy.address, item.price),
             )
-            existing_links.add((product_id, pharmacy_id))
-            counter += 1
-    if pharm_prod_prices:
-        db.bulk_save_objects(pharm_prod_prices)
-    db.commit()
-    # Обновление vector store по понедельникам с 8-9 утра
+        )
+    return rows, rejected
+
+
+def __prepare_batch(
+    batch: List[Any], known: "array[int]"
+) -> Tuple[List[StagedRow], int, int]:
+    """
+    Отбрасывает неизмененные строки пачки по отпечатку, остальные проверяет.
+    :return: Строки для COPY, количество неизмененных и отброшенных строк
+    """
+    changed = []
+    unchanged = 0
+    for item in batch:
+        value = __raw_fingerprint(item)
+        if value is not None and is_known(known, value):
+            unchanged += 1
+        else:
+            changed.append(item)
+    if not changed:
+        return [], unchanged, 0
+    rows, rejected = __to_staged_rows(__get_pharmacy_products_from_json(changed))
+    return rows, unchanged, rejected
+
+
+async def __apply_feed(
+    db: AsyncSession,
+    items: AsyncIterator[Any],
+    progress: Optional[ProgressCallback] = None,
+) -> UpdateStats:
+    """
+    Загружает в feed_staging только новые и измененные строки и переносит их
+    в основные таблицы. Строки, чей отпечаток уже есть в базе, не проверяются
+    и не пишутся, поэтому стоимость загрузки зависит от объема изменений.
+    Проверка пачек идет в отдельном потоке, чтобы не задерживать event loop.
+    """
+    known = await load_fingerprints(db)
+    await reset_staging(db)
+    unchanged = 0
+    rejected = 0
+    staged = 0
+    processed = 0
+    async for batch in __batched(items, feed_settings.batch_size):
+        rows, batch_unchanged, batch_rejected = await asyncio.to_thread(
+            __prepare_batch, batch, known
+        )
+        if rows:
+            await copy_to_staging(db, rows)
+        unchanged += batch_unchanged
+        rejected += batch_rejected
+        staged += len(rows)
+        processed += len(batch)
+        if progress is not None:
+            await progress(processed)
+    logger.info(
+        "Feed staged: %s changed rows, %s unchanged, %s rejected",
+        staged,
+        unchanged,
+        rejected,
+    )
+
+    stats = await merge_staging(db) if staged else UpdateStats()
+    stats.unchanged += unchanged
+    stats.rejected = rejected
+    await reset_staging(db)
+    return stats
+
+
+async def __apply_feed_from_url(
+    db: AsyncSession, json_url: str, progress: Optional[ProgressCallback] = None
+) -> UpdateStats:
+    """
+    Скачивает выгрузку условным GET (If-None-Match / If-Modified-Since
+    по валидаторам прошлой загрузки). На 304 ничего не делает.
+    """
+    etag, last_modified = await get_feed_state(db, json_url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with __open_feed(json_url, headers=headers) as response:
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            return UpdateStats(not_modified=True)
+        stats = await __apply_feed(
+            db,
+            iter_json_array(
+                response.aiter_bytes(feed_settings.chunk_size),
+                "Products",
+                max_item_chars=feed_settings.max_item_chars,
+            ),
+            progress,
+        )
+    # Валидаторы сохраняются в той же транзакции, что и сами данные
+    await save_feed_state(
+        db,
+        json_url,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
+    return stats
+
+
+async def update_db(
+    db: AsyncSession,
+    json_url: str = feed_settings.url,
+    json_data: Optional[Dict[Any, Any]] = None,
+    body: Optional[AsyncIterable[bytes]] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> UpdateStats:
+    """
+    Обновляет базу данных: массив "Products" разбирается потоком и пачками
+    по feed_settings.batch_size; новые и измененные строки проверяются
+    и загружаются через COPY в feed_staging, затем переносятся в основные
+    таблицы set-based запросами с upsert цен. В памяти держится только
+    текущая пачка и отсортированные отпечатки сохраненных строк.
+    Загрузки из разных процессов выполняются по очереди (advisory lock).
+
+    :param json_url: URL с JSON-данными, если не переданы json_data и body.
+        Неизмененная с прошлой загрузки выгрузка (304) пропускается целиком
+    :param json_data: (опционально) уже разобранные JSON-данные
+    :param body: (опционально) поток байтов JSON-документа, например тело запроса
+    :param progress: (опционально) вызывается после каждой пачки
+        с числом обработанных строк выгрузки
+    :param db: SQLAlchemy async session
+    :return: Количество добавленных, обновленных, неизмененных и отброшенных записей
+    """
+    await lock_ingestion(db)
+    if json_data:
+        stats = await __apply_feed(db, __iter_products_from_json(json_data), progress)
+    elif body is not None:
+        stats = await __apply_feed(
+            db,
+            iter_json_array(
+                body, "Products", max_item_chars=feed_settings.max_item_chars
+            ),
+            progress,
+        )
+    else:
+        stats = await __apply_feed_from_url(db, json_url, progress)
+    if stats.not_modified:
+        logger.info("Feed not modified since last update: %s", json_url)
+        await db.rollback()  # освобождает advisory lock
+        return stats
+
+    await db.commit()
+    logger.info("Feed applied: %s", stats)
+    if stats.inserted or stats.updated:
+        await bump_catalog_version()
+        await catalog.reload()
+    # Синхронизация vector store по понедельникам с 8-9 утра
     now = datetime.now()
     if now.weekday() == 0 and (8 <= now.hour <= 9):
-        logger.info("Starting to rebuild vector store")
-        status_update = update_vector_store()
-        logger.info("Vector store rebuilt status: %s", status_update)
+        logger.info("Starting to sync vector store")
+        status_update = await update_vector_store()
+        logger.info("Vector store sync status: %s", status_update)
 
-    return counter
+    return stats
 
 
-def get_all_pharmacies_by_product_name(product_name: str) -> Any:
+def _like_pattern(value: str) -> str:
+    """Шаблон '%value%' для ILIKE с экранированными спецсимволами."""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _ranked_products_query(product_name: str, limit: int) -> Select[Any]:
+    """
+    Товары, похожие на product_name, от лучшего совпадения к худшему.
+    Оба условия обслуживаются GIN-индексом ix_products_name_trgm.
+    """
+    similarity = func.similarity(Product.name, product_name)
+    return (
+        select(Product.id, Product.name)
+        .where(
+            or_(
+                Product.name.ilike(_like_pattern(product_name)),
+                Product.name.op("%")(product_name),
+            )
+        )
+        .order_by(similarity.desc(), Product.name)
+        .limit(limit)
+    )
+
+
+async def search_products(product_name: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Поиск товаров по названию с ранжированием по похожести (pg_trgm).
+    :param product_name: Название или часть названия товара
+    :param limit: Сколько лучших совпадений вернуть
+    :return: Названия товаров, лучшие совпадения первыми
+    """
+    limit = limit or catalog_settings.search_limit
+    if catalog_settings.snapshot_enabled:
+        return (await catalog.get()).find_products(product_name, limit)
+    async with get_session() as db:
+        rows = await db.execute(_ranked_products_query(product_name, limit))
+    return [name for _, name in rows]
+
+
+async def get_all_pharmacies_by_product_name(product_name: str) -> List[str]:
     """
     Поиск аптек по названию продукта
     :param product_name: Название продукта
-    :return: Список аптек
+    :return: Список адресов аптек
     """
-    db = next(get_db())
-    # Поиск id продукта по имени
-
-    product = db.scalar(select(Product).where(Product.name.ilike(f"%{product_name}%")))
-    if not product:
-        return []
-    # Поиск аптеки, где есть этот продукт
+    if catalog_settings.snapshot_enabled:
+        return (await catalog.get()).pharmacies_for(product_name)
+    # Лучший по названию продукт и его аптеки — одним запросом
+    best = _ranked_products_query(product_name, 1).subquery()
     query = (
-        select(Pharmacy)
+        select(Pharmacy.address)
         .join(PharmacyProduct, Pharmacy.id == PharmacyProduct.pharmacy_id)
-        .where(PharmacyProduct.product_id == product.id)
+        .join(best, best.c.id == PharmacyProduct.product_id)
     )
-    pharmacies = db.scalars(query).all()
-    return pharmacies
+    async with get_session() as db:
+        pharmacies = (await db.scalars(query)).all()
+    return list(pharmacies)
 
 
-def get_product_price(product_name: str, pharmacy_address: str) -> Any:
+async def get_product_price(product_name: str, pharmacy_address: str) -> Any:
     """
     Поиск цены продукта в конкретной аптеке
     :param product_name: Название продукта
     :param pharmacy_address: Адрес аптеки
     :return: Цена продукта или None, если не найдено
     """
-    db = next(get_db())
-    product = db.scalar(select(Product).where(Product.name.ilike(f"%{product_name}%")))
-    if not product:
-        return None
-    pharmacy = db.scalar(select(Pharmacy).where(Pharmacy.address == pharmacy_address))
-    if not pharmacy:
-        return None
-    pharmacy_product = db.scalar(
-        select(PharmacyProduct).where(
-            PharmacyProduct.product_id == product.id,
-            PharmacyProduct.pharmacy_id == pharmacy.id,
-        )
+    if catalog_settings.snapshot_enabled:
+        return (await catalog.get()).price(product_name, pharmacy_address)
+    best = _ranked_products_query(product_name, 1).subquery()
+    query = (
+        select(PharmacyProduct.price)
+        .join(best, best.c.id == PharmacyProduct.product_id)
+        .join(Pharmacy, Pharmacy.id == PharmacyProduct.pharmacy_id)
+        .where(Pharmacy.address == pharmacy_address)
     )
-    if not pharmacy_product:
-        return None
-    return pharmacy_product.price
+    async with get_session() as db:
+        return await db.scalar(query)
 
 
-def get_products_by_name(product_name: str) -> Optional[List[str]]:
-    db = next(get_db())
-    products = db.scalars(
-        select(Product).where(Product.name.ilike(f"%{product_name.lower()}%"))
+async def quote_products(
+    product_names: List[str], pharmacy_address: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Цены и наличие сразу для нескольких товаров за один запрос к базе.
+    :param product_names: Названия товаров
+    :param pharmacy_address: (опционально) адрес аптеки для фильтра
+    :return: Для каждого названия — лучший найденный товар и список
+        предложений {"address", "price"} по возрастанию цены
+    """
+    if catalog_settings.snapshot_enabled:
+        return (await catalog.get()).quote(product_names, pharmacy_address)
+    if not product_names:
+        return []
+
+    requested = (
+        func.unnest(
+            bindparam("queries", product_names, type_=ARRAY(String)),
+            bindparam(
+                "patterns",
+                [_like_pattern(name) for name in product_names],
+                type_=ARRAY(String),
+            ),
+        )
+        .table_valued("query", "pattern", with_ordinality="position")
+        .render_derived()
     )
-    if products:
-        return [product.name for product in products]
-    return None
+    # Для каждого названия берем лучший товар (LATERAL ... LIMIT 1)
+    best = (
+        select(Product.id, Product.name)
+        .where(
+            or_(
+                Product.name.ilike(requested.c.pattern),
+                Product.name.op("%")(requested.c.query),
+            )
+        )
+        .order_by(func.similarity(Product.name, requested.c.query).desc(), Product.name)
+        .limit(1)
+        .lateral("best")
+    )
+    offers = select(
+        PharmacyProduct.product_id, Pharmacy.address, PharmacyProduct.price
+    ).join(Pharmacy, Pharmacy.id == PharmacyProduct.pharmacy_id)
+    if pharmacy_address is not None:
+        offers = offers.where(Pharmacy.address == pharmacy_address)
+    offers_subquery = offers.subquery("offers")
+    query = (
+        select(
+            requested.c.position,
+            requested.c.query,
+            best.c.name,
+            offers_subquery.c.address,
+            offers_subquery.c.price,
+        )
+        .select_from(requested)
+        .outerjoin(best, true())
+        .outerjoin(offers_subquery, offers_subquery.c.product_id == best.c.id)
+        .order_by(requested.c.position, offers_subquery.c.price)
+    )
+    async with get_session() as db:
+        rows = (await db.execute(query)).all()
+
+    quotes: Dict[int, Dict[str, Any]] = {}
+    for position, query_name, name, address, price in rows:
+        quote = quotes.setdefault(
+            position, {"query": query_name, "product": name, "offers": []}
+        )
+        if address is not None:
+            quote["offers"].append({"address": address, "price": price})
+    return list(quotes.values())
+
+
+async def get_products_by_name(product_name: str) -> Optional[List[str]]:
+    return await search_products(product_name.lower())
+
+
+async def get_all_pharmacy_addresses() -> List[str]:
+    """Адреса всех аптек."""
+    if catalog_settings.snapshot_enabled:
+        return list((await catalog.get()).pharmacy_addresses)
+    async with get_session() as db:
+        return list((await db.scalars(select(Pharmacy.address))).all())
 
 
-def get_all_products() -> Optional[List[str]]:
-    db = next(get_db())
-    products = db.scalars(select(Product)).all()
+async def get_all_products() -> Optional[List[str]]:
+    async with get_session() as db:
+        products = (await db.scalars(select(Product.name))).all()
     if products:
-        return [product.name for product in products]
+        return list(products)
     return None
 
 
-def update_vector_store() -> Any:
-    products_names = get_all_products()
+async def update_vector_store(
+    full: bool = False, progress: Optional[IndexProgress] = None
+) -> Any:
+    """
+    Приводит индекс векторов к таблице товаров.
+    :param full: пересобрать индекс целиком в новом пространстве имен
+        вместо синхронизации изменений
+    :param progress: (опционально) вызывается после каждой пачки
+        с числом записанных векторов и их общим числом
+    """
+    products_names = await get_all_products()
     if products_names:
-        status_message = vector_store.rebuild_vector_store(
-            products_names=products_names
-        )
-        return status_message
+        if full:
+            return await get_vector_store().rebuild_vector_store(
+                products_names, progress
+            )
+        vector_store = get_vector_store()
+        await vector_store.refresh_namespace(force=True)
+        return await vector_store.sync_vector_store(products_names, progress)
     return "No products found"
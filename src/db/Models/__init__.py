@@ -1,3 +1,26 @@
-from src.db.Models.pharmacy_models import Base, Pharmacy, PharmacyProduct, Product
+from src.db.Models.agent_models import AgentCheckpoint, AgentCheckpointWrite
+from src.db.Models.pharmacy_models import (
+    Base,
+    FeedState,
+    IngestJob,
+    Pharmacy,
+    PharmacyProduct,
+    Product,
+    VectorIndexState,
+    catalog_version_seq,
+    feed_staging,
+)
 
-__all__ = ["Base", "Pharmacy", "PharmacyProduct", "Product"]
+__all__ = [
+    "AgentCheckpoint",
+    "AgentCheckpointWrite",
+    "Base",
+    "FeedState",
+    "IngestJob",
+    "Pharmacy",
+    "PharmacyProduct",
+    "Product",
+    "VectorIndexState",
+    "catalog_version_seq",
+    "feed_staging",
+]
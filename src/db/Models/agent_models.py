@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, LargeBinary, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.Models.pharmacy_models import Base
+
+
+class AgentCheckpoint(Base):
+    """Последнее состояние диалога агента: одна строка на поток."""
+
+    __tablename__ = "agent_checkpoints"
+    __table_args__ = (UniqueConstraint("thread_id", "checkpoint_ns"),)
+    thread_id: Mapped[str] = mapped_column(nullable=False)
+    checkpoint_ns: Mapped[str] = mapped_column(nullable=False, default="")
+    checkpoint_id: Mapped[str] = mapped_column(nullable=False)
+    parent_checkpoint_id: Mapped[str] = mapped_column(nullable=True)
+    # Формат сериализации (serde.dumps_typed) и данные
+    checkpoint_type: Mapped[str] = mapped_column(nullable=False)
+    checkpoint: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    metadata_type: Mapped[str] = mapped_column(nullable=False)
+    checkpoint_metadata: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # По нему удаляются неактивные потоки
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        index=True,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<AgentCheckpoint(thread_id={self.thread_id}, "
+            f"checkpoint_id={self.checkpoint_id})>"
+        )
+
+
+class AgentCheckpointWrite(Base):
+    """Промежуточные записи задач для последнего состояния потока."""
+
+    __tablename__ = "agent_checkpoint_writes"
+    __table_args__ = (
+        UniqueConstraint(
+            "thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"
+        ),
+    )
+    thread_id: Mapped[str] = mapped_column(nullable=False)
+    checkpoint_ns: Mapped[str] = mapped_column(nullable=False, default="")
+    checkpoint_id: Mapped[str] = mapped_column(nullable=False)
+    task_id: Mapped[str] = mapped_column(nullable=False)
+    task_path: Mapped[str] = mapped_column(nullable=False, default="")
+    idx: Mapped[int] = mapped_column(nullable=False)
+    channel: Mapped[str] = mapped_column(nullable=False)
+    value_type: Mapped[str] = mapped_column(nullable=False)
+    value: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<AgentCheckpointWrite(thread_id={self.thread_id}, "
+            f"task_id={self.task_id}, channel={self.channel})>"
+        )
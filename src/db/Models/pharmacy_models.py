@@ -1,4 +1,21 @@
-from sqlalchemy import ForeignKey, UniqueConstraint
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    Sequence,
+    String,
+    Table,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -23,6 +40,16 @@ class Product(Base):
     # Связь с таблицей PharmacyProduct
     pharmacy_products = relationship("PharmacyProduct", back_populates="product")
 
+    # Триграммный индекс для поиска по подстроке и похожести (pg_trgm)
+    __table_args__ = (
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"<Product(id={self.id}, name={self.name})>"
 
@@ -34,6 +61,9 @@ class PharmacyProduct(Base):
         ForeignKey("pharmacies.id"), nullable=False
     )
     price: Mapped[int] = mapped_column(nullable=False)
+    # Отпечаток строки выгрузки (название, адрес, цена): неизмененные строки
+    # узнаются по нему и не проверяются и не загружаются повторно
+    fingerprint: Mapped[int] = mapped_column(BigInteger, nullable=True)
 
     product = relationship("Product", back_populates="pharmacy_products")
     pharmacy = relationship("Pharmacy", back_populates="pharmacy_products")
@@ -47,3 +77,91 @@ class PharmacyProduct(Base):
             f"<PharmacyProduct(pharmacy_address={self.pharmacy.address}, "
             f"product_name={self.product.name}, price={self.price})>"
         )
+
+
+class FeedState(Base):
+    """Валидаторы последней примененной выгрузки для условного GET."""
+
+    __tablename__ = "feed_state"
+    url: Mapped[str] = mapped_column(unique=True, nullable=False)
+    etag: Mapped[str] = mapped_column(nullable=True)
+    last_modified: Mapped[str] = mapped_column(nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<FeedState(url={self.url}, etag={self.etag})>"
+
+
+class IngestJob(Base):
+    """
+    Фоновая задача: загрузка выгрузки из 1С или пересборка индекса векторов
+    (source = rebuild). Статус, прогресс и итог.
+    """
+
+    __tablename__ = "ingest_jobs"
+    # queued -> running -> done | not_modified | failed
+    status: Mapped[str] = mapped_column(nullable=False, default="queued")
+    source: Mapped[str] = mapped_column(nullable=False)
+    processed: Mapped[int] = mapped_column(nullable=False, default=0)
+    stats: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[str] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Обновляется, пока воркер выполняет задачу; давно не обновлявшаяся
+    # задача в queued/running осталась от остановленного воркера
+    heartbeat_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    def __repr__(self) -> str:
+        return f"<IngestJob(id={self.id}, status={self.status})>"
+
+
+class VectorIndexState(Base):
+    """Указатель на рабочее пространство имен индекса векторов."""
+
+    __tablename__ = "vector_index_state"
+    # Пространство имен из настроек, к которому относится указатель
+    base_namespace: Mapped[str] = mapped_column(unique=True, nullable=False)
+    active_namespace: Mapped[str] = mapped_column(nullable=False)
+    # Недостроенное пространство имен: следующая пересборка продолжит его
+    building_namespace: Mapped[str] = mapped_column(nullable=True)
+    # Растет при каждом изменении индекса: по нему воркеры сбрасывают кэш поиска
+    index_version: Mapped[int] = mapped_column(
+        nullable=False, default=0, server_default="0"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<VectorIndexState(base_namespace={self.base_namespace}, "
+            f"active_namespace={self.active_namespace})>"
+        )
+
+
+# Промежуточная таблица для загрузки выгрузки из 1С через COPY.
+# UNLOGGED: не пишется в WAL, содержимое живет только в рамках загрузки.
+feed_staging = Table(
+    "feed_staging",
+    Base.metadata,
+    Column("seq", BigInteger, Identity(), primary_key=True),
+    Column("name", String, nullable=False),
+    Column("address", String, nullable=False),
+    Column("price", Integer, nullable=False),
+    Column("fingerprint", BigInteger, nullable=False),
+    prefixes=["UNLOGGED"],
+)
+
+
+# Версия каталога: увеличивается после каждой загрузки, изменившей товары или цены.
+# Последовательность, а не строка таблицы: nextval не блокирует читателей.
+catalog_version_seq = Sequence("catalog_version_seq", metadata=Base.metadata)
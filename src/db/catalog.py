@@ -0,0 +1,418 @@
+import asyncio
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+
+from src.common.logger import logger
+from src.db.database import get_session
+from src.db.Models import Pharmacy, PharmacyProduct, Product, catalog_version_seq
+from src.settings.config import CatalogSettings
+
+catalog_settings = CatalogSettings()
+
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _windows(text: str) -> Iterable[str]:
+    return ("".join(chars) for chars in zip(text, text[1:], text[2:]))
+
+
+def pg_trigrams(text: str) -> Set[str]:
+    """Триграммы как в pg_trgm: слова из букв и цифр, дополненные пробелами."""
+    trigrams: Set[str] = set()
+    for word in _WORD_RE.findall(text.lower()):
+        trigrams.update(_windows(f"  {word} "))
+    return trigrams
+
+
+class CatalogSnapshot:
+    """
+    Неизменяемый снимок каталога: товары, аптеки и цены.
+
+    Строки интернированы, связи товар -> аптека -> цена хранятся
+    в массивах (CSR: смещения по товару + колонки аптек и цен).
+    Поиск идет через триграммный индекс в формате pg_trgm (списки позиций
+    в массивах numpy) и ранжируется по similarity() так же, как поиск
+    в Postgres: совпадения по префиксу слова получают больше общих триграмм.
+    """
+
+    __slots__ = (
+        "version",
+        "product_names",
+        "pharmacy_addresses",
+        "link_offsets",
+        "link_pharmacies",
+        "link_prices",
+        "built_at",
+        "_folded",
+        "_folded_starts",
+        "_pharmacy_index",
+        "_trigram_index",
+        "_trigram_counts",
+    )
+
+    def __init__(
+        self,
+        products: Sequence[Tuple[int, str]],
+        pharmacies: Sequence[Tuple[int, str]],
+        link_product_ids: Sequence[int],
+        link_pharmacy_ids: Sequence[int],
+        link_prices: Sequence[int],
+        version: int = 0,
+    ) -> None:
+        self.version = version
+        product_pos = {}
+        names: List[str] = []
+        for product_id, name in sorted(products, key=lambda row: row[1]):
+            product_pos[product_id] = len(names)
+            names.append(sys.intern(name))
+        pharmacy_pos = {}
+        addresses: List[str] = []
+        for pharmacy_id, address in sorted(pharmacies, key=lambda row: row[1]):
+            pharmacy_pos[pharmacy_id] = len(addresses)
+            addresses.append(sys.intern(address))
+
+        self.product_names: Tuple[str, ...] = tuple(names)
+        self.pharmacy_addresses: Tuple[str, ...] = tuple(addresses)
+        self._pharmacy_index: Dict[str, int] = {
+            address: pos for pos, address in enumerate(addresses)
+        }
+
+        # Связи раскладываем по товару (counting sort):
+        # аптеки товара i лежат в link_offsets[i]..link_offsets[i + 1]
+        offsets = array("I", bytes(4 * (len(names) + 1)))
+        for product_id in link_product_ids:
+            offsets[product_pos[product_id] + 1] += 1
+        for i in range(len(names)):
+            offsets[i + 1] += offsets[i]
+        cursor = array("I", offsets[:-1])
+        self.link_pharmacies = array("I", bytes(4 * offsets[-1]))
+        self.link_prices = array("i", bytes(4 * offsets[-1]))
+        for product_id, pharmacy_id, price in zip(
+            link_product_ids, link_pharmacy_ids, link_prices
+        ):
+            pos = product_pos[product_id]
+            self.link_pharmacies[cursor[pos]] = pharmacy_pos[pharmacy_id]
+            self.link_prices[cursor[pos]] = price
+            cursor[pos] += 1
+        # Внутри товара сортируем по аптеке для бинарного поиска
+        for i in range(len(names)):
+            start, end = offsets[i], offsets[i + 1]
+            if end - start > 1:
+                rows = sorted(
+                    zip(self.link_pharmacies[start:end], self.link_prices[start:end])
+                )
+                self.link_pharmacies[start:end] = array("I", (r[0] for r in rows))
+                self.link_prices[start:end] = array("i", (r[1] for r in rows))
+        self.link_offsets = offsets
+
+        # Названия в нижнем регистре одной строкой через \x00: поиск подстроки
+        # идет str.find по всей строке, а не циклом по названиям
+        self._folded = "\x00".join(name.lower() for name in names) + "\x00"
+        starts = array("I", [0])
+        for name in names:
+            starts.append(starts[-1] + len(name) + 1)
+        self._folded_starts = starts
+        trigram_index: Dict[str, List[int]] = {}
+        trigram_counts = array("H")
+        for pos, name in enumerate(names):
+            trigrams = pg_trigrams(name)
+            trigram_counts.append(min(len(trigrams), 0xFFFF))
+            for trigram in trigrams:
+                trigram_index.setdefault(trigram, []).append(pos)
+        self._trigram_counts = np.frombuffer(trigram_counts, dtype=np.uint16)
+        self._trigram_index: Dict[str, np.ndarray] = {
+            sys.intern(trigram): np.array(positions, dtype=np.int32)
+            for trigram, positions in trigram_index.items()
+        }
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.product_names)
+
+    def search(
+        self, query: str, limit: int, threshold: float
+    ) -> List[Tuple[int, float]]:
+        """
+        Аналог WHERE name ILIKE '%query%' OR name % query
+        ORDER BY similarity(name, query) DESC, name LIMIT limit.
+
+        :return: Список (позиция товара, похожесть)
+        """
+        folded_query = query.lower()
+        query_trigrams = pg_trigrams(folded_query)
+        size = len(self.product_names)
+        shared = self._count_shared(query_trigrams, size)
+        similarity = shared / np.maximum(
+            len(query_trigrams) + self._trigram_counts - shared, 1
+        )
+        matched = similarity >= threshold
+
+        # ILIKE: подстрока содержит все триграммы слов запроса длиной от 3 символов.
+        # Если таких слов нет, подстрока внутри слова может не иметь общих
+        # триграмм с названием — тогда названия проверяются напрямую
+        inner_trigrams = {
+            trigram
+            for word in _WORD_RE.findall(folded_query)
+            for trigram in _windows(word)
+        }
+        if inner_trigrams:
+            has_all = self._count_shared(inner_trigrams, size) == len(inner_trigrams)
+            for pos in np.flatnonzero(has_all & ~matched).tolist():
+                start, end = self._folded_starts[pos], self._folded_starts[pos + 1]
+                if self._folded.find(folded_query, start, end) != -1:
+                    matched[pos] = True
+        else:
+            self._scan_substring(folded_query, matched)
+
+        positions = np.flatnonzero(matched)
+        # Товары отсортированы по имени, поэтому меньшая позиция — раньше по алфавиту
+        order = np.lexsort((positions, -similarity[positions]))[:limit]
+        return [(int(pos), float(similarity[pos])) for pos in positions[order]]
+
+    def _scan_substring(self, folded_query: str, matched: np.ndarray) -> None:
+        """
+        ILIKE для запроса без триграмм внутри слов: поиск подстроки по строке
+        всех названий, от совпадения сразу к следующему названию. Учитывается
+        не больше substring_scan_limit совпавших названий (первые по алфавиту).
+        """
+        if not folded_query:
+            matched[:] = True
+            return
+        starts = self._folded_starts
+        found = 0
+        at = self._folded.find(folded_query)
+        while at != -1 and found < catalog_settings.substring_scan_limit:
+            pos = bisect_right(starts, at) - 1
+            matched[pos] = True
+            found += 1
+            at = self._folded.find(folded_query, starts[pos + 1])
+
+    def _count_shared(self, trigrams: Set[str], size: int) -> np.ndarray:
+        """Сколько триграмм из набора есть в названии каждого товара."""
+        postings = [
+            self._trigram_index[trigram]
+            for trigram in trigrams
+            if trigram in self._trigram_index
+        ]
+        if not postings:
+            return np.zeros(size, dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=size)
+
+    def find_products(self, query: str, limit: int) -> List[str]:
+        """Названия лучших по похожести товаров."""
+        return [
+            self.product_names[pos]
+            for pos, _ in self.search(
+                query, limit, catalog_settings.similarity_threshold
+            )
+        ]
+
+    def best_match(self, query: str) -> Optional[int]:
+        found = self.search(query, 1, catalog_settings.similarity_threshold)
+        return found[0][0] if found else None
+
+    def pharmacies_for(self, query: str) -> List[str]:
+        """Адреса аптек, где есть лучший по названию товар."""
+        pos = self.best_match(query)
+        if pos is None:
+            return []
+        start, end = self.link_offsets[pos], self.link_offsets[pos + 1]
+        return [
+            self.pharmacy_addresses[self.link_pharmacies[i]] for i in range(start, end)
+        ]
+
+    def price(self, query: str, pharmacy_address: str) -> Optional[int]:
+        """Цена лучшего по названию товара в аптеке по точному адресу."""
+        pos = self.best_match(query)
+        pharmacy = self._pharmacy_index.get(pharmacy_address)
+        if pos is None or pharmacy is None:
+            return None
+        start, end = self.link_offsets[pos], self.link_offsets[pos + 1]
+        i = bisect_left(self.link_pharmacies, pharmacy, start, end)
+        if i < end and self.link_pharmacies[i] == pharmacy:
+            return self.link_prices[i]
+        return None
+
+    def quote(
+        self, queries: Sequence[str], pharmacy_address: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Цены и наличие сразу для нескольких товаров.
+        :param queries: Названия товаров в порядке запроса
+        :param pharmacy_address: (опционально) адрес аптеки для фильтра
+        :return: Для каждого запроса — найденный товар и предложения аптек
+        """
+        pharmacy = (
+            self._pharmacy_index.get(pharmacy_address)
+            if pharmacy_address is not None
+            else None
+        )
+        quotes = []
+        for query in queries:
+            pos = self.best_match(query)
+            offers = []
+            if pos is not None:
+                for i in range(self.link_offsets[pos], self.link_offsets[pos + 1]):
+                    if pharmacy_address is None or self.link_pharmacies[i] == pharmacy:
+                        offers.append(
+                            {
+                                "address": self.pharmacy_addresses[
+                                    self.link_pharmacies[i]
+                                ],
+                                "price": self.link_prices[i],
+                            }
+                        )
+            offers.sort(key=lambda offer: offer["price"])
+            quotes.append(
+                {
+                    "query": query,
+                    "product": self.product_names[pos] if pos is not None else None,
+                    "offers": offers,
+                }
+            )
+        return quotes
+
+
+async def _read_version(db: Any) -> int:
+    # До первого nextval last_value уже равен 1, поэтому смотрим на is_called
+    query = text(
+        "SELECT CASE WHEN is_called THEN last_value ELSE 0 END "
+        f"FROM {catalog_version_seq.name}"
+    )
+    return int(await db.scalar(query))
+
+
+async def get_catalog_version() -> int:
+    """Текущая версия каталога в базе, общая для всех воркеров."""
+    async with get_session() as db:
+        return await _read_version(db)
+
+
+async def bump_catalog_version() -> int:
+    """
+    Увеличивает версию каталога. Вызывается после commit загрузки,
+    чтобы под новой версией никто не успел прочитать старые данные.
+    """
+    async with get_session() as db:
+        version = int(await db.scalar(catalog_version_seq.next_value().select()))
+        await db.commit()
+    return version
+
+
+class Catalog:
+    """Держит текущий снимок каталога и атомарно подменяет его после перезагрузки."""
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._checked_at = float("-inf")
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    async def get(self) -> CatalogSnapshot:
+        """
+        Текущий снимок; при первом обращении загружает его из базы.
+        Не чаще раза в refresh_interval секунд сверяет версию снимка с базой
+        и перезагружает его, если каталог загрузил другой воркер.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            async with self._lock:
+                if self._snapshot is None:
+                    await self._load()
+            return self._snapshot  # type: ignore[return-value]
+        now = time.monotonic()
+        if now - self._checked_at < catalog_settings.refresh_interval:
+            return snapshot
+        # Остальные запросы до конца проверки работают со старым снимком
+        self._checked_at = now
+        try:
+            version = await get_catalog_version()
+        except Exception as e:
+            logger.warning("Failed to check catalog version: %s", e)
+            return snapshot
+        if version > snapshot.version:
+            logger.info(
+                "Catalog version %s is behind %s, reloading", snapshot.version, version
+            )
+            snapshot = await self.ensure_version(version)
+        return snapshot
+
+    async def ensure_version(self, version: int) -> CatalogSnapshot:
+        """Снимок не старше version; перезагружает его, если база новее."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version >= version:
+            return snapshot
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version < version:
+                snapshot = await self._load()
+        return snapshot
+
+    async def reload(self) -> CatalogSnapshot:
+        """Строит новый снимок из базы и заменяет им текущий."""
+        async with self._lock:
+            return await self._load()
+
+    async def _load(self) -> CatalogSnapshot:
+        started = time.perf_counter()
+        link_product_ids, link_pharmacy_ids, link_prices = (
+            array("I"),
+            array("I"),
+            array("i"),
+        )
+        async with get_session() as db:
+            # Товары, аптеки и связи читаются разными запросами: в одном снимке
+            # базы загрузка между ними не оставит связей на неизвестные id
+            await db.execute(
+                text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            )
+            # Версию читаем до данных: снимок может оказаться новее, но не старше
+            version = await _read_version(db)
+            self._checked_at = time.monotonic()
+            products = (await db.execute(select(Product.id, Product.name))).all()
+            pharmacies = (await db.execute(select(Pharmacy.id, Pharmacy.address))).all()
+            # Связей больше всего — читаем потоком прямо в массивы
+            links = await db.stream(
+                select(
+                    PharmacyProduct.product_id,
+                    PharmacyProduct.pharmacy_id,
+                    PharmacyProduct.price,
+                ).execution_options(yield_per=10_000)
+            )
+            async for product_id, pharmacy_id, price in links:
+                link_product_ids.append(product_id)
+                link_pharmacy_ids.append(pharmacy_id)
+                link_prices.append(price)
+        snapshot = await asyncio.to_thread(
+            CatalogSnapshot,
+            products,  # type: ignore[arg-type]
+            pharmacies,  # type: ignore[arg-type]
+            link_product_ids,
+            link_pharmacy_ids,
+            link_prices,
+            version,
+        )
+        # Присваивание ссылки атомарно: читатели видят либо старый, либо новый снимок
+        self._snapshot = snapshot
+        logger.info(
+            "Catalog snapshot loaded: %s products, %s pharmacies, %s links in %.3fs",
+            len(snapshot),
+            len(snapshot.pharmacy_addresses),
+            len(snapshot.link_prices),
+            time.perf_counter() - started,
+        )
+        return snapshot
+
+
+catalog = Catalog()
@@ -0,0 +1,266 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.common.logger import logger
+from src.db.database import get_session
+from src.db.Models import AgentCheckpoint, AgentCheckpointWrite
+
+
+class PostgresLatestSaver(BaseCheckpointSaver[int]):
+    """
+    Checkpointer LangGraph в Postgres, который хранит только последнее
+    состояние каждого потока: новая контрольная точка перезаписывает
+    предыдущую, а промежуточные записи старых точек удаляются. История
+    для time travel не сохраняется, зато объем не растет с числом шагов.
+
+    Потоки, в которых не было сообщений дольше thread_ttl секунд, удаляются
+    не чаще раза в prune_interval секунд во время записи.
+    Состояние общее для всех воркеров и переживает перезапуск.
+    """
+
+    def __init__(self, thread_ttl: float, prune_interval: float) -> None:
+        super().__init__()
+        self.thread_ttl = thread_ttl
+        self.prune_interval = prune_interval
+        self._pruned_at = float("-inf")
+
+    @staticmethod
+    def _thread(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _config(
+        thread_id: str, checkpoint_ns: str, checkpoint_id: str
+    ) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id, checkpoint_ns = self._thread(config)
+        async with get_session() as db:
+            row = await db.scalar(
+                select(AgentCheckpoint).where(
+                    AgentCheckpoint.thread_id == thread_id,
+                    AgentCheckpoint.checkpoint_ns == checkpoint_ns,
+                )
+            )
+            checkpoint_id = get_checkpoint_id(config)
+            if row is None or checkpoint_id not in (None, row.checkpoint_id):
+                return None
+            writes = await db.scalars(
+                select(AgentCheckpointWrite)
+                .where(
+                    AgentCheckpointWrite.thread_id == thread_id,
+                    AgentCheckpointWrite.checkpoint_ns == checkpoint_ns,
+                    AgentCheckpointWrite.checkpoint_id == row.checkpoint_id,
+                )
+                .order_by(AgentCheckpointWrite.task_id, AgentCheckpointWrite.idx)
+            )
+            pending_writes = [
+                (
+                    write.task_id,
+                    write.channel,
+                    self.serde.loads_typed((write.value_type, write.value)),
+                )
+                for write in writes
+            ]
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, row.checkpoint_id),
+            checkpoint=self.serde.loads_typed((row.checkpoint_type, row.checkpoint)),
+            metadata=self.serde.loads_typed(
+                (row.metadata_type, row.checkpoint_metadata)
+            ),
+            parent_config=(
+                self._config(thread_id, checkpoint_ns, row.parent_checkpoint_id)
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        # Для потока есть не больше одной контрольной точки — последней
+        if config is None:
+            return
+        checkpoint = await self.aget_tuple(config)
+        if checkpoint is None or limit == 0:
+            return
+        before_id = get_checkpoint_id(before) if before else None
+        if before_id and checkpoint.checkpoint["id"] >= before_id:
+            return
+        if filter and any(checkpoint.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._thread(config)
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        values = {
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "checkpoint_type": checkpoint_type,
+            "checkpoint": checkpoint_data,
+            "metadata_type": metadata_type,
+            "checkpoint_metadata": metadata_data,
+        }
+        statement = insert(AgentCheckpoint).values(
+            thread_id=thread_id, checkpoint_ns=checkpoint_ns, **values
+        )
+        async with get_session() as db:
+            await db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[
+                        AgentCheckpoint.thread_id,
+                        AgentCheckpoint.checkpoint_ns,
+                    ],
+                    set_={**values, "updated_at": func.now()},
+                )
+            )
+            await db.execute(
+                delete(AgentCheckpointWrite).where(
+                    AgentCheckpointWrite.thread_id == thread_id,
+                    AgentCheckpointWrite.checkpoint_ns == checkpoint_ns,
+                    AgentCheckpointWrite.checkpoint_id != checkpoint["id"],
+                )
+            )
+            await db.commit()
+        await self._maybe_prune()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if not writes:
+            return
+        thread_id, checkpoint_ns = self._thread(config)
+        rows: List[Dict[str, Any]] = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            rows.append(
+                {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": config["configurable"]["checkpoint_id"],
+                    "task_id": task_id,
+                    "task_path": task_path,
+                    "idx": WRITES_IDX_MAP.get(channel, idx),
+                    "channel": channel,
+                    "value_type": value_type,
+                    "value": value_data,
+                }
+            )
+        statement = insert(AgentCheckpointWrite).values(rows)
+        index_elements = [
+            AgentCheckpointWrite.thread_id,
+            AgentCheckpointWrite.checkpoint_ns,
+            AgentCheckpointWrite.checkpoint_id,
+            AgentCheckpointWrite.task_id,
+            AgentCheckpointWrite.idx,
+        ]
+        # Служебные записи (ошибка, прерывание) заменяют прежние,
+        # обычные записываются один раз
+        if all(channel in WRITES_IDX_MAP for channel, _ in writes):
+            statement = statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    "channel": statement.excluded.channel,
+                    "value_type": statement.excluded.value_type,
+                    "value": statement.excluded.value,
+                },
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+        async with get_session() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with get_session() as db:
+            await db.execute(
+                delete(AgentCheckpointWrite).where(
+                    AgentCheckpointWrite.thread_id == str(thread_id)
+                )
+            )
+            await db.execute(
+                delete(AgentCheckpoint).where(
+                    AgentCheckpoint.thread_id == str(thread_id)
+                )
+            )
+            await db.commit()
+
+    async def prune(self) -> int:
+        """
+        Удаляет диалоги без сообщений дольше thread_ttl.
+        :return: Сколько потоков удалено
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.thread_ttl)
+        async with get_session() as db:
+            expired = (
+                await db.scalars(
+                    delete(AgentCheckpoint)
+                    .where(AgentCheckpoint.updated_at < cutoff)
+                    .returning(AgentCheckpoint.thread_id)
+                )
+            ).all()
+            if expired:
+                await db.execute(
+                    delete(AgentCheckpointWrite).where(
+                        AgentCheckpointWrite.thread_id.in_(set(expired))
+                    )
+                )
+            await db.commit()
+        return len(set(expired))
+
+    async def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+        try:
+            removed = await self.prune()
+        except Exception as e:
+            logger.warning("Failed to prune agent checkpoints: %s", e)
+        else:
+            if removed:
+                logger.info("Pruned %d idle agent threads", removed)
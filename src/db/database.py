@@ -1,18 +1,109 @@
-from typing import Generator
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
-from src.settings.db_settings import settings
+from src.common.lazy import Lazy
+from src.common.telemetry import instrument_engine
+from src.settings.db_settings import get_db_settings
 
-# Sync version
-engine = create_engine(url=settings.SYNC_DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Сессии получают движок при открытии, см. get_session
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
 
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
+class PoolStats:
+    """Счетчики пула соединений: время ожидания соединения и занятость."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def on_checkout(self, *_: Any) -> None:
+        self.checkouts += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self, *_: Any) -> None:
+        self.in_use = max(self.in_use - 1, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        pool = get_engine().pool
+        settings = get_db_settings()
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),  # type: ignore[attr-defined]
+            "checked_in": pool.checkedin(),  # type: ignore[attr-defined]
+            "overflow": pool.overflow(),  # type: ignore[attr-defined]
+            "peak_in_use": self.peak_in_use,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": (
+                round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0
+            ),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+pool_stats = PoolStats()
+
+
+def _create_engine() -> AsyncEngine:
+    """Async движок с пулом по настройкам; соединения открываются по требованию."""
+    settings = get_db_settings()
+    engine = create_async_engine(
+        url=settings.ASYNC_DATABASE_URL,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    event.listen(engine.sync_engine, "checkout", pool_stats.on_checkout)
+    event.listen(engine.sync_engine, "checkin", pool_stats.on_checkin)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+get_engine: Lazy[AsyncEngine] = Lazy(_create_engine)
+
+
+@asynccontextmanager
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    Открывает сессию и сразу берет соединение из пула,
+    чтобы учесть время ожидания. Соединение возвращается в пул при выходе.
+    """
+    async with AsyncSessionLocal(bind=get_engine()) as session:
+        started = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        pool_stats.observe_wait(time.perf_counter() - started)
+        yield session
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_session() as db:
         yield db
-    finally:
-        db.close()
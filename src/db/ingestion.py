@@ -0,0 +1,171 @@
+import hashlib
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.common.Schemas.pharmacy_schemas import UpdateStats
+from src.db.Models import FeedState, PharmacyProduct, feed_staging
+
+# Ключ pg_advisory_xact_lock для загрузок выгрузки
+INGEST_LOCK_KEY = 0x5A1A_FEED
+
+# (название, адрес, цена, отпечаток)
+StagedRow = Tuple[str, str, int, int]
+
+_MERGE_PRODUCTS = text(
+    """
+    INSERT INTO products (name)
+    SELECT DISTINCT name FROM feed_staging
+    ON CONFLICT (name) DO NOTHING
+    """
+)
+
+_MERGE_PHARMACIES = text(
+    """
+    INSERT INTO pharmacies (address)
+    SELECT DISTINCT address FROM feed_staging
+    ON CONFLICT (address) DO NOTHING
+    """
+)
+
+# Повторы пары товар-аптека внутри выгрузки: побеждает первая загруженная
+# строка (неизмененные строки в feed_staging не попадают).
+# xmax = 0 у вставленных строк. Обновленными считаются строки со сменой цены:
+# подзапрос видит данные до upsert, а строки, где менялся только отпечаток
+# (первая загрузка после миграции), остаются в unchanged.
+_MERGE_PRICES = text(
+    """
+    WITH feed AS (
+        SELECT DISTINCT ON (s.name, s.address)
+            p.id AS product_id, ph.id AS pharmacy_id, s.price, s.fingerprint
+        FROM feed_staging s
+        JOIN products p ON p.name = s.name
+        JOIN pharmacies ph ON ph.address = s.address
+        ORDER BY s.name, s.address, s.seq
+    ),
+    upserted AS (
+        INSERT INTO pharmacy_products (product_id, pharmacy_id, price, fingerprint)
+        SELECT product_id, pharmacy_id, price, fingerprint FROM feed
+        ON CONFLICT (product_id, pharmacy_id) DO UPDATE
+            SET price = EXCLUDED.price, fingerprint = EXCLUDED.fingerprint
+            WHERE (pharmacy_products.price, pharmacy_products.fingerprint)
+                IS DISTINCT FROM (EXCLUDED.price, EXCLUDED.fingerprint)
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        (SELECT count(*) FROM upserted WHERE inserted) AS inserted,
+        (
+            SELECT count(*) FROM feed f
+            JOIN pharmacy_products pp
+                ON pp.product_id = f.product_id AND pp.pharmacy_id = f.pharmacy_id
+            WHERE pp.price <> f.price
+        ) AS updated,
+        (SELECT count(*) FROM feed) AS total
+    """
+)
+
+
+def fingerprint(name: str, address: str, price: str) -> int:
+    """
+    Отпечаток строки выгрузки: 64 бита blake2b от (название, адрес, цена)
+    в виде знакового числа для колонки BIGINT.
+    """
+    digest = hashlib.blake2b(
+        "\x1f".join((name, address, price)).encode("utf-8"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+async def load_fingerprints(db: AsyncSession) -> "array[int]":
+    """Отсортированные отпечатки всех сохраненных строк для бинарного поиска."""
+    fingerprints = array("q")
+    rows = await db.stream_scalars(
+        select(PharmacyProduct.fingerprint)
+        .where(PharmacyProduct.fingerprint.is_not(None))
+        .order_by(PharmacyProduct.fingerprint)
+        .execution_options(yield_per=50_000)
+    )
+    async for value in rows:
+        fingerprints.append(value)
+    return fingerprints
+
+
+def is_known(fingerprints: "array[int]", value: int) -> bool:
+    i = bisect_left(fingerprints, value)
+    return i < len(fingerprints) and fingerprints[i] == value
+
+
+async def get_feed_state(
+    db: AsyncSession, url: str
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    ETag и Last-Modified последней примененной выгрузки с этого URL.
+    :return: (etag, last_modified), None если неизвестны
+    """
+    row = (
+        await db.execute(
+            select(FeedState.etag, FeedState.last_modified).where(FeedState.url == url)
+        )
+    ).one_or_none()
+    return (row.etag, row.last_modified) if row else (None, None)
+
+
+async def save_feed_state(
+    db: AsyncSession, url: str, etag: Optional[str], last_modified: Optional[str]
+) -> None:
+    """Запоминает валидаторы выгрузки в текущей транзакции."""
+    statement = insert(FeedState).values(
+        url=url, etag=etag, last_modified=last_modified
+    )
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[FeedState.url],
+            set_={"etag": etag, "last_modified": last_modified},
+        )
+    )
+
+
+async def lock_ingestion(db: AsyncSession) -> None:
+    """
+    Берет advisory lock загрузки до конца текущей транзакции:
+    параллельные загрузки из других воркеров ждут своей очереди,
+    а не делают одну и ту же работу над таблицами одновременно.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(INGEST_LOCK_KEY)))
+
+
+async def reset_staging(db: AsyncSession) -> None:
+    """Очищает промежуточную таблицу в текущей транзакции."""
+    await db.execute(text("TRUNCATE feed_staging RESTART IDENTITY"))
+
+
+async def copy_to_staging(db: AsyncSession, rows: Iterable[StagedRow]) -> None:
+    """
+    Загружает строки (название, адрес, цена, отпечаток) в feed_staging через COPY.
+    Используется соединение сессии, поэтому COPY идет в ее транзакции.
+    """
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(  # type: ignore[union-attr]
+        feed_staging.name,
+        records=rows,
+        columns=["name", "address", "price", "fingerprint"],
+    )
+
+
+async def merge_staging(db: AsyncSession) -> UpdateStats:
+    """
+    Переносит feed_staging в основные таблицы set-based запросами:
+    новые товары и аптеки, затем upsert цен и отпечатков
+    по (product_id, pharmacy_id).
+    """
+    await db.execute(_MERGE_PRODUCTS)
+    await db.execute(_MERGE_PHARMACIES)
+    inserted, updated, total = (await db.execute(_MERGE_PRICES)).one()
+    return UpdateStats(
+        inserted=inserted, updated=updated, unchanged=total - inserted - updated
+    )
@@ -0,0 +1,204 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, AsyncIterator, Coroutine, Optional, Set
+
+from sqlalchemy import func, select, update
+
+from src.common.logger import logger
+from src.common.Schemas.pharmacy_schemas import IngestJobSchema
+from src.db.CRUD import feed_settings, update_db, update_vector_store
+from src.db.database import get_session
+from src.db.Models import IngestJob
+
+# Ссылки на запущенные задачи, чтобы их не собрал сборщик мусора
+_running: Set["asyncio.Task[None]"] = set()
+
+# Ключ pg_advisory_xact_lock для постановки пересборки индекса векторов
+REBUILD_LOCK_KEY = 0x5A1A_0EC7
+
+# Статусы незавершенной задачи
+_ACTIVE = ("queued", "running")
+
+
+def spool_file() -> "SpooledTemporaryFile[bytes]":
+    """Буфер для тела запроса: в памяти до spool_max_size, дальше на диске."""
+    return SpooledTemporaryFile(max_size=feed_settings.spool_max_size)
+
+
+async def _read_spool(spool: IO[bytes]) -> AsyncIterator[bytes]:
+    """Читает буфер кусками в отдельном потоке."""
+    await asyncio.to_thread(spool.seek, 0)
+    while chunk := await asyncio.to_thread(spool.read, feed_settings.chunk_size):
+        yield chunk
+
+
+async def _set_job(job_id: int, **values: Any) -> None:
+    """Обновляет задачу в своей транзакции, чтобы статус видели другие воркеры."""
+    async with get_session() as db:
+        await db.execute(update(IngestJob).where(IngestJob.id == job_id).values(values))
+        await db.commit()
+
+
+async def _run_job(job_id: int, spool: Optional[IO[bytes]]) -> None:
+    async def progress(processed: int) -> None:
+        await _set_job(job_id, processed=processed)
+
+    try:
+        await _set_job(job_id, status="running", started_at=datetime.now(timezone.utc))
+        async with get_session() as db:
+            stats = await update_db(
+                db,
+                body=_read_spool(spool) if spool is not None else None,
+                progress=progress,
+            )
+    except Exception as exp:
+        logger.exception("Ingest job %s failed", job_id)
+        await _set_job(
+            job_id,
+            status="failed",
+            error=str(exp) or type(exp).__name__,
+            finished_at=datetime.now(timezone.utc),
+        )
+    else:
+        await _set_job(
+            job_id,
+            status="not_modified" if stats.not_modified else "done",
+            stats=stats.model_dump(),
+            finished_at=datetime.now(timezone.utc),
+        )
+        logger.info("Ingest job %s finished: %s", job_id, stats)
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+async def _run_rebuild(job_id: int) -> None:
+    async def progress(done: int, total: int) -> None:
+        await _set_job(job_id, processed=done)
+
+    try:
+        await _set_job(job_id, status="running", started_at=datetime.now(timezone.utc))
+        result = str(await update_vector_store(full=True, progress=progress))
+    except Exception as exp:
+        logger.exception("Vector store rebuild job %s failed", job_id)
+        result = f"Error: {exp or type(exp).__name__}"
+    # rebuild_vector_store сообщает об ошибке текстом, а не исключением
+    if result.startswith("Error"):
+        await _set_job(
+            job_id,
+            status="failed",
+            error=result,
+            finished_at=datetime.now(timezone.utc),
+        )
+    else:
+        await _set_job(job_id, status="done", finished_at=datetime.now(timezone.utc))
+    logger.info("Vector store rebuild job %s finished: %s", job_id, result)
+
+
+async def _heartbeat(job_id: int) -> None:
+    """Отмечает задачу в базе, пока воркер ее выполняет."""
+    while True:
+        try:
+            await _set_job(job_id, heartbeat_at=func.now())
+        except Exception as e:
+            logger.warning("Failed to update heartbeat of job %s: %s", job_id, e)
+        await asyncio.sleep(feed_settings.job_heartbeat_interval)
+
+
+async def _with_heartbeat(job_id: int, coroutine: Coroutine[Any, Any, None]) -> None:
+    heartbeat = asyncio.create_task(_heartbeat(job_id), name=f"heartbeat-{job_id}")
+    try:
+        await coroutine
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+
+
+def _start(job_id: int, coroutine: Coroutine[Any, Any, None], name: str) -> None:
+    task = asyncio.create_task(
+        _with_heartbeat(job_id, coroutine), name=f"{name}-{job_id}"
+    )
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def enqueue_ingest(spool: Optional[IO[bytes]] = None) -> IngestJobSchema:
+    """
+    Ставит загрузку выгрузки в фоновую задачу и сразу возвращает ее статус.
+    :param spool: (опционально) буфер с телом запроса; без него выгрузка
+        скачивается по URL из настроек
+    :return: Созданная задача в статусе queued
+    """
+    job = IngestJob(source="body" if spool is not None else "url")
+    async with get_session() as db:
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+    _start(job.id, _run_job(job.id, spool), "ingest")
+    return IngestJobSchema.model_validate(job)
+
+
+async def enqueue_rebuild() -> IngestJobSchema:
+    """
+    Ставит полную пересборку индекса векторов (rebuild_vector_store)
+    в фоновую задачу. Пересборки не идут параллельно: если одна уже
+    в очереди или выполняется в любом воркере, возвращается она.
+    :return: Задача в статусе queued или уже идущая пересборка
+    """
+    await fail_stale_jobs()
+    async with get_session() as db:
+        await db.execute(select(func.pg_advisory_xact_lock(REBUILD_LOCK_KEY)))
+        job = await db.scalar(
+            select(IngestJob)
+            .where(
+                IngestJob.source == "rebuild",
+                IngestJob.status.in_(_ACTIVE),
+            )
+            .order_by(IngestJob.id)
+            .limit(1)
+        )
+        if job is not None:
+            return IngestJobSchema.model_validate(job)
+        job = IngestJob(source="rebuild")
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+    _start(job.id, _run_rebuild(job.id), "rebuild")
+    return IngestJobSchema.model_validate(job)
+
+
+async def get_ingest_job(job_id: int) -> Optional[IngestJobSchema]:
+    """
+    Статус задачи загрузки из базы, поэтому его отдает любой воркер.
+    :return: Задача или None, если не найдена
+    """
+    await fail_stale_jobs()
+    async with get_session() as db:
+        job = await db.get(IngestJob, job_id)
+    return IngestJobSchema.model_validate(job) if job is not None else None
+
+
+async def fail_stale_jobs() -> int:
+    """
+    Помечает failed задачи в queued/running, которые дольше job_stale_after
+    секунд не отмечались: воркер с ними остановился, не закончив работу
+    (перезапуск, падение), и сами они из этих статусов уже не выйдут.
+    :return: Сколько задач помечено
+    """
+    stale_before = func.now() - timedelta(seconds=feed_settings.job_stale_after)
+    last_seen = func.coalesce(IngestJob.heartbeat_at, IngestJob.created_at)
+    async with get_session() as db:
+        result = await db.execute(
+            update(IngestJob)
+            .where(IngestJob.status.in_(_ACTIVE), last_seen < stale_before)
+            .values(
+                status="failed",
+                error="Worker stopped before the job finished",
+                finished_at=func.now(),
+            )
+        )
+        await db.commit()
+    if result.rowcount:
+        logger.warning("Marked %s stale ingest jobs as failed", result.rowcount)
+    return result.rowcount
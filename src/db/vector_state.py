@@ -0,0 +1,109 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.db.database import get_session
+from src.db.Models import VectorIndexState
+
+
+async def get_index_state(base_namespace: str) -> Optional[Tuple[str, int]]:
+    """
+    Рабочее пространство имен индекса векторов и версия его содержимого.
+    :param base_namespace: Пространство имен из настроек
+    :return: (имя пространства, версия) или None, если записи еще нет
+    """
+    async with get_session() as db:
+        row = (
+            await db.execute(
+                select(
+                    VectorIndexState.active_namespace, VectorIndexState.index_version
+                ).where(VectorIndexState.base_namespace == base_namespace)
+            )
+        ).first()
+    return None if row is None else (row.active_namespace, row.index_version)
+
+
+async def bump_index_version(base_namespace: str) -> int:
+    """
+    Отмечает изменение индекса: остальные воркеры увидят новую версию
+    при следующей проверке указателя и сбросят кэш результатов поиска.
+    :return: Новая версия
+    """
+    statement = insert(VectorIndexState).values(
+        base_namespace=base_namespace, active_namespace=base_namespace, index_version=1
+    )
+    async with get_session() as db:
+        version = await db.scalar(
+            statement.on_conflict_do_update(
+                index_elements=[VectorIndexState.base_namespace],
+                set_={"index_version": VectorIndexState.index_version + 1},
+            ).returning(VectorIndexState.index_version)
+        )
+        await db.commit()
+    return int(version)
+
+
+async def set_active_namespace(
+    base_namespace: str, active_namespace: str
+) -> Optional[str]:
+    """
+    Атомарно переключает рабочее пространство имен и снимает отметку
+    о недостроенном.
+    :return: Пространство имен, которое было рабочим до переключения
+    """
+    async with get_session() as db:
+        previous = await db.scalar(
+            select(VectorIndexState.active_namespace)
+            .where(VectorIndexState.base_namespace == base_namespace)
+            .with_for_update()
+        )
+        statement = insert(VectorIndexState).values(
+            base_namespace=base_namespace, active_namespace=active_namespace
+        )
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[VectorIndexState.base_namespace],
+                set_={
+                    "active_namespace": active_namespace,
+                    "building_namespace": None,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        await db.commit()
+    return previous
+
+
+async def get_building_namespace(base_namespace: str) -> Optional[str]:
+    """
+    Пространство имен, пересборка которого была прервана.
+    :param base_namespace: Пространство имен из настроек
+    :return: Имя пространства или None, если незавершенной пересборки нет
+    """
+    async with get_session() as db:
+        return await db.scalar(
+            select(VectorIndexState.building_namespace).where(
+                VectorIndexState.base_namespace == base_namespace
+            )
+        )
+
+
+async def set_building_namespace(base_namespace: str, building_namespace: str) -> None:
+    """
+    Запоминает пространство имен, которое сейчас строится, чтобы после сбоя
+    пересборка продолжилась в нем, а не началась заново.
+    """
+    statement = insert(VectorIndexState).values(
+        base_namespace=base_namespace,
+        active_namespace=base_namespace,
+        building_namespace=building_namespace,
+    )
+    async with get_session() as db:
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[VectorIndexState.base_namespace],
+                set_={"building_namespace": building_namespace},
+            )
+        )
+        await db.commit()
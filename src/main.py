@@ -1,17 +1,63 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+
+from src import IMPORT_STARTED
 from src.api.v1 import endpoints
+from src.common.logger import logger
 from src.common.middlewares.middleware_register import register_middlewares
+from src.common.telemetry import STARTUP_SECONDS, render_metrics
+from src.common.warmup import warm_up, warmup_state
+from src.db.database import get_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Прогрев в фоне: сервер сразу принимает запросы, готовность — в /ready
+    task = asyncio.create_task(warm_up(IMPORT_STARTED))
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if get_engine.ready:
+            await get_engine().dispose()
 
 
 app = FastAPI(
     title="FastAPI Test Salamat",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.include_router(endpoints.router, prefix="/api/v1")
 register_middlewares(app)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready() -> JSONResponse:
+    """200 после прогрева, до этого 503 и пройденные шаги."""
+    return JSONResponse(
+        content=warmup_state.as_dict(),
+        status_code=200 if warmup_state.ready else 503,
+    )
+
+
+warmup_state.import_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+STARTUP_SECONDS.labels(phase="import").set(warmup_state.import_seconds)
+logger.info("Application imported in %.3fs", warmup_state.import_seconds)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -7,17 +8,21 @@ from pydantic import BaseModel, Field
 
 load_dotenv()
 
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+REQUIRED_ENV = ("OPENAI_API_KEY", "PINECONE_API_KEY", "API_TOKEN")
 
-if not os.getenv("PINECONE_API_KEY"):
-    raise ValueError("PINECONE_API_KEY not found in environment variables")
 
-if not os.getenv("API_TOKEN"):
-    raise ValueError("API_TOKEN not found in environment variables")
+def require_credentials() -> None:
+    """
+    Проверяет ключи из окружения. Вызывается при запуске приложения,
+    а не при импорте, поэтому модули импортируются и без ключей.
+    """
+    for name in REQUIRED_ENV:
+        if not os.getenv(name):
+            raise ValueError(f"{name} not found in environment variables")
 
 
-def _get_system_prompt() -> str:
+@lru_cache(maxsize=1)
+def get_agent_prompt() -> str:
     file_path = Path(__file__).resolve().parent / "system_prompt.txt"
 
     if not file_path.exists():
@@ -29,7 +34,6 @@ def _get_system_prompt() -> str:
     return sys_prompt
 
 
-AGENT_PROMPT = _get_system_prompt()
 MAX_HISTORY_LENGTH = 15
 
 
@@ -55,7 +59,7 @@ class LLMSettings(OpenAIModel):
         default=1024, description="Максимальное число токенов в ответе"
     )
     system_prompt: Optional[str] = Field(
-        default=AGENT_PROMPT, description="Системный промпт для модели"
+        default_factory=get_agent_prompt, description="Системный промпт для модели"
     )
 
 
@@ -88,3 +92,262 @@ class PineconeSettings(BaseModel):
     chunk_overlap: int = Field(default=50, description="Пересечение чанков")
     # Search config
     search_k: int = Field(default=10, description="Количество результатов поиска")
+    search_cache_size: int = Field(
+        default=1024, description="Сколько результатов поиска держать в кэше"
+    )
+    search_cache_ttl: float = Field(
+        default=600.0, description="Время жизни результата поиска в кэше, секунды"
+    )
+    namespace_refresh_interval: float = Field(
+        default=30.0,
+        description="Как часто перечитывать указатель на рабочее пространство имен",
+    )
+    rebuild_validate_timeout: float = Field(
+        default=120.0,
+        description="Сколько ждать появления всех векторов после пересборки, секунды",
+    )
+    # Indexing
+    index_batch_size: int = Field(
+        default=256, description="Сколько названий эмбеддить и записывать за раз"
+    )
+    index_concurrency: int = Field(
+        default=4, description="Сколько пачек индексировать одновременно"
+    )
+    index_max_retries: int = Field(
+        default=6, description="Повторы пачки при превышении лимита запросов"
+    )
+    index_retry_base_delay: float = Field(
+        default=1.0, description="Начальная пауза перед повтором, секунды"
+    )
+    index_retry_max_delay: float = Field(
+        default=60.0, description="Максимальная пауза перед повтором, секунды"
+    )
+
+
+class CatalogSettings(BaseModel):
+    """Настройки снимка каталога в памяти процесса."""
+
+    snapshot_enabled: bool = Field(
+        default=os.getenv("CATALOG_SNAPSHOT_ENABLED", "true").lower() == "true",
+        description="Искать товары и цены в снимке каталога, а не в Postgres",
+    )
+    search_limit: int = Field(
+        default=10, description="Сколько лучших совпадений возвращать при поиске"
+    )
+    similarity_threshold: float = Field(
+        default=0.3,
+        ge=0.0,
+        le=1.0,
+        description="Порог похожести как pg_trgm.similarity_threshold",
+    )
+    refresh_interval: float = Field(
+        default=float(os.getenv("CATALOG_REFRESH_INTERVAL", 5)),
+        ge=0,
+        description="Как часто сверять версию снимка с базой, секунды",
+    )
+    substring_scan_limit: int = Field(
+        default=5000,
+        gt=0,
+        description="Сколько совпадений подстроки учитывать для запроса короче 3 букв",
+    )
+
+
+class FeedSettings(BaseModel):
+    """Настройки загрузки выгрузки товаров из 1С."""
+
+    url: str = Field(
+        default=os.getenv(
+            "FEED_URL", "https://salamat.cloud1c.pro/FileGPT/SalamatProducts.json"
+        ),
+        description="URL выгрузки товаров из 1С",
+    )
+    batch_size: int = Field(
+        default=5000, gt=0, description="Сколько строк проверять и писать за раз"
+    )
+    chunk_size: int = Field(
+        default=64 * 1024, gt=0, description="Размер куска при чтении ответа в байтах"
+    )
+    max_item_chars: int = Field(
+        default=1_000_000,
+        gt=0,
+        description="Максимальный размер одного элемента выгрузки в символах",
+    )
+    timeout: float = Field(
+        default=60.0, description="Таймаут чтения выгрузки в секундах"
+    )
+    spool_max_size: int = Field(
+        default=16 * 1024 * 1024,
+        description="Сколько байт тела запроса держать в памяти до сброса на диск",
+    )
+    job_heartbeat_interval: float = Field(
+        default=30.0,
+        gt=0,
+        description="Как часто фоновая задача отмечается в базе, в секундах",
+    )
+    job_stale_after: float = Field(
+        default=180.0,
+        gt=0,
+        description="Через сколько секунд без отметки задача считается брошенной",
+    )
+
+
+class EmbeddingCacheSettings(BaseModel):
+    """Настройки кэша эмбеддингов (память + диск)."""
+
+    enabled: bool = Field(
+        default=os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true",
+        description="Кэшировать эмбеддинги товаров и запросов",
+    )
+    memory_mb: int = Field(
+        default=int(os.getenv("EMBEDDING_CACHE_MEMORY_MB", 64)),
+        ge=0,
+        description="Сколько мегабайт векторов держать в памяти процесса",
+    )
+    path: Optional[str] = Field(
+        default=os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3"),
+        description="Файл SQLite для кэша на диске; пусто — только память",
+    )
+
+
+class VectorBackendSettings(BaseModel):
+    """Выбор хранилища векторов: Pinecone или локальный индекс в процессе."""
+
+    backend: str = Field(
+        default=os.getenv("VECTOR_BACKEND", "pinecone"),
+        pattern="^(pinecone|local)$",
+        description="pinecone — облачный индекс, local — матрица NumPy на диске",
+    )
+    local_path: str = Field(
+        default=os.getenv("VECTOR_LOCAL_PATH", "cache/vector_index"),
+        description="Каталог с файлами локального индекса",
+    )
+    local_quantize: bool = Field(
+        default=os.getenv("VECTOR_LOCAL_INT8", "false").lower() == "true",
+        description="Хранить векторы локального индекса в int8",
+    )
+    local_block_size: int = Field(
+        default=65536, gt=0, description="Строк матрицы на один блок при поиске"
+    )
+
+
+class AgentMemorySettings(BaseModel):
+    """Хранение истории диалогов агента."""
+
+    checkpointer: str = Field(
+        default=os.getenv("AGENT_CHECKPOINTER", "postgres"),
+        pattern="^(postgres|memory)$",
+        description="postgres — общая для воркеров таблица, memory — память процесса",
+    )
+    thread_ttl: float = Field(
+        default=float(os.getenv("AGENT_THREAD_TTL", 24 * 60 * 60)),
+        gt=0,
+        description="Через сколько секунд без сообщений диалог удаляется",
+    )
+    prune_interval: float = Field(
+        default=600.0, description="Как часто удалять неактивные диалоги, секунды"
+    )
+
+
+class ContextSettings(BaseModel):
+    """Сборка контекста для модели: бюджет токенов истории и сводка."""
+
+    token_budget: int = Field(
+        default=int(os.getenv("AGENT_TOKEN_BUDGET", 4000)),
+        gt=0,
+        description="Сколько токенов истории (со сводкой) отправлять модели",
+    )
+    target_ratio: float = Field(
+        default=0.6,
+        gt=0.0,
+        le=1.0,
+        description="До какой доли бюджета сжимать историю при превышении",
+    )
+    keep_recent_turns: int = Field(
+        default=2, ge=1, description="Сколько последних реплик клиента не сжимать"
+    )
+    stale_tool_chars: int = Field(
+        default=500,
+        description="Длина ответа инструмента из прошлых реплик в контексте",
+    )
+
+
+class FastPathSettings(BaseModel):
+    """Ответы на простые запросы без вызова модели."""
+
+    enabled: bool = Field(
+        default=os.getenv("FAST_PATH_ENABLED", "true").lower() == "true",
+        description="Отвечать на название товара и вопросы о цене/наличии напрямую",
+    )
+    max_name_words: int = Field(
+        default=6, description="Сколько слов может быть в сообщении-названии товара"
+    )
+    max_offers: int = Field(
+        default=10, description="Сколько аптек перечислять в ответе"
+    )
+    addresses_ttl: float = Field(
+        default=60.0,
+        gt=0,
+        description="Сколько секунд держать список адресов аптек без снимка каталога",
+    )
+
+
+class AnswerCacheSettings(BaseModel):
+    """Кэш ответов агента на первые вопросы диалога."""
+
+    enabled: bool = Field(
+        default=os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true",
+        description="Отдавать повторные вопросы из кэша без модели",
+    )
+    max_size: int = Field(default=2048, description="Сколько ответов держать в кэше")
+
+
+class TelemetrySettings(BaseModel):
+    """Метрики Prometheus и трассировка прохода по графу агента."""
+
+    tracing: bool = Field(
+        default=os.getenv("TRACING_ENABLED", "false").lower() == "true",
+        description="Писать спаны узлов графа и инструментов с id запроса "
+        "(в OpenTelemetry, если установлен, иначе в лог)",
+    )
+    graph_debug: bool = Field(
+        default=os.getenv("AGENT_GRAPH_DEBUG", "false").lower() == "true",
+        description="Печатать каждый шаг графа агента в stdout",
+    )
+
+
+class LoggingSettings(BaseModel):
+    """Логирование: уровень, очередь фоновой записи и отладочный лог тел."""
+
+    level: str = Field(
+        default=os.getenv("LOG_LEVEL", "INFO").upper(),
+        pattern="^(DEBUG|INFO|WARNING|ERROR|CRITICAL)$",
+        description="Уровень логгера приложения; DEBUG пишет тела запросов и ответов",
+    )
+    queue_size: int = Field(
+        default=10000,
+        gt=0,
+        description="Сколько записей ждет фоновой записи; сверх этого записи "
+        "отбрасываются, а не задерживают обработку запросов",
+    )
+    body_limit: int = Field(
+        default=int(os.getenv("LOG_BODY_LIMIT", 2048)),
+        ge=0,
+        description="Сколько байт тела запроса и ответа попадает в отладочный лог",
+    )
+
+
+class StartupSettings(BaseModel):
+    """Прогрев при запуске приложения (lifespan)."""
+
+    warmup_db_connections: int = Field(
+        default=int(os.getenv("WARMUP_DB_CONNECTIONS", 5)),
+        ge=0,
+        description="Сколько соединений пула открыть заранее (не больше pool_size)",
+    )
+    warmup_http: bool = Field(
+        default=os.getenv("WARMUP_HTTP", "true").lower() == "true",
+        description="Заранее открыть соединение к OpenAI",
+    )
+    warmup_timeout: float = Field(
+        default=10.0, gt=0, description="Ограничение на шаг прогрева, секунды"
+    )
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -13,6 +15,16 @@ class Settings(BaseSettings):  # type: ignore
     DB_PASS: str
     DB_NAME: str
 
+    # Пул соединений. На один воркер приходится до
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW соединений, сумма по всем воркерам
+    # должна оставаться ниже max_connections=1000 у Postgres.
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_ECHO: bool = False
+
     class Config:
         extra = "ignore"
 
@@ -27,4 +39,10 @@ class Settings(BaseSettings):  # type: ignore
         return f"postgresql+psycopg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_db_settings() -> Settings:
+    """
+    Настройки БД из окружения. Читаются при первом обращении (создание
+    движка, миграции), поэтому модули импортируются и без DB_*.
+    """
+    return Settings()
@@ -0,0 +1,4 @@
+import os
+
+# logger пишет в logs/app.log относительно рабочего каталога
+os.makedirs("logs", exist_ok=True)
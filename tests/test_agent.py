@@ -0,0 +1,158 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph.state import CompiledStateGraph
+
+from src.common import context
+from src.common.tools import ReAct_agent
+
+LATENCY = 0.2
+
+
+class Concurrency:
+    def __init__(self) -> None:
+        self.current = 0
+        self.peak = 0
+
+    async def hold(self, seconds: float) -> None:
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.current -= 1
+
+
+class AsyncOnlyChatModel(BaseChatModel):
+    """
+    Модель агента: сначала запрос цены, после ответа инструмента — ответ.
+    Синхронный вызов (invoke в потоке event loop) проваливает тест.
+    """
+
+    llm_calls: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "async-only"
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        raise AssertionError("sync model call in the agent path")
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        await self.llm_calls.hold(LATENCY)
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            reply = AIMessage(content=f"Цена: {last.content}")
+        else:
+            reply = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "get_current_price_for_product",
+                        "args": {"product_name": str(last.content), "address": "Абая"},
+                        "id": f"call_{len(messages)}",
+                    }
+                ],
+            )
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+
+@pytest.fixture
+def run(monkeypatch: pytest.MonkeyPatch) -> Iterator[SimpleNamespace]:
+    """Граф с InMemorySaver, моделью-заглушкой и медленной базой."""
+    llm_calls, db_calls = Concurrency(), Concurrency()
+
+    async def get_product_price(product_name: str, address: str) -> int:
+        await db_calls.hold(LATENCY / 2)
+        return len(product_name)
+
+    monkeypatch.setattr(context, "count_tokens", len)
+    monkeypatch.setattr(ReAct_agent, "get_product_price", get_product_price)
+    ReAct_agent.get_agent_llm.set(AsyncOnlyChatModel(llm_calls=llm_calls))
+    yield SimpleNamespace(
+        agent=ReAct_agent.graph.compile(checkpointer=InMemorySaver()),
+        llm_calls=llm_calls,
+        db_calls=db_calls,
+    )
+    ReAct_agent.get_agent_llm.reset()
+
+
+def config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+async def _ask_concurrently(
+    agent: CompiledStateGraph, questions: List[str], prefix: str
+) -> Dict[str, Any]:
+    # Ход event loop: если граф блокирует его синхронной работой, тики отстают
+    ticks: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    answers = await asyncio.gather(
+        *(
+            agent.ainvoke({"messages": [("user", question)]}, config(f"{prefix}{i}"))
+            for i, question in enumerate(questions)
+        )
+    )
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticking
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    return {"answers": answers, "elapsed": elapsed, "max_gap": max(gaps)}
+
+
+def test_threads_run_concurrently(run: SimpleNamespace) -> None:
+    questions = ["аспирин", "нурофен", "магне b6", "парацетамол", "витамин c"]
+    # Первый прогон — импорт и прогрев ленивых частей langgraph
+    asyncio.run(_ask_concurrently(run.agent, ["прогрев"], "warmup-"))
+    run.llm_calls.peak = run.db_calls.peak = 0
+
+    result = asyncio.run(_ask_concurrently(run.agent, questions, "thread-"))
+
+    # Два вызова модели и вызов инструмента на поток: последовательно
+    # вышло бы 5 * 0.5 с, параллельно — около 0.5 с
+    assert run.llm_calls.peak == len(questions)
+    assert run.db_calls.peak == len(questions)
+    assert result["elapsed"] < 2 * (2 * LATENCY + LATENCY / 2)
+    assert result["max_gap"] < LATENCY / 2
+    for question, answer in zip(questions, result["answers"]):
+        messages = answer["messages"]
+        assert isinstance(messages[0], HumanMessage)
+        assert messages[0].content == question
+        assert messages[-1].content == f"Цена: {len(question)}"
+
+
+def test_threads_keep_separate_history(run: SimpleNamespace) -> None:
+    agent = run.agent
+
+    async def conversation() -> None:
+        await asyncio.gather(
+            agent.ainvoke({"messages": [("user", "аспирин")]}, config("a")),
+            agent.ainvoke({"messages": [("user", "нурофен")]}, config("b")),
+        )
+        await agent.ainvoke({"messages": [("user", "магне")]}, config("a"))
+
+    asyncio.run(conversation())
+    history = asyncio.run(agent.aget_state(config("a"))).values["messages"]
+    questions = [m.content for m in history if isinstance(m, HumanMessage)]
+    assert questions == ["аспирин", "магне"]
+    other = asyncio.run(agent.aget_state(config("b"))).values["messages"]
+    assert [m.content for m in other if isinstance(m, HumanMessage)] == ["нурофен"]
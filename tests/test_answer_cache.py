@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.common.tools import ReAct_agent
+from src.common.tools import answer_cache as answer_cache_module
+from src.common.tools.answer_cache import AnswerCache
+
+
+def config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+@pytest.fixture
+def catalog(monkeypatch: pytest.MonkeyPatch) -> Iterator[SimpleNamespace]:
+    """Версия каталога без базы и граф с InMemorySaver."""
+    state = SimpleNamespace(version=1, ensured=[])
+
+    async def get_catalog_version() -> int:
+        return state.version
+
+    async def ensure_version(version: int) -> None:
+        state.ensured.append(version)
+
+    monkeypatch.setattr(answer_cache_module, "get_catalog_version", get_catalog_version)
+    monkeypatch.setattr(answer_cache_module.catalog, "ensure_version", ensure_version)
+    monkeypatch.setattr(answer_cache_module.settings, "enabled", True)
+    ReAct_agent.get_agent.set(ReAct_agent.graph.compile(checkpointer=InMemorySaver()))
+    yield state
+    ReAct_agent.get_agent.reset()
+
+
+def lookup(cache: AnswerCache, question: str, thread_id: str) -> Any:
+    return asyncio.run(cache.lookup(question, config(thread_id)))
+
+
+def history(thread_id: str) -> List[Any]:
+    state = asyncio.run(ReAct_agent.get_agent().aget_state(config(thread_id)))
+    return list(state.values.get("messages", []))
+
+
+def test_hit_for_same_question_in_new_thread(catalog: SimpleNamespace) -> None:
+    cache = AnswerCache(max_size=10)
+    answer, key = lookup(cache, "Сколько стоит аспирин?", "a")
+    assert answer is None
+    assert key == (1, "сколько стоит аспирин")
+    cache.store(key, "Аспирин стоит 1200 тг")
+
+    # Регистр, пробелы и знак вопроса в конце ключ не меняют
+    answer, _ = lookup(cache, "  сколько СТОИТ аспирин ", "b")
+    assert answer == "Аспирин стоит 1200 тг"
+    # Поток получает вопрос и ответ, как после прогона агента
+    messages = history("b")
+    assert [type(message) for message in messages] == [HumanMessage, AIMessage]
+    assert [message.content for message in messages] == [
+        "  сколько СТОИТ аспирин ",
+        "Аспирин стоит 1200 тг",
+    ]
+
+
+def test_new_catalog_version_invalidates(catalog: SimpleNamespace) -> None:
+    cache = AnswerCache(max_size=10)
+    _, key = lookup(cache, "Где купить нурофен", "a")
+    cache.store(key, "В аптеке на Абая")
+    catalog.version = 2
+    answer, key = lookup(cache, "Где купить нурофен", "b")
+    assert answer is None
+    assert key == (2, "где купить нурофен")
+    assert history("b") == []
+
+
+def test_snapshot_is_brought_to_the_key_version(
+    catalog: SimpleNamespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(answer_cache_module.catalog_settings, "snapshot_enabled", True)
+    catalog.version = 5
+    lookup(AnswerCache(max_size=10), "Аспирин", "a")
+    assert catalog.ensured == [5]
+
+
+def test_thread_with_history_is_not_cached(catalog: SimpleNamespace) -> None:
+    cache = AnswerCache(max_size=10)
+    _, key = lookup(cache, "Аспирин", "a")
+    cache.store(key, "Есть в наличии")
+    asyncio.run(
+        ReAct_agent.get_agent().aupdate_state(
+            config("c"),
+            {"messages": [HumanMessage(content="Привет"), AIMessage(content="Да")]},
+            as_node="agent",
+        )
+    )
+    # Ответ зависит от диалога: ни поиска, ни ключа для сохранения
+    assert lookup(cache, "Аспирин", "c") == (None, None)
+
+
+def test_disabled_and_invalid_answers(
+    catalog: SimpleNamespace, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = AnswerCache(max_size=10)
+    _, key = lookup(cache, "Аспирин", "a")
+    cache.store(key, "")
+    cache.store(key, ["не строка"])
+    cache.store(None, "без ключа")
+    assert len(cache.answers) == 0
+
+    cache.store(key, "Есть в наличии")
+    monkeypatch.setattr(answer_cache_module.settings, "enabled", False)
+    assert lookup(cache, "Аспирин", "b") == (None, None)
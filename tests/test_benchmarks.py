@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.common import percentile
+
+
+@pytest.mark.parametrize(
+    "p, expected",
+    [(0, 1), (1, 1), (10, 1), (11, 2), (50, 5), (51, 6), (95, 10), (99, 10), (100, 10)],
+)
+def test_percentile_nearest_rank(p: float, expected: float) -> None:
+    assert percentile([float(value) for value in range(1, 11)], p) == expected
+
+
+def test_percentile_small_samples() -> None:
+    assert percentile([], 50) == 0.0
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([1.0, 2.0, 3.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    # Ранг ceil(0.75 * 4) = 3; round(3.5) дал бы 4
+    assert percentile([1.0, 2.0, 3.0, 4.0], 75) == 3.0
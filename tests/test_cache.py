@@ -0,0 +1,86 @@
+import pytest
+
+from src.common import cache
+from src.common.cache import LRUCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    fake = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", fake)
+    return fake
+
+
+def test_evicts_least_recently_used() -> None:
+    lru: LRUCache[str, int] = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # теперь дольше всего не использовался b
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.evictions == 1
+    assert len(lru) == 2
+
+
+def test_set_refreshes_position() -> None:
+    lru: LRUCache[str, int] = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.set("a", 10)
+    lru.set("c", 3)
+    assert lru.get("a") == 10
+    assert lru.get("b") is None
+
+
+def test_zero_size_stores_nothing() -> None:
+    lru: LRUCache[str, int] = LRUCache(0)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_ttl_expires_entries(clock: Clock) -> None:
+    lru: LRUCache[str, int] = LRUCache(10, ttl=5.0)
+    lru.set("a", 1)
+    clock.now += 4.9
+    assert lru.get("a") == 1
+    clock.now += 0.2
+    assert lru.get("a") is None
+    assert lru.expirations == 1
+    assert len(lru) == 0
+
+
+def test_ttl_restarts_on_set_not_on_get(clock: Clock) -> None:
+    lru: LRUCache[str, int] = LRUCache(10, ttl=5.0)
+    lru.set("a", 1)
+    clock.now += 3
+    assert lru.get("a") == 1
+    clock.now += 3
+    assert lru.get("a") is None
+    lru.set("a", 2)
+    clock.now += 3
+    assert lru.get("a") == 2
+
+
+def test_stats_and_clear() -> None:
+    lru: LRUCache[str, int] = LRUCache(10)
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("b")
+    stats = lru.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    lru.clear()
+    assert lru.get("a") is None
+    assert lru.stats()["size"] == 0
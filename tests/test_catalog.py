@@ -0,0 +1,197 @@
+from typing import List, Set, Tuple
+
+import pytest
+
+from src.db import catalog as catalog_module
+from src.db.catalog import CatalogSnapshot, pg_trigrams
+
+PRODUCTS = [
+    (1, "Аспирин 500мг №20"),
+    (2, "Аспирин Кардио 100мг №28"),
+    (3, "Ацетилсалициловая кислота 500мг"),
+    (4, "Магне B6 №50"),
+    (5, "Магне B6 форте №30"),
+    (6, "Нурофен 200мг №10"),
+    (7, "Нурофен Экспресс 200мг"),
+    (8, "Парацетамол 500мг №10"),
+    (9, "Парацетамол детский сироп 120мг/5мл"),
+    (10, "Витамин C 1000мг"),
+    (11, "Витамин D3 2000 МЕ"),
+    (12, "Бинт стерильный 7м x 14см"),
+]
+PHARMACIES = [
+    (1, "ул. Абая, 10"),
+    (2, "пр. Назарбаева, 5"),
+    (3, "ул. Сатпаева, 30"),
+]
+# (товар, аптека, цена)
+LINKS = [
+    (1, 1, 1200),
+    (1, 2, 1100),
+    (1, 3, 1300),
+    (2, 2, 2500),
+    (4, 3, 4100),
+    (4, 1, 3900),
+    (8, 1, 300),
+    (12, 2, 150),
+]
+THRESHOLD = 0.3
+
+
+@pytest.fixture(scope="module")
+def snapshot() -> CatalogSnapshot:
+    return CatalogSnapshot(
+        PRODUCTS,
+        PHARMACIES,
+        [link[0] for link in LINKS],
+        [link[1] for link in LINKS],
+        [link[2] for link in LINKS],
+        version=7,
+    )
+
+
+def reference_trigrams(text: str) -> Set[str]:
+    trigrams = set()
+    word = ""
+    for char in text.lower() + " ":
+        if char.isalnum():
+            word += char
+            continue
+        if word:
+            padded = "  " + word + " "
+            for start in range(len(padded) - 2):
+                end = start + 3
+                trigrams.add(padded[start:end])
+        word = ""
+    return trigrams
+
+
+def reference_similarity(name: str, query: str) -> float:
+    a, b = reference_trigrams(name), reference_trigrams(query)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def reference_search(query: str, limit: int) -> List[Tuple[str, float]]:
+    """SELECT name, similarity(name, q) FROM products
+    WHERE name ILIKE '%q%' OR similarity(name, q) >= threshold
+    ORDER BY similarity DESC, name LIMIT limit"""
+    rows = []
+    for _, name in PRODUCTS:
+        similarity = reference_similarity(name, query)
+        if query.lower() in name.lower() or similarity >= THRESHOLD:
+            rows.append((name, similarity))
+    rows.sort(key=lambda row: (-row[1], row[0]))
+    return rows[:limit]
+
+
+def test_trigrams_match_pg_trgm() -> None:
+    # show_trgm('Cat'), show_trgm('foo-bar')
+    assert pg_trigrams("Cat") == {"  c", " ca", "cat", "at "}
+    assert pg_trigrams("foo-bar") == {
+        "  f",
+        " fo",
+        "foo",
+        "oo ",
+        "  b",
+        " ba",
+        "bar",
+        "ar ",
+    }
+    assert pg_trigrams("--") == set()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "аспирин",
+        "Аспирин кардио",
+        "АСПИРИН",
+        "аспирн",
+        "магне б6",
+        "магне",
+        "B6",
+        "b6 форте",
+        "нурофен экспресс",
+        "парацетамол",
+        "500мг",
+        "мг",
+        "№",
+        "10",
+        "ин",
+        "тамол",
+        "сироп",
+        "витамин d3",
+        "7м x",
+        "",
+        "несуществующий",
+    ],
+)
+@pytest.mark.parametrize("limit", [1, 3, 100])
+def test_search_matches_sql(snapshot: CatalogSnapshot, query: str, limit: int) -> None:
+    found = [
+        (snapshot.product_names[pos], similarity)
+        for pos, similarity in snapshot.search(query, limit, THRESHOLD)
+    ]
+    expected = reference_search(query, limit)
+    assert [name for name, _ in found] == [name for name, _ in expected]
+    assert [similarity for _, similarity in found] == pytest.approx(
+        [similarity for _, similarity in expected]
+    )
+
+
+def test_short_query_scan_is_capped(
+    snapshot: CatalogSnapshot, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(catalog_module.catalog_settings, "substring_scan_limit", 2)
+    found = [snapshot.product_names[pos] for pos, _ in snapshot.search("мг", 100, 1)]
+    # Учитываются первые по алфавиту совпадения
+    assert found == sorted(name for _, name in PRODUCTS if "мг" in name)[:2]
+
+
+def test_price(snapshot: CatalogSnapshot) -> None:
+    assert snapshot.price("аспирин 500мг", "пр. Назарбаева, 5") == 1100
+    assert snapshot.price("Магне B6 №50", "ул. Абая, 10") == 3900
+    assert snapshot.price("Магне B6 №50", "ул. Сатпаева, 30") == 4100
+    # Адрес сравнивается точно, как в WHERE address = :address
+    assert snapshot.price("аспирин 500мг", "ул. абая, 10") is None
+    # Товара нет в этой аптеке
+    assert snapshot.price("парацетамол 500мг", "ул. Сатпаева, 30") is None
+    assert snapshot.price("несуществующий", "ул. Абая, 10") is None
+
+
+def test_pharmacies_for(snapshot: CatalogSnapshot) -> None:
+    assert sorted(snapshot.pharmacies_for("аспирин 500мг")) == sorted(
+        address for _, address in PHARMACIES
+    )
+    assert snapshot.pharmacies_for("нурофен") == []
+
+
+def test_quote(snapshot: CatalogSnapshot) -> None:
+    quotes = snapshot.quote(["аспирин 500мг", "нурофен 200мг", "несуществующий"])
+    assert [quote["query"] for quote in quotes] == [
+        "аспирин 500мг",
+        "нурофен 200мг",
+        "несуществующий",
+    ]
+    assert quotes[0]["product"] == "Аспирин 500мг №20"
+    # Предложения по возрастанию цены
+    assert quotes[0]["offers"] == [
+        {"address": "пр. Назарбаева, 5", "price": 1100},
+        {"address": "ул. Абая, 10", "price": 1200},
+        {"address": "ул. Сатпаева, 30", "price": 1300},
+    ]
+    # Товар найден, но его нет ни в одной аптеке
+    assert quotes[1]["product"] == "Нурофен 200мг №10"
+    assert quotes[1]["offers"] == []
+    assert quotes[2] == {"query": "несуществующий", "product": None, "offers": []}
+
+
+def test_quote_for_pharmacy(snapshot: CatalogSnapshot) -> None:
+    quotes = snapshot.quote(["аспирин 500мг", "магне b6 №50"], "ул. Абая, 10")
+    assert [quote["offers"] for quote in quotes] == [
+        [{"address": "ул. Абая, 10", "price": 1200}],
+        [{"address": "ул. Абая, 10", "price": 3900}],
+    ]
+    unknown = snapshot.quote(["аспирин 500мг"], "нет такой аптеки")
+    assert unknown[0]["product"] == "Аспирин 500мг №20"
+    assert unknown[0]["offers"] == []
@@ -0,0 +1,207 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Iterator
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ERROR, Checkpoint, empty_checkpoint
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.common import context
+from src.common.tools import ReAct_agent
+from src.db import checkpointer
+from src.db.checkpointer import PostgresLatestSaver
+from src.db.Models import AgentCheckpoint, AgentCheckpointWrite
+from src.db.Models.pharmacy_models import Base
+
+
+class SyncSession:
+    """Асинхронный интерфейс AsyncSession поверх обычной сессии SQLite."""
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    async def execute(self, statement: Any) -> Any:
+        return self.session.execute(statement)
+
+    async def scalar(self, statement: Any) -> Any:
+        return self.session.scalar(statement)
+
+    async def scalars(self, statement: Any) -> Any:
+        return self.session.scalars(statement)
+
+    async def commit(self) -> None:
+        self.session.commit()
+
+
+@pytest.fixture
+def engine(monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    """Таблицы checkpointer в SQLite в памяти вместо Postgres."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine, tables=[AgentCheckpoint.__table__, AgentCheckpointWrite.__table__]
+    )
+
+    @asynccontextmanager
+    async def get_session() -> AsyncIterator[SyncSession]:
+        with Session(engine) as session:
+            yield SyncSession(session)
+
+    monkeypatch.setattr(checkpointer, "get_session", get_session)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def saver(engine: Engine) -> PostgresLatestSaver:
+    return PostgresLatestSaver(thread_ttl=3600, prune_interval=3600)
+
+
+def config(thread_id: str, checkpoint_id: str = "") -> RunnableConfig:
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+def checkpoint(step: int) -> Checkpoint:
+    new = empty_checkpoint()
+    new["channel_values"] = {"step": step}
+    return new
+
+
+def count(engine: Engine, model: Any) -> int:
+    with Session(engine) as session:
+        return session.scalar(select(func.count()).select_from(model))
+
+
+def test_put_keeps_only_latest_checkpoint(
+    engine: Engine, saver: PostgresLatestSaver
+) -> None:
+    async def run() -> Any:
+        first = checkpoint(1)
+        saved = await saver.aput(config("t"), first, {"step": 1}, {})
+        await saver.aput_writes(saved, [("messages", "старая")], "task-1")
+        second = checkpoint(2)
+        saved = await saver.aput(saved, second, {"step": 2}, {})
+        return first, second, saved, await saver.aget_tuple(config("t"))
+
+    first, second, saved, latest = asyncio.run(run())
+    assert saved == config("t", second["id"])
+    assert latest.checkpoint["id"] == second["id"]
+    assert latest.checkpoint["channel_values"] == {"step": 2}
+    assert latest.metadata["step"] == 2
+    assert latest.parent_config == config("t", first["id"])
+    # Записи прежней точки удалены вместе с ней
+    assert latest.pending_writes == []
+    assert count(engine, AgentCheckpoint) == 1
+    assert count(engine, AgentCheckpointWrite) == 0
+
+
+def test_get_tuple_by_checkpoint_id(saver: PostgresLatestSaver) -> None:
+    async def run() -> Any:
+        saved = await saver.aput(config("t"), checkpoint(1), {}, {})
+        return (
+            await saver.aget_tuple(saved),
+            await saver.aget_tuple(config("t", "другая")),
+            await saver.aget_tuple(config("нет такого")),
+        )
+
+    by_id, other, missing = asyncio.run(run())
+    assert by_id is not None
+    # Хранится только последняя точка: прежние и чужие не находятся
+    assert other is None
+    assert missing is None
+
+
+def test_put_writes(saver: PostgresLatestSaver) -> None:
+    async def run() -> Any:
+        saved = await saver.aput(config("t"), checkpoint(1), {}, {})
+        await saver.aput_writes(saved, [("messages", "a"), ("summary", "b")], "t1")
+        # Повтор обычных записей той же задачи игнорируется
+        await saver.aput_writes(saved, [("messages", "x")], "t1")
+        # Служебная запись заменяет прежнюю
+        await saver.aput_writes(saved, [(ERROR, "первая ошибка")], "t2")
+        await saver.aput_writes(saved, [(ERROR, "вторая ошибка")], "t2")
+        await saver.aput_writes(saved, [], "t3")
+        return await saver.aget_tuple(config("t"))
+
+    latest = asyncio.run(run())
+    assert sorted(latest.pending_writes) == [
+        ("t1", "messages", "a"),
+        ("t1", "summary", "b"),
+        ("t2", ERROR, "вторая ошибка"),
+    ]
+
+
+def test_prune_removes_idle_threads(engine: Engine, saver: PostgresLatestSaver) -> None:
+    async def put(thread_id: str) -> None:
+        saved = await saver.aput(config(thread_id), checkpoint(1), {}, {})
+        await saver.aput_writes(saved, [("messages", thread_id)], "task")
+
+    async def run() -> int:
+        await put("старый")
+        await put("свежий")
+        with Session(engine) as session:
+            session.execute(
+                update(AgentCheckpoint)
+                .where(AgentCheckpoint.thread_id == "старый")
+                .values(updated_at=datetime.now(timezone.utc) - timedelta(hours=2))
+            )
+            session.commit()
+        return await saver.prune()
+
+    assert asyncio.run(run()) == 1
+    assert asyncio.run(saver.aget_tuple(config("старый"))) is None
+    assert asyncio.run(saver.aget_tuple(config("свежий"))) is not None
+    assert count(engine, AgentCheckpointWrite) == 1
+
+
+def test_prune_runs_at_most_once_per_interval(
+    saver: PostgresLatestSaver, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = []
+
+    async def prune() -> int:
+        calls.append(1)
+        return 0
+
+    monkeypatch.setattr(saver, "prune", prune)
+
+    async def run() -> None:
+        for step in range(3):
+            await saver.aput(config("t"), checkpoint(step), {}, {})
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_agent_history_survives_new_saver(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Другой воркер (новый экземпляр) продолжает диалог с того же места."""
+    monkeypatch.setattr(context, "count_tokens", len)
+
+    async def ask(question: str) -> Any:
+        agent = ReAct_agent.graph.compile(
+            checkpointer=PostgresLatestSaver(thread_ttl=3600, prune_interval=3600)
+        )
+        return await agent.ainvoke({"messages": [("user", question)]}, config("t"))
+
+    ReAct_agent.get_agent_llm.set(FakeListChatModel(responses=["Ответ 1", "Ответ 2"]))
+    try:
+        asyncio.run(ask("Вопрос 1"))
+        answer = asyncio.run(ask("Вопрос 2"))
+    finally:
+        ReAct_agent.get_agent_llm.reset()
+    assert [message.content for message in answer["messages"]] == [
+        "Вопрос 1",
+        "Ответ 1",
+        "Вопрос 2",
+        "Ответ 2",
+    ]
+    assert count(engine, AgentCheckpoint) == 1
@@ -0,0 +1,148 @@
+from typing import List
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from src.common import context
+from src.common.context import cap_history, plan_context
+from src.settings.config import ContextSettings
+
+
+@pytest.fixture(autouse=True)
+def fixed_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Токены сообщения: длина текста + 4 служебных
+    monkeypatch.setattr(context, "count_tokens", len)
+    monkeypatch.setattr(context, "MAX_HISTORY_LENGTH", 20)
+    monkeypatch.setattr(
+        context,
+        "settings",
+        ContextSettings(
+            token_budget=100,
+            target_ratio=0.7,
+            keep_recent_turns=2,
+            stale_tool_chars=50,
+        ),
+    )
+
+
+def turn(index: int, size: int = 6) -> List[BaseMessage]:
+    """Реплика из вопроса и ответа по size + 4 токена."""
+    return [
+        HumanMessage(content=f"{index}".ljust(size, "q")),
+        AIMessage(content=f"{index}".ljust(size, "a")),
+    ]
+
+
+def history(*turns: List[BaseMessage]) -> List[BaseMessage]:
+    return [message for messages in turns for message in messages]
+
+
+def test_no_folding_within_limits() -> None:
+    # 4 реплики по 20 токенов, 9 сообщений с будущим ответом
+    messages = history(*(turn(i) for i in range(4)))
+    plan = plan_context(messages, "")
+    assert plan.prompt == messages
+    assert plan.folded == []
+
+
+def test_folds_to_target_not_just_under_budget() -> None:
+    # 6 реплик по 20 токенов = 120 > 100. Чтобы уложиться в бюджет, хватило бы
+    # одной, но сворачивается до 70 (target_ratio), иначе сводка
+    # пересчитывалась бы на каждом следующем шаге
+    turns = [turn(i) for i in range(6)]
+    plan = plan_context(history(*turns), "")
+    assert plan.folded == history(*turns[:3])
+    assert plan.prompt == history(*turns[3:])
+
+
+def test_summary_counts_towards_budget() -> None:
+    messages = history(*(turn(i) for i in range(4)))
+    assert plan_context(messages, "").folded == []
+    plan = plan_context(messages, "s" * 30)
+    # 30 + 80 > 100; после сворачивания одной реплики 30 + 60 > 70, двух — 70
+    assert plan.folded == messages[:4]
+
+
+def test_keeps_recent_turns_over_target() -> None:
+    turns = [turn(0), turn(1), turn(2, size=30), turn(3, size=30)]
+    plan = plan_context(history(*turns), "")
+    # Две последние реплики дают 68 токенов; сверх target_ratio — но не
+    # больше keep_recent_turns
+    assert plan.prompt == history(*turns[2:])
+
+    turns = [turn(0), turn(1, size=50), turn(2, size=50)]
+    plan = plan_context(history(*turns), "")
+    # Две последние реплики больше бюджета, но остаются целиком
+    assert plan.folded == turns[0]
+    assert plan.prompt == history(*turns[1:])
+
+
+def test_message_count_trigger(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(context, "MAX_HISTORY_LENGTH", 10)
+    monkeypatch.setattr(context.settings, "target_ratio", 0.8)
+    turns = [turn(i, size=1) for i in range(8)]
+    plan = plan_context(history(*turns), "")
+    # 17 сообщений > 10: сворачиваем до 8 (0.8 * 10) с учетом ответа модели
+    assert plan.folded == history(*turns[:5])
+    assert len(plan.prompt) + 1 <= 8
+
+
+def test_hard_cap_overrides_recent_turns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(context, "MAX_HISTORY_LENGTH", 10)
+    long_turn = [HumanMessage(content="1")] + [
+        AIMessage(content=str(i)) for i in range(7)
+    ]
+    turns = [turn(0, size=1), long_turn, turn(2, size=1)]
+    plan = plan_context(history(*turns), "")
+    assert plan.folded == history(*turns[:2])
+    assert plan.prompt == turns[2]
+
+
+def test_current_turn_is_never_folded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(context, "MAX_HISTORY_LENGTH", 4)
+    current: List[BaseMessage] = [HumanMessage(content="q" * 200)]
+    for i in range(5):
+        current.append(
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "search", "args": {}, "id": str(i)}],
+            )
+        )
+        current.append(ToolMessage(content="r" * 10, tool_call_id=str(i)))
+    plan = plan_context(turn(0) + current, "")
+    assert plan.folded == turn(0)
+    assert plan.prompt == current
+    assert cap_history(current).folded == []
+
+
+def test_stale_tool_outputs_are_compressed_but_folded_intact(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    tool_call = AIMessage(
+        content="", tool_calls=[{"name": "search", "args": {}, "id": "1"}]
+    )
+    output = ToolMessage(content="r" * 200, tool_call_id="1")
+    old = [HumanMessage(content="q"), tool_call, output]
+    messages = old + turn(1) + turn(2)
+
+    monkeypatch.setattr(context.settings, "token_budget", 200)
+    plan = plan_context(messages, "")
+    assert plan.folded == []
+    assert plan.prompt[2].content.startswith("r" * 50)
+    assert len(plan.prompt[2].content) < 100
+
+    monkeypatch.setattr(context.settings, "token_budget", 100)
+    messages = old + turn(1, size=30) + turn(2, size=30)
+    plan = plan_context(messages, "")
+    # В сводку уходит исходный ответ инструмента, а не сокращенный
+    assert plan.folded == old
+
+
+def test_cap_history_ignores_tokens(monkeypatch: pytest.MonkeyPatch) -> None:
+    messages = history(*(turn(i, size=100) for i in range(4)))
+    assert cap_history(messages).folded == []
+
+    monkeypatch.setattr(context, "MAX_HISTORY_LENGTH", 6)
+    plan = cap_history(messages)
+    assert plan.folded == messages[:4]
+    assert plan.prompt == messages[4:]
@@ -0,0 +1,133 @@
+import asyncio
+from array import array
+from pathlib import Path
+from typing import List
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from src.common.embeddings import CachedEmbeddings, EmbeddingStore, normalize_text
+
+DIMENSION = 16
+MODEL = "text-embedding-3-small"
+
+
+class CountingEmbeddings(Embeddings):
+    """Детерминированная модель, которая запоминает тексты каждого запроса."""
+
+    def __init__(self) -> None:
+        self.model = DeterministicFakeEmbedding(size=DIMENSION)
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+def cached(
+    model: CountingEmbeddings,
+    path: Path,
+    memory_bytes: int = 2**20,
+    name: str = MODEL,
+    dimension: int = DIMENSION,
+) -> CachedEmbeddings:
+    return CachedEmbeddings(
+        model, name, dimension, memory_bytes=memory_bytes, path=str(path)
+    )
+
+
+def test_normalize_text() -> None:
+    assert normalize_text("  Аспирин\tКАРДИО  100мг ") == "аспирин кардио 100мг"
+    # NFKC: полноширинные цифры и лигатуры
+    assert normalize_text("Ｂ６ ﬁ") == "b6 fi"
+
+
+def test_memory_hit_and_duplicates(tmp_path: Path) -> None:
+    model = CountingEmbeddings()
+    embeddings = cached(model, tmp_path / "cache.sqlite3")
+    first = embeddings.embed_documents(["Аспирин", " аспирин ", "Магне B6"])
+    # Повтор после нормализации считается один раз, в модель уходит нормализованный
+    assert model.calls == [["аспирин", "магне b6"]]
+    assert first[0] == first[1]
+    # Из кэша вектор возвращается во float32
+    assert embeddings.embed_documents(["АСПИРИН"])[0] == pytest.approx(first[0])
+    assert len(model.calls) == 1
+    assert embeddings.stats()["computed"] == 2
+
+
+def test_vectors_persist_across_instances(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    texts = ["Аспирин", "Магне B6", "Нурофен"]
+    computed = cached(CountingEmbeddings(), path).embed_documents(texts)
+
+    model = CountingEmbeddings()
+    restarted = cached(model, path)
+    restored = restarted.embed_documents(texts)
+    assert model.calls == []
+    assert restarted.disk_hits == len(texts)
+    for vector, expected in zip(restored, computed):
+        assert vector == pytest.approx(expected)
+    # Прочитанное с диска поднято в память
+    restarted.embed_documents(texts)
+    assert restarted.disk_hits == len(texts)
+    assert restarted.stats()["hit_rate"] == 1.0
+
+
+def test_model_and_dimension_are_part_of_the_key(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cached(CountingEmbeddings(), path).embed_documents(["Аспирин"])
+    for name, dimension in [("text-embedding-3-large", DIMENSION), (MODEL, 8)]:
+        model = CountingEmbeddings()
+        cached(model, path, name=name, dimension=dimension).embed_documents(["Аспирин"])
+        assert model.calls == [["аспирин"]]
+
+
+def test_memory_budget_falls_back_to_disk(tmp_path: Path) -> None:
+    model = CountingEmbeddings()
+    probe = cached(model, tmp_path / "probe.sqlite3")
+    # Памяти ровно на два вектора
+    embeddings = cached(model, tmp_path / "cache.sqlite3", 2 * probe.entry_bytes)
+    assert embeddings.memory.max_size == 2
+    embeddings.embed_documents(["a", "b", "c"])
+    calls = len(model.calls)
+    embeddings.embed_documents(["a"])
+    assert len(model.calls) == calls
+    assert embeddings.disk_hits == 1
+
+
+def test_async_path_uses_both_levels(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    model = CountingEmbeddings()
+    embeddings = cached(model, path)
+
+    async def run() -> List[List[float]]:
+        documents = await embeddings.aembed_documents(["Аспирин", "Магне B6"])
+        query = await embeddings.aembed_query("аспирин")
+        return documents + [query]
+
+    aspirin, _, query = asyncio.run(run())
+    assert query == pytest.approx(aspirin)
+    assert model.calls == [["аспирин", "магне b6"]]
+
+    other = CountingEmbeddings()
+    asyncio.run(cached(other, path).aembed_query("Магне  b6"))
+    assert other.calls == []
+
+
+def test_store_put_and_get_many(tmp_path: Path) -> None:
+    store = EmbeddingStore(str(tmp_path / "nested" / "cache.sqlite3"))
+    # Больше, чем помещается в один запрос к SQLite
+    items = {f"key-{i}": array("f", [float(i), -float(i)]) for i in range(1200)}
+    store.put_many(items)
+    assert len(store) == len(items)
+    found = store.get_many(list(items) + ["missing"])
+    assert found == items
+    # Существующие ключи не перезаписываются
+    store.put_many({"key-1": array("f", [9.0, 9.0])})
+    assert store.get_many(["key-1"]) == {"key-1": array("f", [1.0, -1.0])}
@@ -0,0 +1,260 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.common import context
+from src.common.llm_model import get_llm
+from src.common.tools import ReAct_agent, fast_path
+from src.common.tools.fast_path import FAST_PATH_SOURCE, _is_idle, _match, fast_answer
+
+CONFIG = {"configurable": {"thread_id": "test"}}
+
+
+class FakeAgent:
+    """Состояние потока в памяти вместо графа с чекпойнтером."""
+
+    def __init__(self, messages: List[BaseMessage], summary: str = "") -> None:
+        self.values: Dict[str, Any] = {"messages": messages, "summary": summary}
+        self.updates: List[Dict[str, Any]] = []
+
+    async def aget_state(self, config: Dict[str, Any]) -> Any:
+        return SimpleNamespace(values=self.values)
+
+    async def aupdate_state(
+        self, config: Dict[str, Any], values: Dict[str, Any], as_node: str
+    ) -> None:
+        self.updates.append(values)
+
+
+async def fake_product(match: Dict[str, str]) -> Optional[str]:
+    return f"product:{match['product']}"
+
+
+async def fake_where(match: Dict[str, str]) -> Optional[str]:
+    return f"where:{match['product']}"
+
+
+async def fake_price_at(match: Dict[str, str]) -> Optional[str]:
+    return f"price:{match['product']}@{match['address']}"
+
+
+@pytest.fixture(autouse=True)
+def fake_answers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(fast_path, "_product", fake_product)
+    monkeypatch.setattr(fast_path, "_where", fake_where)
+    monkeypatch.setattr(fast_path, "_price_at", fake_price_at)
+    monkeypatch.setattr(fast_path.settings, "enabled", True)
+    monkeypatch.setattr(context, "count_tokens", len)
+
+
+def ask(monkeypatch: pytest.MonkeyPatch, text: str, agent: FakeAgent) -> Optional[str]:
+    monkeypatch.setattr(fast_path, "get_agent", lambda: agent)
+    return asyncio.run(fast_answer(text, CONFIG))
+
+
+def fast_reply(text: str) -> AIMessage:
+    return AIMessage(content=text, response_metadata={"source": FAST_PATH_SOURCE})
+
+
+def tool_call(name: str, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": {}, "id": call_id}])
+
+
+def test_match_questions() -> None:
+    answer, groups = _match("Сколько стоит Аспирин кардио в аптеке по адресу Абая 10?")
+    assert answer is fast_path._price_at
+    assert groups == {"product": "аспирин кардио", "address": "абая 10"}
+
+    answer, groups = _match("где купить магне б6")
+    assert answer is fast_path._where
+    assert groups == {"product": "магне б6"}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Аспирин",
+        # Ответы на вопросы агента по форме не отличаются от названия товара
+        "Иван Петров",
+        "ул. Абая 10",
+        "+7 701 123 45 67",
+        "да",
+        "2 упаковки",
+    ],
+)
+def test_match_short_replies_as_product(text: str) -> None:
+    matched = _match(text)
+    assert matched is not None
+    assert matched[0] is fast_path._product
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "Здравствуйте",
+        "хочу оформить заказ",
+        "как принимать аспирин",
+        "можно с доставкой",
+        "оплата картой",
+        "спасибо",
+        "одна две три четыре пять шесть семь",
+    ],
+)
+def test_match_not_a_fast_query(text: str) -> None:
+    assert _match(text) is None
+
+
+def test_idle_states() -> None:
+    assert _is_idle({"messages": []})
+    # Начало диалога свернуто в сводку — поток не новый
+    assert not _is_idle({"messages": [], "summary": "Клиент оформляет заказ"})
+    assert _is_idle({"messages": [HumanMessage(content="аспирин"), fast_reply("…")]})
+    assert not _is_idle(
+        {
+            "messages": [
+                HumanMessage(content="аспирин"),
+                AIMessage(content="Как вас зовут?"),
+            ]
+        }
+    )
+    assert not _is_idle({"messages": [HumanMessage(content="аспирин")]})
+    assert not _is_idle(
+        {"messages": [HumanMessage(content="аспирин"), tool_call("search", "1")]}
+    )
+
+
+def test_idle_after_order_in_last_turn() -> None:
+    order = [
+        HumanMessage(content="да, оформляйте"),
+        tool_call("create_order", "1"),
+        ToolMessage(content="ok", name="create_order", tool_call_id="1"),
+        AIMessage(content="Заказ оформлен."),
+    ]
+    assert _is_idle({"messages": order})
+    # Заказ был в прошлой реплике, в текущей агент снова собирает данные
+    later = order + [
+        HumanMessage(content="еще один"),
+        AIMessage(content="Назовите товар."),
+    ]
+    assert not _is_idle({"messages": later})
+
+
+def test_answers_product_in_new_thread(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent = FakeAgent([])
+    assert ask(monkeypatch, "Аспирин", agent) == "product:аспирин"
+    [update] = agent.updates
+    human, reply = update["messages"]
+    assert human.content == "Аспирин"
+    assert reply.content == "product:аспирин"
+    assert reply.response_metadata == {"source": FAST_PATH_SOURCE}
+
+
+def test_answers_product_after_fast_answer(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent = FakeAgent([HumanMessage(content="Аспирин"), fast_reply("product:аспирин")])
+    assert ask(monkeypatch, "Нурофен", agent) == "product:нурофен"
+
+
+@pytest.mark.parametrize(
+    "last",
+    [
+        AIMessage(content="Как вас зовут?"),
+        # Просьба без вопросительного знака
+        AIMessage(content="Записал. Укажите адрес доставки."),
+        tool_call("search", "1"),
+    ],
+)
+@pytest.mark.parametrize("text", ["Иван Петров", "ул. Абая 10", "Аспирин"])
+def test_mid_order_reply_goes_to_agent(
+    monkeypatch: pytest.MonkeyPatch, last: AIMessage, text: str
+) -> None:
+    agent = FakeAgent([HumanMessage(content="хочу оформить заказ"), last])
+    assert ask(monkeypatch, text, agent) is None
+    assert agent.updates == []
+
+
+def test_product_after_summary_goes_to_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent = FakeAgent([], summary="Клиент оформляет заказ, агент спросил адрес")
+    assert ask(monkeypatch, "ул. Абая 10", agent) is None
+
+
+def test_question_answered_unless_agent_asked(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    agent = FakeAgent(
+        [HumanMessage(content="хочу оформить заказ"), AIMessage(content="Готово.")]
+    )
+    assert ask(monkeypatch, "где купить аспирин", agent) == "where:аспирин"
+
+    agent = FakeAgent(
+        [HumanMessage(content="хочу оформить заказ"), AIMessage(content="Что ищете?")]
+    )
+    assert ask(monkeypatch, "где купить аспирин", agent) is None
+
+
+def test_failures_fall_back_to_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def broken(match: Dict[str, str]) -> Optional[str]:
+        raise RuntimeError("db is down")
+
+    async def not_found(match: Dict[str, str]) -> Optional[str]:
+        return None
+
+    agent = FakeAgent([])
+    monkeypatch.setattr(fast_path, "_product", broken)
+    assert ask(monkeypatch, "Аспирин", agent) is None
+    monkeypatch.setattr(fast_path, "_product", not_found)
+    assert ask(monkeypatch, "Аспирин", agent) is None
+    monkeypatch.setattr(fast_path.settings, "enabled", False)
+    monkeypatch.setattr(fast_path, "_product", fake_product)
+    assert ask(monkeypatch, "Аспирин", agent) is None
+    assert agent.updates == []
+
+
+def test_repeated_fast_answers_stay_within_cap(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    agent = ReAct_agent.graph.compile(checkpointer=InMemorySaver())
+    monkeypatch.setattr(fast_path, "get_agent", lambda: agent)
+    get_llm.set(FakeListChatModel(responses=["Клиент спрашивал цены."]))
+
+    async def conversation() -> List[int]:
+        sizes = []
+        for i in range(40):
+            assert await fast_answer(f"товар {i}", CONFIG) == f"product:товар {i}"
+            state = await agent.aget_state(CONFIG)
+            sizes.append(len(state.values["messages"]))
+        return sizes
+
+    try:
+        sizes = asyncio.run(conversation())
+    finally:
+        get_llm.reset()
+    assert max(sizes) <= context.MAX_HISTORY_LENGTH
+    values = asyncio.run(agent.aget_state(CONFIG)).values
+    assert values["summary"] == "Клиент спрашивал цены."
+    assert values["messages"][-1].content == "product:товар 39"
+    # Быстрый путь по-прежнему отвечает после сворачивания
+    assert _is_idle(values)
+
+
+def test_fast_answers_capped_when_summary_fails(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def broken(summary: str, messages: List[BaseMessage]) -> str:
+        raise RuntimeError("openai is down")
+
+    agent = ReAct_agent.graph.compile(checkpointer=InMemorySaver())
+    monkeypatch.setattr(fast_path, "get_agent", lambda: agent)
+    monkeypatch.setattr(context, "summarize", broken)
+
+    async def conversation() -> int:
+        for i in range(40):
+            await fast_answer(f"товар {i}", CONFIG)
+        return len((await agent.aget_state(CONFIG)).values["messages"])
+
+    assert asyncio.run(conversation()) <= context.MAX_HISTORY_LENGTH
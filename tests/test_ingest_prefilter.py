@@ -0,0 +1,122 @@
+import asyncio
+from array import array
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+
+from src.common.Schemas.pharmacy_schemas import UpdateStats
+from src.db import CRUD
+from src.db.ingestion import StagedRow
+
+prepare_batch = getattr(CRUD, "__prepare_batch")
+apply_feed = getattr(CRUD, "__apply_feed")
+
+FEED = [
+    {"name": "Аспирин 500мг", "address": "ул. Абая, 10", "price": "1200"},
+    {"name": "Аспирин 500мг", "address": "пр. Назарбаева, 5", "price": "1100"},
+    {"name": "Магне B6 №50", "address": "ул. Абая, 10", "price": "3900"},
+]
+
+
+def known_from(rows: List[StagedRow]) -> "array[int]":
+    """Отпечатки, которые load_fingerprints прочитал бы после загрузки rows."""
+    return array("q", sorted(row[3] for row in rows))
+
+
+def test_first_load_stages_everything() -> None:
+    rows, unchanged, rejected = prepare_batch(FEED, array("q"))
+    assert [(name, address, price) for name, address, price, _ in rows] == [
+        ("Аспирин 500мг", "ул. Абая, 10", 1200),
+        ("Аспирин 500мг", "пр. Назарбаева, 5", 1100),
+        ("Магне B6 №50", "ул. Абая, 10", 3900),
+    ]
+    assert (unchanged, rejected) == (0, 0)
+
+
+def test_unchanged_rows_are_skipped() -> None:
+    known = known_from(prepare_batch(FEED, array("q"))[0])
+    assert prepare_batch(FEED, known) == ([], len(FEED), 0)
+
+
+def test_only_changed_rows_are_staged() -> None:
+    known = known_from(prepare_batch(FEED, array("q"))[0])
+    changed = [dict(FEED[0], price="1250"), FEED[1], dict(FEED[2], name="Магне B6")]
+    rows, unchanged, rejected = prepare_batch(changed, known)
+    assert [row[:3] for row in rows] == [
+        ("Аспирин 500мг", "ул. Абая, 10", 1250),
+        ("Магне B6", "ул. Абая, 10", 3900),
+    ]
+    assert (unchanged, rejected) == (1, 0)
+
+
+def test_nested_rows_are_validated_with_the_same_fingerprint() -> None:
+    nested = [
+        {
+            "product": {"name": item["name"]},
+            "pharmacy": {"address": item["address"]},
+            "price": item["price"],
+        }
+        for item in FEED
+    ]
+    # Вложенный формат не проходит префильтр, но получает тот же отпечаток,
+    # поэтому в следующий раз плоские строки распознаются как неизмененные
+    rows, unchanged, _ = prepare_batch(nested, array("q"))
+    assert unchanged == 0
+    assert rows == prepare_batch(FEED, array("q"))[0]
+    assert prepare_batch(FEED, known_from(rows))[1] == len(FEED)
+
+
+def test_invalid_price_is_rejected_not_skipped() -> None:
+    known = known_from(prepare_batch(FEED, array("q"))[0])
+    rows, unchanged, rejected = prepare_batch(
+        FEED + [dict(FEED[0], price="по запросу")], known
+    )
+    assert (rows, unchanged, rejected) == ([], len(FEED), 1)
+
+
+@pytest.fixture
+def staging(monkeypatch: pytest.MonkeyPatch) -> Dict[str, Any]:
+    """Промежуточная таблица и сохраненные отпечатки без базы."""
+    state: Dict[str, Any] = {"saved": [], "staged": [], "copies": 0}
+
+    async def load_fingerprints(db: Any) -> "array[int]":
+        return known_from(state["saved"])
+
+    async def reset_staging(db: Any) -> None:
+        state["staged"] = []
+
+    async def copy_to_staging(db: Any, rows: List[StagedRow]) -> None:
+        state["copies"] += 1
+        state["staged"].extend(rows)
+
+    async def merge_staging(db: Any) -> UpdateStats:
+        state["saved"] = state["saved"] + state["staged"]
+        return UpdateStats(inserted=len(state["staged"]))
+
+    monkeypatch.setattr(CRUD, "load_fingerprints", load_fingerprints)
+    monkeypatch.setattr(CRUD, "reset_staging", reset_staging)
+    monkeypatch.setattr(CRUD, "copy_to_staging", copy_to_staging)
+    monkeypatch.setattr(CRUD, "merge_staging", merge_staging)
+    monkeypatch.setattr(CRUD.feed_settings, "batch_size", 2)
+    return state
+
+
+def test_apply_feed_writes_only_changes(staging: Dict[str, Any]) -> None:
+    async def items(feed: List[Dict[str, str]]) -> AsyncIterator[Dict[str, str]]:
+        for item in feed:
+            yield item
+
+    processed: List[int] = []
+
+    async def progress(count: int) -> None:
+        processed.append(count)
+
+    first = asyncio.run(apply_feed(None, items(FEED), progress))
+    assert (first.inserted, first.unchanged) == (3, 0)
+    assert processed == [2, 3]
+
+    copies = staging["copies"]
+    again = asyncio.run(apply_feed(None, items(FEED)))
+    assert (again.inserted, again.unchanged) == (0, 3)
+    # Неизмененная выгрузка не доходит ни до COPY, ни до переноса
+    assert staging["copies"] == copies
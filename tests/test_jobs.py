@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+
+from src.db import jobs
+
+
+@pytest.fixture
+def updates(monkeypatch: pytest.MonkeyPatch) -> List[Dict[str, Any]]:
+    """Записи _set_job вместо UPDATE в базе."""
+    recorded: List[Dict[str, Any]] = []
+
+    async def set_job(job_id: int, **values: Any) -> None:
+        recorded.append(values)
+
+    monkeypatch.setattr(jobs, "_set_job", set_job)
+    monkeypatch.setattr(jobs.feed_settings, "job_heartbeat_interval", 0.01)
+    return recorded
+
+
+def test_heartbeat_while_job_runs(updates: List[Dict[str, Any]]) -> None:
+    async def job() -> None:
+        await asyncio.sleep(0.1)
+
+    async def run() -> int:
+        await jobs._with_heartbeat(1, job())
+        beats = len(updates)
+        await asyncio.sleep(0.05)
+        return beats
+
+    beats = asyncio.run(run())
+    assert beats >= 3
+    assert all(set(values) == {"heartbeat_at"} for values in updates)
+    # После завершения задачи отметки прекращаются
+    assert len(updates) == beats
+
+
+def test_heartbeat_stops_when_job_fails(updates: List[Dict[str, Any]]) -> None:
+    async def job() -> None:
+        raise RuntimeError("boom")
+
+    async def run() -> None:
+        with pytest.raises(RuntimeError):
+            await jobs._with_heartbeat(1, job())
+        beats = len(updates)
+        await asyncio.sleep(0.05)
+        assert len(updates) == beats
+
+    asyncio.run(run())
@@ -0,0 +1,98 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, List
+
+import pytest
+
+from src.common.json_stream import JSONArrayStreamParser, iter_json_array
+
+ITEMS = [
+    {"name": "Аспирин 500мг", "price": 1200, "address": "ул. Абая, 10"},
+    {"name": 'Скобки ] } и "кавычки"', "price": 0.5, "tags": [1, [2, {}]]},
+    {"name": "Магне B6 №50", "price": 123456789, "stock": None, "ok": True},
+    {"name": "\\u-escape é 😀", "price": -1e3},
+]
+DOCUMENT = json.dumps(
+    {"Meta": {"Products": "не массив"}, "Products": ITEMS, "Total": 4},
+    ensure_ascii=False,
+).encode("utf-8")
+
+
+def parse(chunks: List[bytes], key: str = "Products") -> List[Any]:
+    parser = JSONArrayStreamParser(key)
+    items: List[Any] = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+    return items
+
+
+def test_whole_document() -> None:
+    assert parse([DOCUMENT]) == ITEMS
+
+
+def test_every_split_point() -> None:
+    # Граница куска в любом месте: внутри строки, числа, многобайтного символа
+    for split in range(len(DOCUMENT) + 1):
+        assert parse([DOCUMENT[:split], DOCUMENT[split:]]) == ITEMS, split
+
+
+def test_byte_by_byte() -> None:
+    chunks = [bytes([byte]) for byte in DOCUMENT]
+    assert parse(chunks) == ITEMS
+
+
+def test_items_are_returned_as_soon_as_complete() -> None:
+    parser = JSONArrayStreamParser("Products")
+    first = json.dumps(ITEMS[0], ensure_ascii=False).encode("utf-8")
+    assert parser.feed(b'{"Products": [' + first) == []
+    # Объект закрыт, но до запятой неизвестно, что он закончен в массиве
+    assert parser.feed(b",") == [ITEMS[0]]
+    assert parser.feed(b"1") == []
+    # 1 может оказаться началом 12
+    assert parser.feed(b"2") == []
+    assert parser.feed(b"]}") == [12]
+    assert parser.close() == []
+
+
+def test_bom_and_whitespace() -> None:
+    document = b'\xef\xbb\xbf \n{ "Products" :\t[ 1 ,\n2 ] }\n'
+    assert parse([document[:2], document[2:]]) == [1, 2]
+
+
+def test_empty_array() -> None:
+    assert parse([b'{"Products": []}']) == []
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'{"Products": [1, 2',
+        b'{"Products": [1, 2]',
+        b'{"Products": [1 2]}',
+        b'["Products"]',
+        b'{"Other": [1]}',
+        b'{"Products": [1]} trailing',
+    ],
+)
+def test_invalid_documents(document: bytes) -> None:
+    with pytest.raises(ValueError):
+        parse([document])
+
+
+def test_item_size_limit() -> None:
+    parser = JSONArrayStreamParser("Products", max_item_chars=10)
+    with pytest.raises(ValueError):
+        parser.feed(b'{"Products": ["' + b"x" * 20)
+
+
+def test_iter_json_array() -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        for start in range(0, len(DOCUMENT), 7):
+            end = start + 7
+            yield DOCUMENT[start:end]
+
+    async def collect() -> List[Any]:
+        return [item async for item in iter_json_array(chunks(), "Products")]
+
+    assert asyncio.run(collect()) == ITEMS
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from typing import Any, List
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.types import Message, Receive, Scope, Send
+
+from src.common.logger import logger
+from src.common.middlewares.middleware_register import (
+    RequestLoggingMiddleware,
+    _BodyTee,
+)
+
+CHUNKS = [b"first;", b"second;", b"third"]
+
+
+def test_body_tee_keeps_only_the_head() -> None:
+    tee = _BodyTee(limit=8)
+    tee.feed(b"abc")
+    assert str(tee) == "abc"
+    tee.feed(b"defghijk")
+    tee.feed(b"lmn")
+    assert bytes(tee.head) == b"abcdefgh"
+    assert str(tee) == "abcdefgh... (14 bytes)"
+
+
+def test_body_tee_drops_a_cut_utf8_character() -> None:
+    tee = _BodyTee(limit=3)
+    # «ц» занимает два байта, граница проходит по середине второго символа
+    tee.feed("цц".encode("utf-8"))
+    assert str(tee) == "ц... (4 bytes)"
+
+
+def make_app(body_limit: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request) -> StreamingResponse:
+        await request.body()
+
+        async def chunks() -> Any:
+            for chunk in CHUNKS:
+                yield chunk
+
+        return StreamingResponse(chunks(), status_code=201, media_type="text/plain")
+
+    app.add_middleware(RequestLoggingMiddleware, body_limit=body_limit)
+    return app
+
+
+def test_debug_logs_truncated_bodies(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+    response = TestClient(make_app(body_limit=10)).post(
+        "/echo", content=b'{"user_input": "long question"}'
+    )
+
+    # Клиент получает тело целиком, хотя в лог попадает только начало
+    assert response.status_code == 201
+    assert response.content == b"".join(CHUNKS)
+    messages = [record.getMessage() for record in caplog.records]
+    request_line = next(m for m in messages if m.startswith("--> Request"))
+    response_line = next(m for m in messages if m.startswith("<-- Response"))
+    assert request_line.endswith('request body: {"user_inp... (31 bytes)')
+    assert response_line.startswith("<-- Response 201 took")
+    assert response_line.endswith("response body: first;seco... (18 bytes)")
+
+
+def test_info_level_logs_one_line(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.INFO, logger=logger.name)
+    response = TestClient(make_app(body_limit=10)).post("/echo", content=b"body")
+
+    assert response.content == b"".join(CHUNKS)
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith("Request ")
+    assert messages[0].endswith("POST to /echo")
+
+
+def http_scope() -> Scope:
+    return {"type": "http", "method": "GET", "path": "/stream", "headers": []}
+
+
+def test_stream_is_passed_through_chunk_by_chunk(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Каждый кусок уходит клиенту сразу и тем же сообщением ASGI."""
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+    sent: List[Message] = []
+    seen_by_client: List[int] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in CHUNKS:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            # Предыдущий кусок уже у клиента, пока приложение готовит следующий
+            seen_by_client.append(len(sent))
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    asyncio.run(
+        RequestLoggingMiddleware(app, body_limit=4)(http_scope(), receive, send)
+    )
+
+    assert seen_by_client == [2, 3, 4]
+    assert [message.get("body") for message in sent[1:]] == CHUNKS + [b""]
+    assert all(message.get("more_body") for message in sent[1:-1])
+
+
+def test_error_is_logged_and_reraised(caplog: pytest.LogCaptureFixture) -> None:
+    caplog.set_level(logging.DEBUG, logger=logger.name)
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await receive()
+        raise RuntimeError("boom")
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"payload", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            RequestLoggingMiddleware(app, body_limit=100)(http_scope(), receive, send)
+        )
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(m.endswith("request body: payload") for m in messages)
+    # Ответ не начинался: статус 0 и пустое тело
+    assert any(m.startswith("<-- Response 0 took") for m in messages)
+
+
+def test_non_http_scope_is_not_touched() -> None:
+    calls: List[Scope] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        calls.append(scope)
+
+    async def receive() -> Message:
+        raise AssertionError("receive must not be wrapped or called")
+
+    async def send(message: Message) -> None:
+        raise AssertionError("send must not be called")
+
+    scope = {"type": "lifespan"}
+    asyncio.run(RequestLoggingMiddleware(app, body_limit=4)(scope, receive, send))
+    assert calls == [scope]
@@ -0,0 +1,196 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.api.v1 import endpoints
+from src.common import context
+from src.common.context import SUMMARY_TAG
+from src.common.tools import ReAct_agent
+from src.common.tools import answer_cache as answer_cache_module
+
+CONFIG = {"configurable": {"thread_id": "t"}}
+INPUTS = {"messages": [("user", "Цена аспирина")]}
+
+SetAgent = Callable[[Any], None]
+
+
+def parse(stream: str) -> List[Tuple[str, Dict[str, Any]]]:
+    events = []
+    for block in stream.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def collect(question: str = "Цена аспирина") -> List[Tuple[str, Dict[str, Any]]]:
+    async def run() -> str:
+        return "".join(
+            [chunk async for chunk in endpoints._agent_events(question, INPUTS, CONFIG)]
+        )
+
+    return parse(asyncio.run(run()))
+
+
+class FakeAgent:
+    """Граф, который отдает заранее заданные события astream_events."""
+
+    def __init__(self, events: List[Dict[str, Any]], error: Optional[Exception] = None):
+        self.events = events
+        self.error = error
+
+    async def astream_events(self, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        for event in self.events:
+            yield event
+        if self.error is not None:
+            raise self.error
+
+
+def chunk(content: str, tags: Optional[List[str]] = None) -> Dict[str, Any]:
+    return {
+        "event": "on_chat_model_stream",
+        "tags": tags or [],
+        "data": {"chunk": AIMessageChunk(content=content)},
+    }
+
+
+@pytest.fixture
+def cache(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """Быстрый путь не срабатывает, кэш ответов записывает сохраненное."""
+    state = SimpleNamespace(cached=None, stored=[])
+
+    async def fast_answer(question: str, config: Dict[str, Any]) -> None:
+        return None
+
+    async def lookup(question: str, config: Dict[str, Any]) -> Tuple[Any, Any]:
+        return state.cached, "key"
+
+    def store(key: Any, answer: Any) -> None:
+        state.stored.append((key, answer))
+
+    monkeypatch.setattr(endpoints, "fast_answer", fast_answer)
+    monkeypatch.setattr(endpoints.answer_cache, "lookup", lookup)
+    monkeypatch.setattr(endpoints.answer_cache, "store", store)
+    return state
+
+
+@pytest.fixture
+def agent() -> Iterator[SetAgent]:
+    def set_agent(value: Any) -> None:
+        ReAct_agent.get_agent.set(value)
+
+    yield set_agent
+    ReAct_agent.get_agent.reset()
+
+
+def test_event_mapping(cache: SimpleNamespace, agent: SetAgent) -> None:
+    final = {"messages": [AIMessage(content="Цена: 1200")]}
+    agent(
+        FakeAgent(
+            [
+                chunk("Сводка", tags=[SUMMARY_TAG]),
+                chunk(""),
+                {
+                    "event": "on_tool_start",
+                    "name": "get_current_price_for_product",
+                    "data": {"input": {"product_name": "аспирин"}},
+                },
+                {
+                    "event": "on_tool_end",
+                    "name": "get_current_price_for_product",
+                    "data": {"output": ToolMessage(content="1200", tool_call_id="1")},
+                },
+                chunk("Цена: "),
+                chunk("1200"),
+                # Завершение вложенной цепочки — не конец графа
+                {"event": "on_chain_end", "parent_ids": ["root"], "data": {}},
+                {"event": "on_chain_end", "parent_ids": [], "data": {"output": final}},
+            ]
+        )
+    )
+    assert collect() == [
+        (
+            "tool_start",
+            {
+                "name": "get_current_price_for_product",
+                "input": {"product_name": "аспирин"},
+            },
+        ),
+        ("tool_end", {"name": "get_current_price_for_product", "output": "1200"}),
+        ("token", {"content": "Цена: "}),
+        ("token", {"content": "1200"}),
+        ("answer", {"answer": "Цена: 1200"}),
+    ]
+    assert cache.stored == [("key", "Цена: 1200")]
+
+
+def test_error_event(cache: SimpleNamespace, agent: SetAgent) -> None:
+    agent(FakeAgent([chunk("Цена")], error=RuntimeError("model is down")))
+    assert collect() == [
+        ("token", {"content": "Цена"}),
+        ("error", {"detail": "model is down"}),
+    ]
+    assert cache.stored == []
+
+
+def test_fast_and_cached_answers_skip_the_graph(
+    cache: SimpleNamespace, agent: SetAgent, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    agent(FakeAgent([], error=AssertionError("graph must not run")))
+    cache.cached = "Из кэша"
+    assert collect() == [("answer", {"answer": "Из кэша"})]
+
+    async def fast_answer(question: str, config: Dict[str, Any]) -> str:
+        return "Быстрый ответ"
+
+    monkeypatch.setattr(endpoints, "fast_answer", fast_answer)
+    assert collect() == [("answer", {"answer": "Быстрый ответ"})]
+
+
+def test_stream_endpoint_with_graph(
+    agent: SetAgent, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Настоящий граф: токены модели складываются в итоговый ответ."""
+
+    async def fast_answer(question: str, config: Dict[str, Any]) -> None:
+        return None
+
+    monkeypatch.setattr(endpoints, "fast_answer", fast_answer)
+    monkeypatch.setattr(answer_cache_module.settings, "enabled", False)
+    monkeypatch.setattr(context, "count_tokens", len)
+    ReAct_agent.get_agent_llm.set(FakeListChatModel(responses=["Цена: 1200 тг"]))
+    agent(ReAct_agent.graph.compile(checkpointer=InMemorySaver()))
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    try:
+        with TestClient(app).stream(
+            "GET",
+            "/ask_llm/stream",
+            json={"user_input": "Цена аспирина", "thread_id": "t"},
+        ) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        ReAct_agent.get_agent_llm.reset()
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-accel-buffering"] == "no"
+    events = parse(body)
+    tokens = "".join(data["content"] for name, data in events if name == "token")
+    assert tokens == "Цена: 1200 тг"
+    assert events[-1] == ("answer", {"answer": "Цена: 1200 тг"})
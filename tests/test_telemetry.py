@@ -0,0 +1,166 @@
+import asyncio
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+import pytest
+from langchain_core.language_models.fake_chat_models import (
+    FakeMessagesListChatModel,
+)
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from prometheus_client import REGISTRY
+
+from src.common import context, telemetry
+from src.common.telemetry import AgentTelemetry, observe_llm, request_id, traced_config
+from src.common.tools import ReAct_agent
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class RecordedSpan:
+    """Span без OpenTelemetry и лога: запоминает имя, родителя и ошибку."""
+
+    spans: List["RecordedSpan"] = []
+
+    def __init__(
+        self,
+        name: str,
+        attributes: Dict[str, Any],
+        parent: Optional["RecordedSpan"] = None,
+    ) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.ended = False
+        self.error: Optional[BaseException] = None
+        RecordedSpan.spans.append(self)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.ended = True
+        self.error = error
+
+
+@pytest.fixture
+def spans(monkeypatch: pytest.MonkeyPatch) -> Iterator[List[RecordedSpan]]:
+    RecordedSpan.spans = []
+    monkeypatch.setattr(telemetry, "Span", RecordedSpan)
+    monkeypatch.setattr(telemetry.telemetry_settings, "tracing", True)
+    yield RecordedSpan.spans
+
+
+@pytest.fixture
+def agent(monkeypatch: pytest.MonkeyPatch) -> Iterator[Any]:
+    """Граф, где модель один раз вызывает инструмент add и отвечает."""
+    monkeypatch.setattr(context, "count_tokens", len)
+    model = FakeMessagesListChatModel(
+        responses=[
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "add", "args": {"a": 1, "b": 2}, "id": "call_1"}],
+            ),
+            AIMessage(content="3"),
+        ]
+    )
+    ReAct_agent.get_agent_llm.set(model)
+    yield ReAct_agent.graph.compile(checkpointer=InMemorySaver())
+    ReAct_agent.get_agent_llm.reset()
+
+
+def test_graph_run_records_nodes_and_tools(agent: Any) -> None:
+    before = {
+        "agent": sample("agent_node_seconds_count", node="agent", status="ok"),
+        "tools": sample("agent_node_seconds_count", node="tools", status="ok"),
+        "add": sample("agent_tool_seconds_count", tool="add", status="ok"),
+    }
+    handler = AgentTelemetry("req-1")
+    config = {"configurable": {"thread_id": "t"}, "callbacks": [handler]}
+    answer = asyncio.run(agent.ainvoke({"messages": [("user", "1+2")]}, config))
+
+    assert answer["messages"][-1].content == "3"
+    after = {
+        "agent": sample("agent_node_seconds_count", node="agent", status="ok"),
+        "tools": sample("agent_node_seconds_count", node="tools", status="ok"),
+        "add": sample("agent_tool_seconds_count", tool="add", status="ok"),
+    }
+    # Модель вызвана дважды, инструмент — один раз
+    assert after["agent"] - before["agent"] == 2
+    assert after["tools"] - before["tools"] == 1
+    assert after["add"] - before["add"] == 1
+    # Все запуски закрыты, обработчик ничего не держит
+    assert handler._runs == {} and handler._parents == {}
+
+
+def test_spans_are_nested_under_the_run(agent: Any, spans: List[RecordedSpan]) -> None:
+    config = {"configurable": {"thread_id": "t"}, "callbacks": [AgentTelemetry("r")]}
+    asyncio.run(agent.ainvoke({"messages": [("user", "1+2")]}, config))
+
+    names = [span.name for span in spans]
+    assert names.count("agent.run") == 1
+    assert names.count("agent.node") == 3
+    assert names.count("agent.tool") == 1
+    run = spans[names.index("agent.run")]
+    tool = spans[names.index("agent.tool")]
+    assert run.parent is None
+    assert tool.parent is not None and tool.parent.attributes["name"] == "tools"
+    assert tool.parent.parent is run
+    assert all(span.ended and span.error is None for span in spans)
+    assert all(span.attributes["request_id"] == "r" for span in spans)
+
+
+def test_tool_error_is_recorded(spans: List[RecordedSpan]) -> None:
+    handler = AgentTelemetry("r")
+    before = sample("agent_tool_seconds_count", tool="broken", status="error")
+    run, tool = uuid4(), uuid4()
+    handler.on_chain_start({}, {}, run_id=run, name="LangGraph")
+    handler.on_tool_start({"name": "broken"}, "", run_id=tool, parent_run_id=run)
+    error = RuntimeError("boom")
+    handler.on_tool_error(error, run_id=tool)
+    handler.on_chain_error(error, run_id=run)
+
+    assert sample("agent_tool_seconds_count", tool="broken", status="error") == (
+        before + 1
+    )
+    assert [(span.name, span.error) for span in spans] == [
+        ("agent.run", error),
+        ("agent.tool", error),
+    ]
+    assert handler._runs == {} and handler._parents == {}
+
+
+def test_traced_config_keeps_callbacks_and_metadata() -> None:
+    existing = object()
+    token = request_id.set("abc")
+    try:
+        config = traced_config(
+            {
+                "configurable": {"thread_id": "t"},
+                "callbacks": [existing],
+                "metadata": {"user": "u"},
+            }
+        )
+    finally:
+        request_id.reset(token)
+    assert config["configurable"] == {"thread_id": "t"}
+    assert config["callbacks"][0] is existing
+    assert isinstance(config["callbacks"][1], AgentTelemetry)
+    assert config["callbacks"][1].request_id == "abc"
+    assert config["metadata"] == {"user": "u", "request_id": "abc"}
+
+
+def test_observe_llm_counts_tokens() -> None:
+    prompt = sample("llm_tokens_total", kind="test", type="prompt")
+    completion = sample("llm_tokens_total", kind="test", type="completion")
+    requests = sample("llm_request_seconds_count", kind="test")
+    message = AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 120, "output_tokens": 7, "total_tokens": 127},
+    )
+    observe_llm("test", 0.5, message)
+    observe_llm("test", 0.5, AIMessage(content="без usage"))
+    assert sample("llm_tokens_total", kind="test", type="prompt") == prompt + 120
+    assert sample("llm_tokens_total", kind="test", type="completion") == (
+        completion + 7
+    )
+    assert sample("llm_request_seconds_count", kind="test") == requests + 2
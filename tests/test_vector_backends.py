@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.common.vector_backends import LocalBackend
+
+DIMENSION = 32
+NAMESPACE = "products@v1"
+TEXTS = {
+    "1": "Аспирин 500мг №20",
+    "2": "Магне B6 №50",
+    "3": "Нурофен 200мг №10",
+    "4": "Парацетамол 500мг №10",
+}
+
+
+@pytest.fixture(params=[False, True], ids=["float32", "int8"])
+def quantize(request: pytest.FixtureRequest) -> bool:
+    return request.param
+
+
+def make_backend(path: Path, quantize: bool, search_k: int = 3) -> LocalBackend:
+    return LocalBackend(
+        DeterministicFakeEmbedding(size=DIMENSION),
+        str(path),
+        DIMENSION,
+        search_k,
+        quantize=quantize,
+        block_size=2,
+    )
+
+
+def fill(backend: LocalBackend) -> None:
+    backend.upsert(NAMESPACE, list(TEXTS), list(TEXTS.values()))
+
+
+def top_ids(backend: LocalBackend, query: str) -> List[str]:
+    return [document.id for document in backend.search(NAMESPACE, query)]
+
+
+def versions(path: Path) -> List[str]:
+    directory = next(path.iterdir())
+    return sorted(item.name for item in directory.iterdir() if item.is_dir())
+
+
+def test_upsert_and_search(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    assert backend.search(NAMESPACE, "аспирин") == []
+    fill(backend)
+    assert backend.list_ids(NAMESPACE) == set(TEXTS)
+    assert backend.count(NAMESPACE) == 4
+    for vector_id, text in TEXTS.items():
+        found = backend.search(NAMESPACE, text)
+        assert len(found) == 3
+        assert found[0].id == vector_id
+        assert found[0].page_content == text
+        assert found[0].metadata["score"] == pytest.approx(1.0, abs=0.02)
+        scores = [document.metadata["score"] for document in found]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_upsert_replaces_existing_id(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    fill(backend)
+    backend.upsert(NAMESPACE, ["2"], ["Магне B6 форте №30"])
+    assert backend.count(NAMESPACE) == 4
+    found = backend.search(NAMESPACE, "Магне B6 форте №30")
+    assert found[0].id == "2"
+    assert found[0].page_content == "Магне B6 форте №30"
+
+
+def test_delete(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    fill(backend)
+    backend.delete(NAMESPACE, ["1", "3"])
+    assert backend.list_ids(NAMESPACE) == {"2", "4"}
+    assert "1" not in top_ids(backend, TEXTS["1"])
+    assert top_ids(backend, TEXTS["4"])[0] == "4"
+
+    before = versions(tmp_path)
+    # Нечего удалять — новая версия не пишется
+    backend.delete(NAMESPACE, ["1", "404"])
+    assert versions(tmp_path) == before
+
+
+def test_reopen_and_changes_from_other_instance(tmp_path: Path, quantize: bool) -> None:
+    writer = make_backend(tmp_path, quantize)
+    fill(writer)
+    reader = make_backend(tmp_path, quantize)
+    assert reader.list_ids(NAMESPACE) == set(TEXTS)
+    assert top_ids(reader, TEXTS["3"])[0] == "3"
+
+    writer.delete(NAMESPACE, ["3"])
+    writer.upsert(NAMESPACE, ["5"], ["Витамин C 1000мг"])
+    assert reader.list_ids(NAMESPACE) == {"1", "2", "4", "5"}
+    assert top_ids(reader, "Витамин C 1000мг")[0] == "5"
+
+
+def test_bulk_writes_one_version(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    fill(backend)
+    reader = make_backend(tmp_path, quantize)
+    before = versions(tmp_path)
+
+    backend.begin_bulk(NAMESPACE)
+    backend.begin_bulk(NAMESPACE)
+    backend.upsert(NAMESPACE, ["5", "6"], ["Витамин C 1000мг", "Витамин D3"])
+    backend.delete(NAMESPACE, ["1", "6"])
+    backend.end_bulk(NAMESPACE)
+    # Вложенная серия: запись только в конце внешней
+    assert versions(tmp_path) == before
+    assert reader.list_ids(NAMESPACE) == set(TEXTS)
+    backend.upsert(NAMESPACE, ["2"], ["Магне B6 форте №30"])
+    backend.end_bulk(NAMESPACE)
+
+    after = versions(tmp_path)
+    assert len(after) == 2
+    assert after[0] == before[-1]
+    assert reader.list_ids(NAMESPACE) == {"2", "3", "4", "5"}
+    assert reader.search(NAMESPACE, "Магне B6 форте №30")[0].id == "2"
+
+
+def test_bulk_without_changes_keeps_version(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    fill(backend)
+    before = versions(tmp_path)
+    backend.begin_bulk(NAMESPACE)
+    backend.delete(NAMESPACE, ["404"])
+    backend.end_bulk(NAMESPACE)
+    assert versions(tmp_path) == before
+
+
+def test_old_versions_are_removed(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    for vector_id, text in TEXTS.items():
+        backend.upsert(NAMESPACE, [vector_id], [text])
+    assert versions(tmp_path) == ["v000003", "v000004"]
+    assert backend.count(NAMESPACE) == 4
+
+
+def test_namespaces_and_drop(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize)
+    fill(backend)
+    backend.upsert("products@v2", ["9"], ["Бинт стерильный"])
+    assert backend.list_ids("products@v2") == {"9"}
+    backend.drop(NAMESPACE)
+    assert backend.list_ids(NAMESPACE) == set()
+    assert backend.search(NAMESPACE, TEXTS["1"]) == []
+    assert make_backend(tmp_path, quantize).list_ids("products@v2") == {"9"}
+
+
+def test_asearch(tmp_path: Path, quantize: bool) -> None:
+    backend = make_backend(tmp_path, quantize, search_k=10)
+    fill(backend)
+    found = asyncio.run(backend.asearch(NAMESPACE, TEXTS["2"]))
+    assert len(found) == 4
+    assert found[0].id == "2"
+    assert [document.id for document in found] == top_ids(backend, TEXTS["2"])
+
+
+def _write_from_process(path: str, worker: int, start: Any) -> None:
+    backend = make_backend(Path(path), quantize=False)
+    start.wait()
+    for i in range(10):
+        backend.upsert(NAMESPACE, [f"{worker}-{i}"], [f"Товар {worker} {i}"])
+    backend.begin_bulk(NAMESPACE)
+    backend.upsert(NAMESPACE, [f"{worker}-bulk"], [f"Набор {worker}"])
+    backend.delete(NAMESPACE, [f"{worker}-0"])
+    backend.end_bulk(NAMESPACE)
+
+
+def test_writers_in_different_processes_do_not_lose_updates(tmp_path: Path) -> None:
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    workers = [
+        context.Process(target=_write_from_process, args=(str(tmp_path), worker, start))
+        for worker in range(3)
+    ]
+    for process in workers:
+        process.start()
+    start.set()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    expected = {f"{worker}-{i}" for worker in range(3) for i in range(1, 10)} | {
+        f"{worker}-bulk" for worker in range(3)
+    }
+    backend = make_backend(tmp_path, quantize=False)
+    assert backend.list_ids(NAMESPACE) == expected
+    assert len(versions(tmp_path)) == 2
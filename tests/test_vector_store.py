@@ -0,0 +1,131 @@
+import asyncio
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.common import vector_store
+from src.common.vector_backends import LocalBackend
+from src.common.vector_store import VectorStore
+
+DIMENSION = 32
+BASE = "products"
+
+
+class IndexState:
+    """vector_index_state в памяти вместо базы: одна строка на BASE."""
+
+    def __init__(self) -> None:
+        self.active = BASE
+        self.building: Optional[str] = None
+        self.version = 0
+
+    async def get(self, base_namespace: str) -> Optional[Tuple[str, int]]:
+        return self.active, self.version
+
+    async def bump(self, base_namespace: str) -> int:
+        self.version += 1
+        return self.version
+
+    async def get_building(self, base_namespace: str) -> Optional[str]:
+        return self.building
+
+    async def set_building(self, base_namespace: str, namespace: str) -> None:
+        self.building = namespace
+
+    async def set_active(self, base_namespace: str, namespace: str) -> Optional[str]:
+        previous, self.active, self.building = self.active, namespace, None
+        return previous
+
+
+@pytest.fixture
+def state(monkeypatch: pytest.MonkeyPatch) -> IndexState:
+    fake = IndexState()
+    monkeypatch.setattr(vector_store, "get_index_state", fake.get)
+    monkeypatch.setattr(vector_store, "bump_index_version", fake.bump)
+    monkeypatch.setattr(vector_store, "get_building_namespace", fake.get_building)
+    monkeypatch.setattr(vector_store, "set_building_namespace", fake.set_building)
+    monkeypatch.setattr(vector_store, "set_active_namespace", fake.set_active)
+    monkeypatch.setattr(vector_store.settings, "namespace", BASE)
+    monkeypatch.setattr(vector_store.settings, "openai_api_key", "test")
+    monkeypatch.setattr(vector_store.settings, "namespace_refresh_interval", 30)
+    monkeypatch.setattr(vector_store.cache_settings, "enabled", False)
+    return fake
+
+
+@pytest.fixture
+def make_store(tmp_path: Path, state: IndexState) -> Callable[[], VectorStore]:
+    """Хранилища разных воркеров над одним локальным индексом."""
+
+    def make() -> VectorStore:
+        store = VectorStore()
+        store.embedding = DeterministicFakeEmbedding(size=DIMENSION)
+        store.backend = LocalBackend(store.embedding, str(tmp_path), DIMENSION, 3)
+        return store
+
+    return make
+
+
+def test_sync_clears_search_cache_in_other_workers(
+    make_store: Callable[[], VectorStore],
+    state: IndexState,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    syncing, serving = make_store(), make_store()
+    asyncio.run(syncing.sync_vector_store(["Аспирин 500мг"]))
+    assert state.version == 1
+
+    async def search() -> str:
+        return await serving.asearch("Нурофен")
+
+    before = asyncio.run(search())
+    assert "Нурофен" not in before
+
+    asyncio.run(syncing.sync_vector_store(["Аспирин 500мг", "Нурофен 200мг"]))
+    assert state.version == 2
+    # До следующей проверки указателя воркер отдает результат из кэша
+    assert asyncio.run(search()) == before
+
+    monkeypatch.setattr(vector_store.settings, "namespace_refresh_interval", 0)
+    assert "Нурофен 200мг" in asyncio.run(search())
+
+
+def test_sync_without_changes_keeps_version(
+    make_store: Callable[[], VectorStore], state: IndexState
+) -> None:
+    store = make_store()
+    asyncio.run(store.sync_vector_store(["Аспирин 500мг"]))
+    asyncio.run(store.sync_vector_store(["Аспирин 500мг"]))
+    assert state.version == 1
+
+
+def test_failed_version_bump_does_not_fail_sync(
+    make_store: Callable[[], VectorStore], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def broken(base_namespace: str) -> int:
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(vector_store, "bump_index_version", broken)
+    result = asyncio.run(make_store().sync_vector_store(["Аспирин 500мг"]))
+    assert result.startswith("Index synced: 1 added")
+
+
+def test_back_to_back_rebuilds_keep_index(
+    make_store: Callable[[], VectorStore],
+    state: IndexState,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(vector_store.settings, "namespace_refresh_interval", 0)
+    store = make_store()
+    names = ["Аспирин 500мг", "Нурофен 200мг"]
+
+    async def rebuild_twice() -> None:
+        for _ in range(2):
+            result = await store.rebuild_vector_store(names)
+            assert result.startswith("Index rebuilt into")
+
+    asyncio.run(rebuild_twice())
+    assert state.active == store.active_namespace != BASE
+    assert store.backend.count(state.active) == len(names)
+    assert "Нурофен 200мг" in asyncio.run(store.asearch("Нурофен"))